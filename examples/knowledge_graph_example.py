@@ -2,17 +2,80 @@
 知识图谱功能示例
 演示如何使用知识图谱API构建和查询图谱
 """
-import json
-import requests
+import asyncio
+import gzip
+
+import httpx
+import msgspec
+import orjson
 from typing import Dict, List
 
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# 请求体超过该大小时使用gzip压缩
+GZIP_MIN_SIZE = 4096
+
 
 class KnowledgeGraphClient:
     """知识图谱客户端"""
 
-    def __init__(self, base_url: str = "http://localhost:7861"):
+    def __init__(self, base_url: str = "http://localhost:7861", use_msgpack: bool = True):
         self.base_url = base_url
         self.kg_prefix = f"{base_url}/knowledge_graph"
+        # 预先拼接各接口地址，避免每次请求重复格式化
+        self.url_create_node = f"{self.kg_prefix}/create_node"
+        self.url_create_edge = f"{self.kg_prefix}/create_edge"
+        self.url_batch_create_nodes = f"{self.kg_prefix}/batch_create_nodes"
+        self.url_batch_create_edges = f"{self.kg_prefix}/batch_create_edges"
+        self.url_search_nodes = f"{self.kg_prefix}/search_nodes"
+        self.url_get_neighbors = f"{self.kg_prefix}/get_neighbors"
+        self.url_find_path = f"{self.kg_prefix}/find_path"
+        self.url_get_stats = f"{self.kg_prefix}/get_stats"
+        self.url_export_graph = f"{self.kg_prefix}/export_graph"
+        self.url_import_graph = f"{self.kg_prefix}/import_graph"
+        self.url_chat = f"{self.kg_prefix}/chat"
+        self.url_query = f"{self.kg_prefix}/query"
+        # 使用MessagePack传输请求/响应体；响应若为JSON则按JSON解析
+        self.use_msgpack = use_msgpack
+
+        # 复用连接池中的 keep-alive 连接，避免每个请求重新建立TCP连接
+        # （uvicorn 只提供明文 HTTP/1.1，不会协商 HTTP/2 多路复用）
+        self.client = httpx.Client(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+
+    def close(self):
+        """关闭底层连接池"""
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _post(self, url: str, data: Dict) -> Dict:
+        if self.use_msgpack:
+            body = msgspec.msgpack.encode(data)
+            headers = {"Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE}
+        else:
+            body = orjson.dumps(data)
+            headers = {"Content-Type": "application/json"}
+        if len(body) > GZIP_MIN_SIZE:
+            body = gzip.compress(body, compresslevel=3)
+            headers["Content-Encoding"] = "gzip"
+        response = self.client.post(url, content=body, headers=headers)
+        return self._decode(response)
+
+    def _get(self, url: str, params: Dict) -> Dict:
+        headers = {"Accept": MSGPACK_MEDIA_TYPE} if self.use_msgpack else None
+        response = self.client.get(url, params=params, headers=headers)
+        return self._decode(response)
+
+    @staticmethod
+    def _decode(response: httpx.Response) -> Dict:
+        if response.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+            return msgspec.msgpack.decode(response.content)
+        return response.json()
 
     def create_node(
         self,
@@ -23,7 +86,7 @@ class KnowledgeGraphClient:
         properties: Dict = None,
     ) -> Dict:
         """创建节点"""
-        url = f"{self.kg_prefix}/create_node"
+        url = self.url_create_node
         data = {
             "kb_name": kb_name,
             "node_id": node_id,
@@ -31,8 +94,7 @@ class KnowledgeGraphClient:
             "node_type": node_type,
             "properties": properties,
         }
-        response = requests.post(url, json=data)
-        return response.json()
+        return self._post(url, data)
 
     def create_edge(
         self,
@@ -44,7 +106,7 @@ class KnowledgeGraphClient:
         weight: float = 1.0,
     ) -> Dict:
         """创建边"""
-        url = f"{self.kg_prefix}/create_edge"
+        url = self.url_create_edge
         data = {
             "kb_name": kb_name,
             "source_node_id": source_node_id,
@@ -53,29 +115,25 @@ class KnowledgeGraphClient:
             "properties": properties,
             "weight": weight,
         }
-        response = requests.post(url, json=data)
-        return response.json()
+        return self._post(url, data)
 
     def batch_create_nodes(self, kb_name: str, nodes: List[Dict]) -> Dict:
         """批量创建节点"""
-        url = f"{self.kg_prefix}/batch_create_nodes"
+        url = self.url_batch_create_nodes
         data = {"kb_name": kb_name, "nodes": nodes}
-        response = requests.post(url, json=data)
-        return response.json()
+        return self._post(url, data)
 
     def batch_create_edges(self, kb_name: str, edges: List[Dict]) -> Dict:
         """批量创建边"""
-        url = f"{self.kg_prefix}/batch_create_edges"
+        url = self.url_batch_create_edges
         data = {"kb_name": kb_name, "edges": edges}
-        response = requests.post(url, json=data)
-        return response.json()
+        return self._post(url, data)
 
     def search_nodes(self, kb_name: str, keyword: str, limit: int = 50) -> Dict:
         """搜索节点"""
-        url = f"{self.kg_prefix}/search_nodes"
+        url = self.url_search_nodes
         data = {"kb_name": kb_name, "keyword": keyword, "limit": limit}
-        response = requests.post(url, json=data)
-        return response.json()
+        return self._post(url, data)
 
     def get_neighbors(
         self,
@@ -85,15 +143,14 @@ class KnowledgeGraphClient:
         max_depth: int = 1,
     ) -> Dict:
         """获取邻居节点"""
-        url = f"{self.kg_prefix}/get_neighbors"
+        url = self.url_get_neighbors
         params = {
             "kb_name": kb_name,
             "node_id": node_id,
             "direction": direction,
             "max_depth": max_depth,
         }
-        response = requests.get(url, params=params)
-        return response.json()
+        return self._get(url, params)
 
     def find_path(
         self,
@@ -103,42 +160,47 @@ class KnowledgeGraphClient:
         max_length: int = 5,
     ) -> Dict:
         """查找路径"""
-        url = f"{self.kg_prefix}/find_path"
+        url = self.url_find_path
         params = {
             "kb_name": kb_name,
             "source_node_id": source_node_id,
             "target_node_id": target_node_id,
             "max_length": max_length,
         }
-        response = requests.get(url, params=params)
-        return response.json()
+        return self._get(url, params)
 
     def get_stats(self, kb_name: str) -> Dict:
         """获取统计信息"""
-        url = f"{self.kg_prefix}/get_stats"
+        url = self.url_get_stats
         params = {"kb_name": kb_name}
-        response = requests.get(url, params=params)
-        return response.json()
+        return self._get(url, params)
 
     def export_graph(self, kb_name: str) -> Dict:
-        """导出图谱"""
-        url = f"{self.kg_prefix}/export_graph"
-        params = {"kb_name": kb_name}
-        response = requests.get(url, params=params)
-        return response.json()
+        """导出图谱（NDJSON流式读取，边接收边解析）"""
+        url = self.url_export_graph
+        params = {"kb_name": kb_name, "stream": True}
+        graph_data = {"kb_name": kb_name, "nodes": [], "edges": []}
+        with self.client.stream("GET", url, params=params) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                record = orjson.loads(line)
+                record_type = record.pop("type")
+                graph_data["nodes" if record_type == "node" else "edges"].append(record)
+        return {"code": 200, "msg": "导出图谱成功", "data": graph_data}
 
     def import_graph(
         self, kb_name: str, graph_data: Dict, clear_existing: bool = False
     ) -> Dict:
         """导入图谱"""
-        url = f"{self.kg_prefix}/import_graph"
+        url = self.url_import_graph
         data = {
             "kb_name": kb_name,
             "graph_data": graph_data,
             "clear_existing": clear_existing,
         }
-        response = requests.post(url, json=data)
-        return response.json()
+        return self._post(url, data)
 
     def kg_chat(
         self,
@@ -147,9 +209,13 @@ class KnowledgeGraphClient:
         top_k: int = 10,
         history: List[Dict] = None,
         stream: bool = False,
-    ) -> Dict:
-        """知识图谱对话"""
-        url = f"{self.kg_prefix}/chat"
+    ):
+        """知识图谱对话
+
+        stream=True 时返回生成器，逐条产出服务端推送的SSE事件（已解析为dict），
+        第一条为图谱上下文来源，其后为LLM逐token输出
+        """
+        url = self.url_chat
         data = {
             "kb_name": kb_name,
             "query": query,
@@ -157,28 +223,89 @@ class KnowledgeGraphClient:
             "history": history or [],
             "stream": stream,
         }
-        response = requests.post(url, json=data, stream=stream)
-
         if stream:
-            return response
+            return self._iter_sse(url, data)
         else:
-            return response.json()
+            return self.client.post(url, json=data).json()
+
+    def _iter_sse(self, url: str, data: Dict):
+        """按行读取SSE响应，到达一条事件即产出一条"""
+        with self.client.stream("POST", url, json=data) as response:
+            for line in response.iter_lines():
+                if line.startswith("data:"):
+                    yield orjson.loads(line[5:])
 
     def simple_query(self, kb_name: str, query: str, top_k: int = 10) -> Dict:
         """简单查询"""
-        url = f"{self.kg_prefix}/query"
+        url = self.url_query
         data = {"kb_name": kb_name, "query": query, "top_k": top_k}
-        response = requests.post(url, json=data)
+        return self._post(url, data)
+
+
+class AsyncKnowledgeGraphClient:
+    """知识图谱异步客户端，用于并发发送相互独立的请求"""
+
+    def __init__(self, base_url: str = "http://localhost:7861", use_msgpack: bool = True):
+        self.base_url = base_url
+        self.kg_prefix = f"{base_url}/knowledge_graph"
+        self.url_batch_create_nodes = f"{self.kg_prefix}/batch_create_nodes"
+        self.url_batch_create_edges = f"{self.kg_prefix}/batch_create_edges"
+        self.use_msgpack = use_msgpack
+        # 并发请求分布在连接池的多个 HTTP/1.1 keep-alive 连接上
+        self.client = httpx.AsyncClient(limits=httpx.Limits(max_connections=32))
+
+    async def aclose(self):
+        """关闭底层连接池"""
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def _post(self, url: str, data: Dict) -> Dict:
+        if self.use_msgpack:
+            response = await self.client.post(
+                url,
+                content=msgspec.msgpack.encode(data),
+                headers={"Content-Type": MSGPACK_MEDIA_TYPE, "Accept": MSGPACK_MEDIA_TYPE},
+            )
+        else:
+            response = await self.client.post(url, json=data)
+        if response.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+            return msgspec.msgpack.decode(response.content)
         return response.json()
 
+    async def batch_create_nodes(self, kb_name: str, nodes: List[Dict]) -> Dict:
+        """批量创建节点"""
+        url = self.url_batch_create_nodes
+        data = {"kb_name": kb_name, "nodes": nodes}
+        return await self._post(url, data)
+
+    async def batch_create_edges(self, kb_name: str, edges: List[Dict]) -> Dict:
+        """批量创建边"""
+        url = self.url_batch_create_edges
+        data = {"kb_name": kb_name, "edges": edges}
+        return await self._post(url, data)
 
-def example_1_build_company_graph():
+
+async def _batch_create_nodes_concurrently(
+    base_url: str, kb_name: str, *batches: List[Dict]
+):
+    """并发提交多批互不依赖的节点"""
+    async with AsyncKnowledgeGraphClient(base_url) as client:
+        return await asyncio.gather(
+            *(client.batch_create_nodes(kb_name, nodes) for nodes in batches)
+        )
+
+
+def example_1_build_company_graph(client: KnowledgeGraphClient):
     """示例1：构建公司组织架构图谱"""
     print("=" * 60)
     print("示例1：构建公司组织架构图谱")
     print("=" * 60)
 
-    client = KnowledgeGraphClient()
     kb_name = "company_org"
 
     # 创建人员节点
@@ -214,9 +341,6 @@ def example_1_build_company_graph():
         },
     ]
 
-    result = client.batch_create_nodes(kb_name, persons)
-    print(f"创建节点结果: {result['msg']}")
-
     # 创建部门节点
     print("\n2. 创建部门节点...")
     departments = [
@@ -234,8 +358,12 @@ def example_1_build_company_graph():
         },
     ]
 
-    result = client.batch_create_nodes(kb_name, departments)
-    print(f"创建部门节点结果: {result['msg']}")
+    # 人员与部门节点互不依赖，并发提交
+    person_result, dept_result = asyncio.run(
+        _batch_create_nodes_concurrently(client.base_url, kb_name, persons, departments)
+    )
+    print(f"创建节点结果: {person_result['msg']}")
+    print(f"创建部门节点结果: {dept_result['msg']}")
 
     # 创建关系
     print("\n3. 创建组织关系...")
@@ -287,13 +415,12 @@ def example_1_build_company_graph():
     print("\n示例1完成！")
 
 
-def example_2_query_graph():
+def example_2_query_graph(client: KnowledgeGraphClient):
     """示例2：查询图谱"""
     print("\n" + "=" * 60)
     print("示例2：查询图谱")
     print("=" * 60)
 
-    client = KnowledgeGraphClient()
     kb_name = "company_org"
 
     # 搜索节点
@@ -329,13 +456,12 @@ def example_2_query_graph():
     print("\n示例2完成！")
 
 
-def example_3_kg_chat():
+def example_3_kg_chat(client: KnowledgeGraphClient):
     """示例3：基于知识图谱的对话"""
     print("\n" + "=" * 60)
     print("示例3：基于知识图谱的对话")
     print("=" * 60)
 
-    client = KnowledgeGraphClient()
     kb_name = "company_org"
 
     # 简单查询（不使用LLM）
@@ -349,29 +475,33 @@ def example_3_kg_chat():
     print("\n2. LLM对话：张三管理哪些人？")
     print("注意：此功能需要正确配置LLM才能使用")
 
-    # 取消注释以下代码来测试LLM对话
+    # 取消注释以下代码来测试LLM对话（流式输出，token到达即打印）
     # try:
-    #     result = client.kg_chat(
+    #     events = client.kg_chat(
     #         kb_name=kb_name,
     #         query="张三管理哪些人？他们分别在哪个部门？",
     #         top_k=10,
-    #         stream=False
+    #         stream=True
     #     )
-    #     if result["code"] == 200:
-    #         print(f"LLM回答: {result['data']}")
+    #     print("LLM回答: ", end="", flush=True)
+    #     for event in events:
+    #         if event.get("type") == "source":
+    #             continue
+    #         delta = event["choices"][0].get("delta") or {}
+    #         print(delta.get("content", ""), end="", flush=True)
+    #     print()
     # except Exception as e:
     #     print(f"LLM对话失败: {e}")
 
     print("\n示例3完成！")
 
 
-def example_4_export_import():
+def example_4_export_import(client: KnowledgeGraphClient):
     """示例4：导出和导入图谱"""
     print("\n" + "=" * 60)
     print("示例4：导出和导入图谱")
     print("=" * 60)
 
-    client = KnowledgeGraphClient()
     kb_name = "company_org"
 
     # 导出图谱
@@ -385,8 +515,8 @@ def example_4_export_import():
 
         # 保存到文件
         filename = f"{kb_name}_export.json"
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(graph_data, f, ensure_ascii=False, indent=2)
+        with open(filename, "wb") as f:
+            f.write(orjson.dumps(graph_data, option=orjson.OPT_INDENT_2))
         print(f"已保存到文件: {filename}")
 
         # 导入到新知识库
@@ -412,17 +542,18 @@ def main():
     print("=" * 60)
 
     try:
-        # 运行示例
-        example_1_build_company_graph()
-        example_2_query_graph()
-        example_3_kg_chat()
-        example_4_export_import()
+        # 所有示例共用同一个客户端（及其连接池）
+        with KnowledgeGraphClient() as client:
+            example_1_build_company_graph(client)
+            example_2_query_graph(client)
+            example_3_kg_chat(client)
+            example_4_export_import(client)
 
         print("\n" + "=" * 60)
         print("所有示例运行完成！")
         print("=" * 60)
 
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print("\n错误：无法连接到服务器，请确保Chatchat服务已启动")
     except Exception as e:
         print(f"\n错误：{e}")
@@ -2,39 +2,292 @@
 知识图谱API路由
 提供知识图谱的增删改查、导入导出、可视化等接口
 """
-from typing import Dict, List, Optional
+import zlib
+from typing import (
+    Any,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import quote
 
+import msgspec
+import orjson
 from fastapi import APIRouter, Body, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
 
 from chatchat.server.chat.kg_chat import kg_chat, simple_kg_query
-from chatchat.server.knowledge_base.kg_service import KnowledgeGraphService
+from chatchat.server.knowledge_base.kg_service import get_kg_service
 from chatchat.server.utils import BaseResponse, ListResponse
 
-kg_router = APIRouter(prefix="/knowledge_graph", tags=["Knowledge Graph Management"])
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
 
+# gzip 压缩的请求体解压后的最大字节数，防止压缩炸弹耗尽内存
+MAX_INFLATED_BODY_SIZE = 512 * 1024 * 1024
 
-@kg_router.post("/create_node", response_model=BaseResponse, summary="创建图谱节点")
-def create_node(
-    kb_name: str = Body(..., description="知识库名称", examples=["samples"]),
-    node_id: str = Body(..., description="节点唯一标识", examples=["node_1"]),
-    node_name: str = Body(..., description="节点名称", examples=["张三"]),
-    node_type: Optional[str] = Body(None, description="节点类型", examples=["Person"]),
-    properties: Optional[Dict] = Body(None, description="节点属性", examples=[{"age": 30}]),
-):
+
+class BodyTooLargeError(ValueError):
+    pass
+
+
+def gunzip_body(body: bytes, max_size: int = MAX_INFLATED_BODY_SIZE) -> bytes:
+    """
+    解压 gzip 请求体（支持多个 gzip 成员拼接），解压后超过 max_size 时抛出 BodyTooLargeError
+    数据不是合法的 gzip 时抛出 zlib.error，数据被截断时抛出 EOFError
+    """
+    chunks = []
+    size = 0
+    while True:
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        chunk = decompressor.decompress(body, max_size - size + 1)
+        size += len(chunk)
+        if size > max_size:
+            raise BodyTooLargeError(f"解压后的请求体超过 {max_size} 字节")
+        chunks.append(chunk)
+        if not decompressor.eof:
+            raise EOFError("gzip 数据不完整")
+        body = decompressor.unused_data
+        if not body:
+            return b"".join(chunks)
+
+
+class MsgpackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return msgspec.msgpack.encode(content)
+
+
+class KGGZipMiddleware(GZipMiddleware):
+    """
+    仅对知识图谱接口的响应做 gzip 压缩
+    SSE 对话接口不压缩，避免 gzip 缓冲导致逐 token 推送被延迟
+    文件下载接口自行决定是否输出 .gz 文件，不再重复压缩
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "") if scope["type"] == "http" else ""
+        if path.startswith("/knowledge_graph/") and path not in (
+            "/knowledge_graph/chat",
+            "/knowledge_graph/download_graph",
+        ):
+            await super().__call__(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+class MsgpackRoute(APIRoute):
+    """
+    支持 MessagePack 的路由：
+    - 请求头 Content-Encoding 为 gzip 时，先解压请求体
+    - 请求头 Content-Type 为 application/msgpack 时，用 msgspec 解码请求体
+    - 请求头 Accept 包含 application/msgpack 时，以 MessagePack 编码返回
+    其它情况保持原有的 JSON 行为
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original_route_handler = super().get_route_handler()
+
+        # 直接读取原始请求体的接口（如 msgspec 请求模型）自行处理 MessagePack
+        has_body_params = bool(self.dependant.body_params)
+
+        async def route_handler(request: Request) -> Response:
+            if request.headers.get("content-encoding", "") == "gzip":
+                try:
+                    body = gunzip_body(await request.body())
+                except BodyTooLargeError as e:
+                    return ORJSONResponse(
+                        status_code=413, content=BaseResponse(code=413, msg=str(e)).model_dump()
+                    )
+                except (zlib.error, EOFError) as e:
+                    return ORJSONResponse(
+                        status_code=400,
+                        content=BaseResponse(code=400, msg=f"请求体 gzip 解压失败: {e}").model_dump(),
+                    )
+                request.scope["headers"] = [
+                    (k, v)
+                    for k, v in request.scope["headers"]
+                    if k not in (b"content-encoding", b"content-length")
+                ]
+                request = Request(request.scope, request.receive)
+                request._body = body
+
+            content_type = request.headers.get("content-type", "")
+            if has_body_params and content_type.startswith(MSGPACK_MEDIA_TYPE):
+                body = await request.body()
+                try:
+                    data = msgspec.msgpack.decode(body) if body else None
+                except msgspec.DecodeError as e:
+                    return decode_error_response(e)
+                # 伪装为 JSON 请求，并预先填充解码结果，FastAPI 会直接复用 request._json
+                headers = [
+                    (k, v) for k, v in request.scope["headers"] if k != b"content-type"
+                ]
+                headers.append((b"content-type", b"application/json"))
+                request.scope["headers"] = headers
+                request = Request(request.scope, request.receive)
+                request._body = body
+                request._json = data
+
+            response = await original_route_handler(request)
+            if MSGPACK_MEDIA_TYPE in request.headers.get("accept", "") and isinstance(
+                response, JSONResponse
+            ):
+                # 接口返回的 JSON 响应重新以 MessagePack 编码，流式响应等其它类型保持不变
+                return MsgpackResponse(
+                    msgspec.json.decode(response.body),
+                    status_code=response.status_code,
+                    headers={
+                        k: v
+                        for k, v in response.headers.items()
+                        if k not in ("content-length", "content-type")
+                    },
+                    background=response.background,
+                )
+            return response
+
+        return route_handler
+
+
+class NodeSpec(msgspec.Struct):
+    node_id: str
+    node_name: str
+    node_type: Optional[str] = None
+    properties: Optional[Dict] = None
+
+
+class EdgeSpec(msgspec.Struct):
+    source_node_id: str
+    target_node_id: str
+    relation_type: Optional[str] = None
+    properties: Optional[Dict] = None
+    weight: float = 1.0
+
+
+class CreateNodeReq(NodeSpec, kw_only=True):
+    kb_name: str
+
+
+class CreateEdgeReq(EdgeSpec, kw_only=True):
+    kb_name: str
+
+
+class BatchCreateNodesReq(msgspec.Struct):
+    kb_name: str
+    nodes: List[NodeSpec]
+
+
+class BatchCreateEdgesReq(msgspec.Struct):
+    kb_name: str
+    edges: List[EdgeSpec]
+
+
+_decoders: Dict[type, Tuple[msgspec.json.Decoder, msgspec.msgpack.Decoder]] = {}
+
+
+async def decode_request(request: Request, req_type: type):
+    """
+    使用 msgspec 一次性完成请求体的解码和校验，支持 JSON 和 MessagePack
+    """
+    if req_type not in _decoders:
+        _decoders[req_type] = (
+            msgspec.json.Decoder(req_type),
+            msgspec.msgpack.Decoder(req_type),
+        )
+    json_decoder, msgpack_decoder = _decoders[req_type]
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith(MSGPACK_MEDIA_TYPE):
+        return msgpack_decoder.decode(body)
+    return json_decoder.decode(body)
+
+
+def decode_error_response(e: msgspec.DecodeError) -> ORJSONResponse:
+    """
+    请求体解码或校验失败时返回 HTTP 422，与 FastAPI 自带的参数校验保持一致
+    """
+    return ORJSONResponse(
+        status_code=422,
+        content=BaseResponse(code=422, msg=f"请求参数错误: {e}").model_dump(),
+    )
+
+
+def _inline_refs(schema: Any, defs: Dict[str, Any]) -> Any:
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if ref is not None:
+            return _inline_refs(defs[ref.rsplit("/", 1)[-1]], defs)
+        return {k: _inline_refs(v, defs) for k, v in schema.items()}
+    if isinstance(schema, list):
+        return [_inline_refs(v, defs) for v in schema]
+    return schema
+
+
+def request_body_openapi(req_type: type) -> Dict[str, Any]:
+    """
+    由 msgspec Struct 生成 OpenAPI 请求体描述
+    接口直接读取原始请求体，FastAPI 无法自动推断，需要通过 openapi_extra 发布
+    """
+    schema = msgspec.json.schema(req_type)
+    schema = _inline_refs(schema, schema.pop("$defs", {}))
+    content_schema = {"schema": schema}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": content_schema,
+                MSGPACK_MEDIA_TYPE: content_schema,
+            },
+        }
+    }
+
+
+kg_router = APIRouter(
+    prefix="/knowledge_graph",
+    tags=["Knowledge Graph Management"],
+    route_class=MsgpackRoute,
+    default_response_class=ORJSONResponse,
+)
+
+
+@kg_router.post(
+    "/create_node",
+    response_model=BaseResponse,
+    summary="创建图谱节点",
+    openapi_extra=request_body_openapi(CreateNodeReq),
+)
+async def create_node(request: Request):
     """
     创建知识图谱节点
+    请求体: kb_name, node_id, node_name, node_type(可选), properties(可选)
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
-        success = kg_service.add_node(
-            node_id=node_id,
-            node_name=node_name,
-            node_type=node_type,
-            properties=properties,
+        req = await decode_request(request, CreateNodeReq)
+    except msgspec.DecodeError as e:
+        return decode_error_response(e)
+
+    try:
+        kg_service = get_kg_service(req.kb_name)
+        success = await run_in_threadpool(
+            kg_service.add_node,
+            node_id=req.node_id,
+            node_name=req.node_name,
+            node_type=req.node_type,
+            properties=req.properties,
         )
 
         if success:
-            return BaseResponse(code=200, msg=f"成功创建节点 {node_name}")
+            return BaseResponse(code=200, msg=f"成功创建节点 {req.node_name}")
         else:
             return BaseResponse(code=500, msg="创建节点失败")
 
@@ -42,34 +295,35 @@ def create_node(
         return BaseResponse(code=500, msg=f"创建节点时出错: {str(e)}")
 
 
-@kg_router.post("/create_edge", response_model=BaseResponse, summary="创建图谱边")
-def create_edge(
-    kb_name: str = Body(..., description="知识库名称", examples=["samples"]),
-    source_node_id: str = Body(..., description="源节点ID", examples=["node_1"]),
-    target_node_id: str = Body(..., description="目标节点ID", examples=["node_2"]),
-    relation_type: Optional[str] = Body(
-        None, description="关系类型", examples=["knows"]
-    ),
-    properties: Optional[Dict] = Body(
-        None, description="边属性", examples=[{"since": "2020"}]
-    ),
-    weight: float = Body(1.0, description="边权重", examples=[1.0]),
-):
+@kg_router.post(
+    "/create_edge",
+    response_model=BaseResponse,
+    summary="创建图谱边",
+    openapi_extra=request_body_openapi(CreateEdgeReq),
+)
+async def create_edge(request: Request):
     """
     创建知识图谱边（关系）
+    请求体: kb_name, source_node_id, target_node_id, relation_type(可选), properties(可选), weight(可选)
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
-        success = kg_service.add_edge(
-            source_node_id=source_node_id,
-            target_node_id=target_node_id,
-            relation_type=relation_type,
-            properties=properties,
-            weight=weight,
+        req = await decode_request(request, CreateEdgeReq)
+    except msgspec.DecodeError as e:
+        return decode_error_response(e)
+
+    try:
+        kg_service = get_kg_service(req.kb_name)
+        success = await run_in_threadpool(
+            kg_service.add_edge,
+            source_node_id=req.source_node_id,
+            target_node_id=req.target_node_id,
+            relation_type=req.relation_type,
+            properties=req.properties,
+            weight=req.weight,
         )
 
         if success:
-            return BaseResponse(code=200, msg=f"成功创建关系 {relation_type}")
+            return BaseResponse(code=200, msg=f"成功创建关系 {req.relation_type}")
         else:
             return BaseResponse(code=500, msg="创建关系失败")
 
@@ -86,7 +340,7 @@ def get_node(
     获取节点详细信息
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         node = kg_service.get_node(node_id=node_id)
 
         if node:
@@ -108,7 +362,7 @@ def list_nodes(
     列出知识图谱中的节点
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         nodes = kg_service.list_nodes(node_type=node_type, limit=limit)
 
         return ListResponse(code=200, msg="获取节点列表成功", data=nodes)
@@ -128,7 +382,7 @@ def list_edges(
     列出知识图谱中的边
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         edges = kg_service.list_edges(
             node_id=node_id, relation_type=relation_type, limit=limit
         )
@@ -139,6 +393,27 @@ def list_edges(
         return ListResponse(code=500, msg=f"获取边列表时出错: {str(e)}", data=[])
 
 
+@kg_router.post(
+    "/list_subgraph_edges", response_model=ListResponse, summary="列出节点子图中的边"
+)
+def list_subgraph_edges(
+    kb_name: str = Body(..., description="知识库名称"),
+    node_ids: List[str] = Body(..., description="节点ID列表"),
+    limit: int = Body(1000, description="返回数量限制"),
+):
+    """
+    列出两端都在给定节点中的边，供可视化等只需要部分节点之间关系的场景使用
+    """
+    try:
+        kg_service = get_kg_service(kb_name)
+        edges = kg_service.list_subgraph_edges(node_ids=node_ids, limit=limit)
+
+        return ListResponse(code=200, msg="获取边列表成功", data=edges)
+
+    except Exception as e:
+        return ListResponse(code=500, msg=f"获取边列表时出错: {str(e)}", data=[])
+
+
 @kg_router.post("/update_node", response_model=BaseResponse, summary="更新节点")
 def update_node(
     kb_name: str = Body(..., description="知识库名称"),
@@ -151,7 +426,7 @@ def update_node(
     更新节点信息（实际上是覆盖更新）
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         success = kg_service.add_node(
             node_id=node_id,
             node_name=node_name,
@@ -181,7 +456,7 @@ def update_edge(
     更新边信息（实际上是覆盖更新）
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         success = kg_service.add_edge(
             source_node_id=source_node_id,
             target_node_id=target_node_id,
@@ -208,7 +483,7 @@ def delete_node(
     删除节点（会同时删除相关的边）
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         success = kg_service.delete_node(node_id=node_id)
 
         if success:
@@ -229,7 +504,7 @@ def delete_edge(
     删除边
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         success = kg_service.delete_edge(edge_id=edge_id)
 
         if success:
@@ -241,6 +516,42 @@ def delete_edge(
         return BaseResponse(code=500, msg=f"删除边时出错: {str(e)}")
 
 
+@kg_router.post("/batch_delete_nodes", response_model=BaseResponse, summary="批量删除节点")
+def batch_delete_nodes(
+    kb_name: str = Body(..., description="知识库名称"),
+    node_ids: List[str] = Body(..., description="节点ID列表"),
+):
+    """
+    批量删除节点（会同时删除相关的边）
+    """
+    try:
+        kg_service = get_kg_service(kb_name)
+        count = kg_service.bulk_delete_nodes(node_ids=node_ids)
+
+        return BaseResponse(code=200, msg=f"批量删除完成: 删除 {count} 个节点")
+
+    except Exception as e:
+        return BaseResponse(code=500, msg=f"批量删除节点时出错: {str(e)}")
+
+
+@kg_router.post("/batch_delete_edges", response_model=BaseResponse, summary="批量删除边")
+def batch_delete_edges(
+    kb_name: str = Body(..., description="知识库名称"),
+    edge_ids: List[str] = Body(..., description="边ID列表"),
+):
+    """
+    批量删除边
+    """
+    try:
+        kg_service = get_kg_service(kb_name)
+        count = kg_service.bulk_delete_edges(edge_ids=edge_ids)
+
+        return BaseResponse(code=200, msg=f"批量删除完成: 删除 {count} 条边")
+
+    except Exception as e:
+        return BaseResponse(code=500, msg=f"批量删除边时出错: {str(e)}")
+
+
 @kg_router.post("/search_nodes", response_model=ListResponse, summary="搜索节点")
 def search_nodes(
     kb_name: str = Body(..., description="知识库名称"),
@@ -251,7 +562,7 @@ def search_nodes(
     根据关键词搜索节点
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         nodes = kg_service.search_nodes(keyword=keyword, limit=limit)
 
         return ListResponse(code=200, msg="搜索成功", data=nodes)
@@ -271,7 +582,7 @@ def get_neighbors(
     获取节点的邻居节点和关系
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         result = kg_service.get_neighbors(
             node_id=node_id, direction=direction, max_depth=max_depth
         )
@@ -287,18 +598,28 @@ def find_path(
     kb_name: str = Query(..., description="知识库名称"),
     source_node_id: str = Query(..., description="源节点ID"),
     target_node_id: str = Query(..., description="目标节点ID"),
-    max_length: int = Query(5, description="最大路径长度"),
+    max_length: int = Query(5, ge=1, description="最大路径长度"),
+    shortest_only: bool = Query(False, description="是否只返回最短路径，默认返回所有简单路径"),
 ):
     """
     查找两个节点之间的路径
+    默认返回所有不超过 max_length 的简单路径，路径数可能随 max_length 急剧增长；
+    shortest_only=true 时只返回不超过 max_length 的最短路径，使用双向BFS，速度快得多
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
-        paths = kg_service.find_path(
-            source_node_id=source_node_id,
-            target_node_id=target_node_id,
-            max_length=max_length,
-        )
+        kg_service = get_kg_service(kb_name)
+        if shortest_only:
+            paths = kg_service.find_path_bidirectional(
+                source_node_id=source_node_id,
+                target_node_id=target_node_id,
+                max_length=max_length,
+            )
+        else:
+            paths = kg_service.find_path(
+                source_node_id=source_node_id,
+                target_node_id=target_node_id,
+                max_length=max_length,
+            )
 
         return BaseResponse(
             code=200, msg=f"找到 {len(paths)} 条路径", data={"paths": paths}
@@ -316,7 +637,7 @@ def get_stats(
     获取知识图谱的统计信息
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         stats = kg_service.get_stats()
 
         return BaseResponse(code=200, msg="获取统计信息成功", data=stats)
@@ -333,7 +654,7 @@ def clear_graph(
     清空知识库的所有图谱数据
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         success = kg_service.clear_graph()
 
         if success:
@@ -348,12 +669,21 @@ def clear_graph(
 @kg_router.get("/export_graph", response_model=BaseResponse, summary="导出图谱")
 def export_graph(
     kb_name: str = Query(..., description="知识库名称"),
+    stream: bool = Query(False, description="以NDJSON流式导出，每行一个节点或边"),
 ):
     """
     导出知识图谱数据（JSON格式）
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
+        if stream:
+
+            def _stream():
+                for record in kg_service.iter_export():
+                    yield orjson.dumps(record) + b"\n"
+
+            return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
         graph_data = kg_service.export_graph()
 
         return BaseResponse(code=200, msg="导出图谱成功", data=graph_data)
@@ -362,6 +692,68 @@ def export_graph(
         return BaseResponse(code=500, msg=f"导出图谱时出错: {str(e)}")
 
 
+def _iter_graph_file(kg_service, batch_size: int = 1000) -> Iterator[bytes]:
+    """
+    逐段产出与 /import_graph 格式一致的完整JSON文档 {"kb_name", "nodes", "edges"}
+    每 batch_size 条记录合并为一段输出，不在内存中组装整个图谱
+    """
+    buf = [b'{"kb_name":' + orjson.dumps(kg_service.kb_name) + b',"nodes":[']
+    section, section_count = "node", 0
+    for record in kg_service.iter_export():
+        record_type = record.pop("type")
+        # iter_export 先产出全部节点，再产出全部边
+        if record_type != section:
+            buf.append(b'],"edges":[')
+            section, section_count = record_type, 0
+        if section_count:
+            buf.append(b",")
+        buf.append(orjson.dumps(record))
+        section_count += 1
+        if len(buf) >= batch_size:
+            yield b"".join(buf)
+            buf = []
+    buf.append(b"]}" if section == "edge" else b'],"edges":[]}')
+    yield b"".join(buf)
+
+
+def _gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """将字节流逐段压缩为 gzip 格式"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@kg_router.get("/download_graph", summary="下载图谱文件")
+def download_graph(
+    kb_name: str = Query(..., description="知识库名称"),
+    compress: bool = Query(True, description="是否下载 gzip 压缩的 .json.gz 文件"),
+):
+    """
+    以附件形式流式下载可直接导入的图谱JSON文件，供浏览器直接下载大型图谱，
+    服务端按页读取数据库并逐段输出，不缓存整个图谱
+    """
+    try:
+        kg_service = get_kg_service(kb_name)
+        chunks = _iter_graph_file(kg_service)
+        file_name = f"{kb_name}_graph_export.json"
+        media_type = "application/json"
+        if compress:
+            chunks = _gzip_stream(chunks)
+            file_name += ".gz"
+            media_type = "application/gzip"
+        return StreamingResponse(
+            chunks,
+            media_type=media_type,
+            headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_name)}"},
+        )
+
+    except Exception as e:
+        return BaseResponse(code=500, msg=f"导出图谱时出错: {str(e)}")
+
+
 @kg_router.post("/import_graph", response_model=BaseResponse, summary="导入图谱")
 def import_graph(
     kb_name: str = Body(..., description="知识库名称"),
@@ -372,7 +764,7 @@ def import_graph(
     导入知识图谱数据
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         success = kg_service.import_graph(
             graph_data=graph_data, clear_existing=clear_existing
         )
@@ -386,73 +778,112 @@ def import_graph(
         return BaseResponse(code=500, msg=f"导入图谱时出错: {str(e)}")
 
 
+@kg_router.get(
+    "/export_graph_arrow", response_model=BaseResponse, summary="导出图谱（Arrow IPC）"
+)
+def export_graph_arrow(
+    kb_name: str = Query(..., description="知识库名称"),
+):
+    """
+    以 Arrow IPC 流格式导出知识图谱数据，依次为节点和边两个IPC流（需要安装 pyarrow）
+    """
+    try:
+        kg_service = get_kg_service(kb_name)
+        streams = kg_service.export_arrow()
+        return StreamingResponse(iter(streams), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+    except Exception as e:
+        return BaseResponse(code=500, msg=f"导出图谱时出错: {str(e)}")
+
+
 @kg_router.post(
-    "/batch_create_nodes", response_model=BaseResponse, summary="批量创建节点"
+    "/import_graph_arrow", response_model=BaseResponse, summary="导入图谱（Arrow IPC）"
 )
-def batch_create_nodes(
-    kb_name: str = Body(..., description="知识库名称"),
-    nodes: List[Dict] = Body(..., description="节点列表"),
+async def import_graph_arrow(
+    request: Request,
+    kb_name: str = Query(..., description="知识库名称"),
+    clear_existing: bool = Query(False, description="是否清空现有数据"),
 ):
+    """
+    导入 /export_graph_arrow 导出的 Arrow IPC 数据，请求体为原始二进制
+    """
+    try:
+        body = await request.body()
+        kg_service = get_kg_service(kb_name)
+        counts = await run_in_threadpool(kg_service.import_arrow, body, clear_existing)
+
+        return BaseResponse(
+            code=200,
+            msg=f"成功导入图谱数据到 {kb_name}: {counts['node_count']} 个节点, {counts['edge_count']} 条边",
+            data=counts,
+        )
+
+    except Exception as e:
+        return BaseResponse(code=500, msg=f"导入图谱时出错: {str(e)}")
+
+
+@kg_router.post(
+    "/batch_create_nodes",
+    response_model=BaseResponse,
+    summary="批量创建节点",
+    openapi_extra=request_body_openapi(BatchCreateNodesReq),
+)
+async def batch_create_nodes(request: Request):
     """
     批量创建节点
+    请求体: kb_name, nodes
     每个节点应包含: node_id, node_name, node_type(可选), properties(可选)
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
-        success_count = 0
-        failed_count = 0
-
-        for node in nodes:
-            success = kg_service.add_node(
-                node_id=node["node_id"],
-                node_name=node["node_name"],
-                node_type=node.get("node_type"),
-                properties=node.get("properties"),
-            )
-            if success:
-                success_count += 1
-            else:
-                failed_count += 1
+        req = await decode_request(request, BatchCreateNodesReq)
+    except msgspec.DecodeError as e:
+        return decode_error_response(e)
+
+    try:
+        kg_service = get_kg_service(req.kb_name)
+        success_count = await run_in_threadpool(
+            kg_service.bulk_add_nodes, msgspec.to_builtins(req.nodes)
+        )
+        failed_count = len(req.nodes) - success_count
 
         return BaseResponse(
             code=200,
             msg=f"批量创建完成: 成功 {success_count} 个, 失败 {failed_count} 个",
+            data={"success_count": success_count, "failed_count": failed_count},
         )
 
     except Exception as e:
         return BaseResponse(code=500, msg=f"批量创建节点时出错: {str(e)}")
 
 
-@kg_router.post("/batch_create_edges", response_model=BaseResponse, summary="批量创建边")
-def batch_create_edges(
-    kb_name: str = Body(..., description="知识库名称"),
-    edges: List[Dict] = Body(..., description="边列表"),
-):
+@kg_router.post(
+    "/batch_create_edges",
+    response_model=BaseResponse,
+    summary="批量创建边",
+    openapi_extra=request_body_openapi(BatchCreateEdgesReq),
+)
+async def batch_create_edges(request: Request):
     """
     批量创建边
+    请求体: kb_name, edges
     每条边应包含: source_node_id, target_node_id, relation_type(可选), properties(可选), weight(可选)
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
-        success_count = 0
-        failed_count = 0
-
-        for edge in edges:
-            success = kg_service.add_edge(
-                source_node_id=edge["source_node_id"],
-                target_node_id=edge["target_node_id"],
-                relation_type=edge.get("relation_type"),
-                properties=edge.get("properties"),
-                weight=edge.get("weight", 1.0),
-            )
-            if success:
-                success_count += 1
-            else:
-                failed_count += 1
+        req = await decode_request(request, BatchCreateEdgesReq)
+    except msgspec.DecodeError as e:
+        return decode_error_response(e)
+
+    try:
+        kg_service = get_kg_service(req.kb_name)
+        success_count = await run_in_threadpool(
+            kg_service.bulk_add_edges, msgspec.to_builtins(req.edges)
+        )
+        failed_count = len(req.edges) - success_count
 
         return BaseResponse(
             code=200,
             msg=f"批量创建完成: 成功 {success_count} 个, 失败 {failed_count} 个",
+            data={"success_count": success_count, "failed_count": failed_count},
         )
 
     except Exception as e:
@@ -472,7 +903,7 @@ def get_context_for_llm(
     这个接口是为后续LLM问答集成准备的
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
         context = kg_service.get_graph_context_for_llm(query=query, top_k=top_k)
 
         return BaseResponse(code=200, msg="获取上下文成功", data={"context": context})
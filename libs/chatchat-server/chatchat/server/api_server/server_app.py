@@ -12,7 +12,7 @@ from chatchat import __version__
 from chatchat.settings import Settings
 from chatchat.server.api_server.chat_routes import chat_router
 from chatchat.server.api_server.kb_routes import kb_router
-from chatchat.server.api_server.kg_routes import kg_router
+from chatchat.server.api_server.kg_routes import KGGZipMiddleware, kg_router
 from chatchat.server.api_server.mcp_routes import mcp_router
 from chatchat.server.api_server.openai_routes import openai_router
 from chatchat.server.api_server.server_routes import server_router
@@ -36,6 +36,9 @@ def create_app(run_mode: str = None):
             allow_headers=["*"],
         )
 
+    # 压缩知识图谱接口的较大响应（如导出图谱、节点列表）
+    app.add_middleware(KGGZipMiddleware, minimum_size=1024)
+
     @app.get("/", summary="swagger 文档", include_in_schema=False)
     async def document():
         return RedirectResponse(url="/docs")
@@ -7,24 +7,28 @@ from __future__ import annotations
 import asyncio
 import json
 import uuid
-from typing import AsyncIterable, List, Optional, Literal
+from typing import AsyncIterable, Dict, List, Optional, Literal
 
+import orjson
 from fastapi import Body, Request
 from fastapi.concurrency import run_in_threadpool
 from langchain.callbacks import AsyncIteratorCallbackHandler
 from langchain.prompts.chat import ChatPromptTemplate
+from memoization import cached, CachingAlgorithmFlag
 from sse_starlette.sse import EventSourceResponse
 
 from chatchat.server.api_server.api_schemas import OpenAIChatOutput
-from chatchat.server.chat.utils import History
-from chatchat.server.knowledge_base.kb_service.base import KBServiceFactory
+from chatchat.server.chat.utils import History, batch_stream_tokens
+from chatchat.server.knowledge_base.kb_service.base import KBService, KBServiceFactory
+from chatchat.server.knowledge_base.kb_cache.semantic_cache import get_semantic_cache
 from chatchat.server.knowledge_base.kb_doc_api import search_docs
-from chatchat.server.knowledge_base.kg_service import KnowledgeGraphService
+from chatchat.server.knowledge_base.kg_service import get_kg_service
 from chatchat.server.knowledge_base.utils import format_reference
 from chatchat.server.utils import (
     BaseResponse,
     get_ChatOpenAI,
     get_default_llm,
+    get_Embeddings,
     get_prompt_template,
     wrap_done,
     build_logger,
@@ -37,6 +41,32 @@ from chatchat.settings import Settings
 logger = build_logger()
 
 
+@cached(max_size=256, ttl=120, algorithm=CachingAlgorithmFlag.LRU)
+def search_kb_docs_cached(
+    kb_name: str, query: str, top_k: int, score_threshold: float, kb_version: int
+) -> List[Dict]:
+    """
+    带缓存的知识库检索，热门问题在 ttl 内直接复用检索结果，避免重复的向量检索
+    kb_version 为知识库内容版本号（KBService.get_version），文档增删改后版本变化，旧结果不再命中
+    """
+    return search_docs(
+        query=query,
+        knowledge_base_name=kb_name,
+        top_k=top_k,
+        score_threshold=score_threshold,
+        file_name="",
+        metadata={},
+    )
+
+
+def join_kb_docs(docs: List[Dict]) -> str:
+    """拼接检索到的文档作为上下文，单段文档超过 KB_CONTEXT_MAX_LENGTH 时截断"""
+    max_length = Settings.kb_settings.KB_CONTEXT_MAX_LENGTH
+    if max_length > 0:
+        return "\n\n".join(doc["page_content"][:max_length] for doc in docs)
+    return "\n\n".join(doc["page_content"] for doc in docs)
+
+
 def get_enhanced_chat_prompt() -> str:
     """获取增强型对话的提示词模板"""
     return """你是一个智能助手，可以利用知识图谱中的结构化知识和知识库中的文档内容来回答用户问题。
@@ -63,6 +93,10 @@ def get_enhanced_chat_prompt() -> str:
 回答:"""
 
 
+# 模板在导入时解析一次，各请求直接复用
+ENHANCED_CHAT_PROMPT = ChatPromptTemplate.from_template(get_enhanced_chat_prompt())
+
+
 async def enhanced_kg_chat(
     query: str = Body(..., description="用户输入", examples=["请介绍一下相关内容"]),
     kb_name: str = Body(..., description="知识库名称", examples=["samples"]),
@@ -106,7 +140,8 @@ async def enhanced_kg_chat(
     - 知识库：提供相关的文档片段
     """
     
-    # 验证知识库是否存在
+    # 验证知识库是否存在，检索时直接复用该实例
+    kb = None
     if use_kb:
         kb = KBServiceFactory.get_service_by_name(kb_name)
         if kb is None:
@@ -114,61 +149,83 @@ async def enhanced_kg_chat(
 
     async def enhanced_chat_iterator() -> AsyncIterable[str]:
         nonlocal max_tokens
+        # 整个回答共用一个id
+        chat_id = f"chat{uuid.uuid4().hex}"
         
         try:
-            # 处理历史对话
-            history_list = [History.from_data(h) for h in history]
-            
             # 1. 获取知识图谱上下文
-            kg_context = ""
-            kg_source = None
-            if use_kg:
+            def _load_kg():
+                kg_service = get_kg_service(kb_name)
+                # 一次节点搜索同时得到上下文和来源节点
+                kg_context, nodes = kg_service.get_context_and_nodes(query=query, top_k=kg_top_k)
+                kg_source = None
+                if kg_context:
+                    kg_source = {
+                        "type": "knowledge_graph",
+                        "kb_name": kb_name,
+                        "node_count": len(nodes),
+                        "nodes": [{"id": n["node_id"], "name": n["node_name"], "type": n.get("node_type")} for n in nodes[:5]]
+                    }
+                return kg_context, kg_source
+
+            async def _fetch_kg():
+                if not use_kg:
+                    return "", None
                 try:
-                    kg_service = KnowledgeGraphService(kb_name=kb_name)
-                    kg_context = await run_in_threadpool(
-                        kg_service.get_graph_context_for_llm, query=query, top_k=kg_top_k
-                    )
-                    if kg_context:
-                        # 获取相关节点信息作为来源
-                        nodes = await run_in_threadpool(
-                            kg_service.search_nodes, keyword=query, limit=kg_top_k
-                        )
-                        kg_source = {
-                            "type": "knowledge_graph",
-                            "kb_name": kb_name,
-                            "node_count": len(nodes),
-                            "nodes": [{"id": n["node_id"], "name": n["node_name"], "type": n.get("node_type")} for n in nodes[:5]]
-                        }
+                    return await run_in_threadpool(_load_kg)
                 except Exception as e:
                     logger.warning(f"获取知识图谱上下文失败: {e}")
-                    kg_context = ""
-            
+                    return "", None
+
             # 2. 获取知识库文档上下文
-            kb_context = ""
-            source_documents = []
-            if use_kb:
+            def _embed_query():
                 try:
-                    kb = KBServiceFactory.get_service_by_name(kb_name)
-                    if kb:
-                        ok, msg = kb.check_embed_model()
-                        if ok:
-                            docs = await run_in_threadpool(
-                                search_docs,
-                                query=query,
-                                knowledge_base_name=kb_name,
-                                top_k=kb_top_k,
-                                score_threshold=score_threshold,
-                                file_name="",
-                                metadata={},
-                            )
-                            if docs:
-                                kb_context = "\n\n".join([doc["page_content"] for doc in docs])
-                                source_documents = format_reference(kb_name, docs, api_address(is_public=True))
-                        else:
-                            logger.warning(f"嵌入模型检查失败: {msg}")
+                    # 查询向量会被缓存（见 QueryCachedEmbeddings），未命中语义缓存时向量检索直接复用
+                    return get_Embeddings(kb.embed_model).embed_query(query)
+                except Exception as e:
+                    logger.warning(f"查询向量化失败，跳过语义缓存: {e}")
+                    return None
+
+            def _load_kb():
+                # 语义缓存：与近期相似问题复用知识库检索结果
+                semantic_cache = get_semantic_cache((kb_name, kb_top_k, score_threshold))
+                kb_version = KBService.get_version(kb_name)
+                query_embedding = _embed_query()
+                if query_embedding is not None:
+                    cached = semantic_cache.get(query_embedding)
+                    # 缓存结果带有知识库版本号，文档增删改后不再复用
+                    if cached is not None and cached[0] == kb_version:
+                        return cached[1]
+
+                ok, msg = kb.check_embed_model()
+                if not ok:
+                    logger.warning(f"嵌入模型检查失败: {msg}")
+                    return "", []
+                result = "", []
+                docs = search_kb_docs_cached(kb_name, query, kb_top_k, score_threshold, kb_version)
+                if docs:
+                    kb_context = join_kb_docs(docs)
+                    source_documents = format_reference(kb_name, docs, api_address(is_public=True))
+                    result = kb_context, source_documents
+                if query_embedding is not None:
+                    semantic_cache.set(query_embedding, (kb_version, result))
+                return result
+
+            async def _fetch_kb():
+                if not use_kb:
+                    return "", []
+                try:
+                    return await run_in_threadpool(_load_kb)
                 except Exception as e:
                     logger.warning(f"获取知识库文档上下文失败: {e}")
-                    kb_context = ""
+                    return "", []
+
+            # 知识图谱和知识库互不依赖，并发检索。
+            # 图谱上下文由关键词匹配节点得到，只按原问题缓存（get_context_and_nodes），
+            # 不参与语义缓存，避免只有实体名称不同的问题复用到其它节点的上下文
+            (kg_context, kg_source), (kb_context, source_documents) = await asyncio.gather(
+                _fetch_kg(), _fetch_kb()
+            )
             
             # 如果只需要返回检索结果
             if return_direct:
@@ -178,7 +235,7 @@ async def enhanced_kg_chat(
                     "kg_source": kg_source,
                 }
                 yield OpenAIChatOutput(
-                    id=f"chat{uuid.uuid4()}",
+                    id=chat_id,
                     model=None,
                     object="chat.completion",
                     content=json.dumps(result_data, ensure_ascii=False),
@@ -202,33 +259,24 @@ async def enhanced_kg_chat(
                 callbacks=callbacks,
             )
             
-            # 构建历史对话文本
+            # 构建历史对话文本（请求体中的history已由FastAPI解析为History对象）
             history_text = "\n".join(
-                [f"{h.role}: {h.content}" for h in history_list]
-            ) if history_list else "无历史对话"
-            
-            # 使用增强型提示词模板
-            prompt_template = get_enhanced_chat_prompt()
-            prompt = ChatPromptTemplate.from_template(prompt_template)
+                f"{h.role}: {h.content}" for h in map(History.from_data, history)
+            ) or "无历史对话"
             
             # 格式化上下文
             kg_context_formatted = kg_context if kg_context else "暂无相关知识图谱信息"
             kb_context_formatted = kb_context if kb_context else "暂无相关知识库文档"
             
             # 构建消息
-            messages = prompt.format_messages(
+            messages = ENHANCED_CHAT_PROMPT.format_messages(
                 kg_context=kg_context_formatted,
                 kb_context=kb_context_formatted,
                 history=history_text,
                 question=query,
             )
             
-            # 创建异步任务
-            task = asyncio.create_task(
-                wrap_done(llm.agenerate(messages=[messages]), callback.done)
-            )
-            
-            # 准备来源信息
+            # 准备来源信息，和首帧一起在启动LLM任务之前构建好，任务启动后立即返回来源
             all_sources = []
             if source_documents:
                 all_sources.extend(source_documents)
@@ -238,38 +286,55 @@ async def enhanced_kg_chat(
             if not all_sources:
                 all_sources.append("<span style='color:red'>未找到相关文档和图谱信息，该回答为大模型自身能力解答！</span>")
             
-            # 流式输出
             if stream:
-                # 先输出来源信息
-                ret = OpenAIChatOutput(
-                    id=f"chat{uuid.uuid4()}",
+                source_frame = OpenAIChatOutput(
+                    id=chat_id,
                     object="chat.completion.chunk",
                     content="",
                     role="assistant",
                     model=model,
                     docs=all_sources,
-                )
-                yield ret.model_dump_json()
+                ).model_dump_json()
+                # 各帧只有content不同，公共字段只构建一次，逐帧直接用orjson序列化
+                chunk_base = OpenAIChatOutput(
+                    id=chat_id,
+                    object="chat.completion.chunk",
+                    role="assistant",
+                    model=model,
+                ).model_dump()
+            
+            # 创建异步任务
+            task = asyncio.create_task(
+                wrap_done(llm.agenerate(messages=[messages]), callback.done)
+            )
+            
+            # 流式输出
+            if stream:
+                # 先输出来源信息，LLM此时已在后台开始生成
+                yield source_frame
                 
-                # 流式输出回答
-                async for token in callback.aiter():
+                # 流式输出回答，按小批次合并token
+                async for token in batch_stream_tokens(callback.aiter()):
                     if await request.is_disconnected():
                         break
-                    ret = OpenAIChatOutput(
-                        id=f"chat{uuid.uuid4()}",
-                        object="chat.completion.chunk",
-                        content=token,
-                        role="assistant",
-                        model=model,
-                    )
-                    yield ret.model_dump_json()
+                    yield orjson.dumps(
+                        {
+                            **chunk_base,
+                            "choices": [
+                                {
+                                    "delta": {"content": token, "tool_calls": []},
+                                    "role": "assistant",
+                                }
+                            ],
+                        }
+                    ).decode()
             else:
                 # 非流式输出
                 answer = ""
                 async for token in callback.aiter():
                     answer += token
                 ret = OpenAIChatOutput(
-                    id=f"chat{uuid.uuid4()}",
+                    id=chat_id,
                     object="chat.completion",
                     content=answer,
                     role="assistant",
@@ -319,36 +384,44 @@ async def get_combined_context(
         }
         
         # 获取知识图谱上下文
-        if use_kg:
+        async def _fetch_kg():
+            if not use_kg:
+                return
             try:
-                kg_service = KnowledgeGraphService(kb_name=kb_name)
-                kg_context = kg_service.get_graph_context_for_llm(query=query, top_k=kg_top_k)
-                nodes = kg_service.search_nodes(keyword=query, limit=kg_top_k)
+                kg_service = get_kg_service(kb_name)
+                kg_context, nodes = await run_in_threadpool(
+                    kg_service.get_context_and_nodes, query=query, top_k=kg_top_k
+                )
                 result["kg_context"] = kg_context
                 result["kg_nodes"] = nodes
             except Exception as e:
                 logger.warning(f"获取知识图谱上下文失败: {e}")
-        
+
         # 获取知识库文档上下文
-        if use_kb:
+        def _load_kb_docs():
+            kb = KBServiceFactory.get_service_by_name(kb_name)
+            if kb:
+                ok, msg = kb.check_embed_model()
+                if ok:
+                    return search_kb_docs_cached(
+                        kb_name, query, kb_top_k, score_threshold, KBService.get_version(kb_name)
+                    )
+            return None
+
+        async def _fetch_kb():
+            if not use_kb:
+                return
             try:
-                kb = KBServiceFactory.get_service_by_name(kb_name)
-                if kb:
-                    ok, msg = kb.check_embed_model()
-                    if ok:
-                        docs = search_docs(
-                            query=query,
-                            knowledge_base_name=kb_name,
-                            top_k=kb_top_k,
-                            score_threshold=score_threshold,
-                            file_name="",
-                            metadata={},
-                        )
-                        result["kb_context"] = "\n\n".join([doc["page_content"] for doc in docs])
-                        result["kb_docs"] = docs
+                docs = await run_in_threadpool(_load_kb_docs)
+                if docs is not None:
+                    result["kb_context"] = join_kb_docs(docs)
+                    result["kb_docs"] = docs
             except Exception as e:
                 logger.warning(f"获取知识库文档上下文失败: {e}")
-        
+
+        # 知识图谱和知识库互不依赖，并发检索
+        await asyncio.gather(_fetch_kg(), _fetch_kb())
+
         return BaseResponse(code=200, msg="获取上下文成功", data=result)
     
     except Exception as e:
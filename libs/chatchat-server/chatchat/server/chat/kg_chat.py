@@ -6,9 +6,11 @@ from __future__ import annotations
 
 import asyncio
 import json
+import uuid
 from typing import AsyncIterable, List, Optional
 from urllib.parse import urlencode
 
+import orjson
 from fastapi import Body, Request
 from fastapi.concurrency import run_in_threadpool
 from langchain.callbacks import AsyncIteratorCallbackHandler
@@ -16,8 +18,8 @@ from langchain.prompts.chat import ChatPromptTemplate
 from sse_starlette.sse import EventSourceResponse
 
 from chatchat.server.api_server.api_schemas import OpenAIChatOutput
-from chatchat.server.chat.utils import History
-from chatchat.server.knowledge_base.kg_service import KnowledgeGraphService
+from chatchat.server.chat.utils import History, batch_stream_tokens
+from chatchat.server.knowledge_base.kg_service import get_kg_service
 from chatchat.server.utils import (
     BaseResponse,
     get_ChatOpenAI,
@@ -46,6 +48,10 @@ def get_kg_chat_prompt() -> str:
 回答:"""
 
 
+# 模板在导入时解析一次，各请求直接复用
+KG_CHAT_PROMPT = ChatPromptTemplate.from_template(get_kg_chat_prompt())
+
+
 async def kg_chat(
     query: str = Body(..., description="用户输入", examples=["张三认识哪些人？"]),
     kb_name: str = Body(..., description="知识库名称", examples=["samples"]),
@@ -83,23 +89,21 @@ async def kg_chat(
     async def kg_chat_iterator() -> AsyncIterable[str]:
         nonlocal max_tokens
         callback = AsyncIteratorCallbackHandler()
+        # 整个回答共用一个id
+        chat_id = f"chat{uuid.uuid4().hex}"
 
         # 获取知识图谱服务
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
+        kg_service = get_kg_service(kb_name)
 
         # 从知识图谱中获取相关上下文
         context = await run_in_threadpool(
             kg_service.get_graph_context_for_llm, query=query, top_k=top_k
         )
 
-        # 构建历史对话文本
+        # 构建历史对话文本（请求体中的history已由FastAPI解析为History对象）
         history_text = "\n".join(
-            [f"{h['role']}: {h['content']}" for h in history]
-        )
-
-        # 构建提示词
-        prompt_template = get_kg_chat_prompt()
-        prompt = ChatPromptTemplate.from_template(prompt_template)
+            f"{h.role}: {h.content}" for h in map(History.from_data, history)
+        ) or "无历史对话"
 
         # 获取LLM
         llm = get_ChatOpenAI(
@@ -110,74 +114,75 @@ async def kg_chat(
         )
 
         # 构建最终的输入
-        messages = prompt.format_messages(
+        messages = KG_CHAT_PROMPT.format_messages(
             context=context if context else "暂无相关知识图谱信息",
-            history=history_text if history_text else "无历史对话",
+            history=history_text,
             question=query,
         )
 
+        # 来源信息和公共帧字段在启动LLM任务之前构建好，任务启动后立即返回来源
+        source_frame = None
+        if context:
+            source_frame = json.dumps(
+                {
+                    "type": "source",
+                    "data": {
+                        "kb_name": kb_name,
+                        "query": query,
+                        "context_preview": context[:500] + "..."
+                        if len(context) > 500
+                        else context,
+                    },
+                },
+                ensure_ascii=False,
+            )
+        # 各帧只有content不同，公共字段只构建一次，逐帧直接用orjson序列化
+        chunk_base = OpenAIChatOutput(id=chat_id, model=model).model_dump()
+
         # 创建任务
         task = asyncio.create_task(
             wrap_done(llm.agenerate(messages=[messages]), callback.done)
         )
 
-        source_documents = []
-
         # 流式输出
         if stream:
-            async for token in callback.aiter():
+            # 图谱上下文就绪后立即返回来源，LLM此时已在后台开始生成
+            if source_frame:
+                yield source_frame
+            # 按小批次合并token输出，减少每帧的序列化开销
+            async for token in batch_stream_tokens(callback.aiter()):
                 # 根据客户端是否断开连接，避免报错
                 if await request.is_disconnected():
                     break
-                yield json.dumps(
-                    OpenAIChatOutput(
-                        id=f"chat{id}",
-                        model=model,
-                        choices=[
+                yield orjson.dumps(
+                    {
+                        **chunk_base,
+                        "choices": [
                             {
-                                "index": 0,
-                                "delta": {"role": "assistant", "content": token},
+                                "delta": {"content": token, "tool_calls": []},
+                                "role": "assistant",
                             }
                         ],
-                    ).model_dump(),
-                    ensure_ascii=False,
-                )
+                    }
+                ).decode()
         else:
             answer = ""
             async for token in callback.aiter():
                 answer += token
-            yield json.dumps(
-                OpenAIChatOutput(
-                    id=f"chat{id}",
-                    model=model,
-                    choices=[
-                        {
-                            "index": 0,
-                            "message": {"role": "assistant", "content": answer},
-                            "finish_reason": "stop",
-                        }
-                    ],
-                ).model_dump(),
-                ensure_ascii=False,
-            )
+            yield OpenAIChatOutput(
+                id=chat_id,
+                object="chat.completion",
+                content=answer,
+                role="assistant",
+                model=model,
+                finish_reason="stop",
+            ).model_dump_json()
 
         await task
 
-        # 如果需要记录来源
-        if context:
-            yield json.dumps(
-                {
-                    "type": "source",
-                    "data": {
-                        "kb_name": kb_name,
-                        "query": query,
-                        "context_preview": context[:500] + "..."
-                        if len(context) > 500
-                        else context,
-                    },
-                },
-                ensure_ascii=False,
-            )
+        # 非流式模式下，在回答之后返回来源
+        if source_frame and not stream:
+            yield source_frame
 
     return EventSourceResponse(kg_chat_iterator())
 
@@ -193,32 +198,26 @@ async def simple_kg_query(
     直接返回知识图谱中的相关信息
     """
     try:
-        kg_service = KnowledgeGraphService(kb_name=kb_name)
-        
-        # 搜索相关节点
-        nodes = kg_service.search_nodes(keyword=query, limit=top_k)
+        kg_service = get_kg_service(kb_name)
         
-        # 获取相关的边
-        edges = []
-        for node in nodes:
-            node_edges = kg_service.list_edges(node_id=node["node_id"], limit=20)
-            edges.extend(node_edges)
+        # 搜索相关节点（数据库操作放到线程池，避免阻塞事件循环）
+        nodes = await run_in_threadpool(
+            kg_service.search_nodes, keyword=query, limit=top_k
+        )
         
-        # 去重边
-        unique_edges = []
-        seen = set()
-        for edge in edges:
-            edge_key = (edge["source_node_id"], edge["target_node_id"], edge["relation_type"])
-            if edge_key not in seen:
-                seen.add(edge_key)
-                unique_edges.append(edge)
+        # 一次查询获取所有相关的边（已去重）
+        edges = await run_in_threadpool(
+            kg_service.list_edges_for_nodes,
+            [node["node_id"] for node in nodes],
+            limit_per_node=20,
+        )
         
         return BaseResponse(
             code=200,
             msg="查询成功",
             data={
                 "nodes": nodes,
-                "edges": unique_edges,
+                "edges": edges,
                 "query": query,
             },
         )
@@ -1,17 +1,45 @@
 import json
 
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from chatchat.settings import Settings
 
 
+def _json_serializer(obj) -> str:
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        # orjson 不支持的值（如超过64位的整数）交给标准库处理
+        return json.dumps(obj, ensure_ascii=False)
+
+
+def _json_deserializer(s):
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        # 兼容标准库写入的 NaN/Infinity 等非标准 JSON
+        return json.loads(s)
+
+
 engine = create_engine(
     Settings.basic_settings.SQLALCHEMY_DATABASE_URI,
-    json_serializer=lambda obj: json.dumps(obj, ensure_ascii=False),
+    json_serializer=_json_serializer,
+    json_deserializer=_json_deserializer,
 )
 
+if engine.dialect.name == "sqlite":
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        # WAL 模式下读写互不阻塞，多个请求并发读取时不会被写入事务卡住
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base: DeclarativeMeta = declarative_base()
@@ -1,11 +1,28 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 
 from pydantic import BaseModel
-from sqlalchemy import Column, DateTime, Float, Integer, String, Text, func
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    String,
+    Text,
+    func,
+    inspect,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError, ProgrammingError
 
 from chatchat.server.db.base import Base
 
+# 属性使用数据库原生 JSON 类型（PostgreSQL 上为 JSONB），读写时不再手动 json.dumps/loads
+PropertiesType = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
+
 
 class KnowledgeGraphNodeModel(Base):
     """
@@ -13,12 +30,15 @@ class KnowledgeGraphNodeModel(Base):
     """
 
     __tablename__ = "knowledge_graph_node"
+    __table_args__ = (
+        Index("uq_knowledge_graph_node_kb_node", "kb_name", "node_id", unique=True),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True, comment="节点ID")
-    kb_name = Column(String(50), index=True, comment="所属知识库名称")
-    node_id = Column(String(100), index=True, comment="节点唯一标识")
+    kb_name = Column(String(50), comment="所属知识库名称")
+    node_id = Column(String(100), comment="节点唯一标识")
     node_type = Column(String(50), comment="节点类型")
     node_name = Column(String(200), comment="节点名称")
-    properties = Column(Text, comment="节点属性(JSON格式)")
+    properties = Column(PropertiesType, comment="节点属性")
     create_time = Column(DateTime, default=func.now(), comment="创建时间")
     update_time = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
 
@@ -32,13 +52,18 @@ class KnowledgeGraphEdgeModel(Base):
     """
 
     __tablename__ = "knowledge_graph_edge"
+    __table_args__ = (
+        Index("uq_knowledge_graph_edge_kb_edge", "kb_name", "edge_id", unique=True),
+        Index("ix_knowledge_graph_edge_kb_source", "kb_name", "source_node_id"),
+        Index("ix_knowledge_graph_edge_kb_target", "kb_name", "target_node_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True, comment="边ID")
-    kb_name = Column(String(50), index=True, comment="所属知识库名称")
-    edge_id = Column(String(100), index=True, comment="边唯一标识")
-    source_node_id = Column(String(100), index=True, comment="源节点ID")
-    target_node_id = Column(String(100), index=True, comment="目标节点ID")
+    kb_name = Column(String(50), comment="所属知识库名称")
+    edge_id = Column(String(100), comment="边唯一标识")
+    source_node_id = Column(String(100), comment="源节点ID")
+    target_node_id = Column(String(100), comment="目标节点ID")
     relation_type = Column(String(50), comment="关系类型")
-    properties = Column(Text, comment="边属性(JSON格式)")
+    properties = Column(PropertiesType, comment="边属性")
     weight = Column(Float, default=1.0, comment="边权重")
     create_time = Column(DateTime, default=func.now(), comment="创建时间")
     update_time = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
@@ -47,6 +72,151 @@ class KnowledgeGraphEdgeModel(Base):
         return f"<KnowledgeGraphEdge(id='{self.id}', kb_name='{self.kb_name}', edge_id='{self.edge_id}', source='{self.source_node_id}', target='{self.target_node_id}', relation='{self.relation_type}')>"
 
 
+class KnowledgeGraphStatsModel(Base):
+    """
+    知识图谱计数表，由数据库触发器随节点/边的增删改维护
+    stat_key: "edge" 为边数，"node" 为无类型节点数，"node:<类型>" 为该类型节点数
+    """
+
+    __tablename__ = "knowledge_graph_stats"
+    kb_name = Column(String(50), primary_key=True, comment="所属知识库名称")
+    stat_key = Column(String(60), primary_key=True, comment="统计项")
+    total = Column(Integer, nullable=False, default=0, comment="数量")
+
+    def __repr__(self):
+        return f"<KnowledgeGraphStats(kb_name='{self.kb_name}', stat_key='{self.stat_key}', total={self.total})>"
+
+
+STATS_TRIGGER = "knowledge_graph_node_stats_ai"
+
+
+def _node_stat_key(row: str) -> str:
+    return f"CASE WHEN {row}.node_type IS NULL THEN 'node' ELSE 'node:' || {row}.node_type END"
+
+
+def _stat_increment(kb_name: str, stat_key: str) -> str:
+    return (
+        f"INSERT INTO knowledge_graph_stats (kb_name, stat_key, total) VALUES ({kb_name}, {stat_key}, 1) "
+        f"ON CONFLICT (kb_name, stat_key) DO UPDATE SET total = knowledge_graph_stats.total + 1;"
+    )
+
+
+def _stat_decrement(kb_name: str, stat_key: str) -> str:
+    return (
+        f"UPDATE knowledge_graph_stats SET total = total - 1 "
+        f"WHERE kb_name = {kb_name} AND stat_key = {stat_key};"
+    )
+
+
+# 按现有数据重新计算，仅在首次建立触发器时执行，补上触发器建立之前已有的数据
+_STATS_REBUILD_DDL = [
+    "DELETE FROM knowledge_graph_stats",
+    f"""INSERT INTO knowledge_graph_stats (kb_name, stat_key, total)
+        SELECT kb_name, {_node_stat_key("knowledge_graph_node")}, COUNT(*)
+        FROM knowledge_graph_node GROUP BY 1, 2""",
+    """INSERT INTO knowledge_graph_stats (kb_name, stat_key, total)
+        SELECT kb_name, 'edge', COUNT(*) FROM knowledge_graph_edge GROUP BY kb_name""",
+]
+
+_SQLITE_STATS_DDL = [
+    f"""CREATE TRIGGER IF NOT EXISTS {STATS_TRIGGER} AFTER INSERT ON knowledge_graph_node BEGIN
+        {_stat_increment("new.kb_name", _node_stat_key("new"))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS knowledge_graph_node_stats_ad AFTER DELETE ON knowledge_graph_node BEGIN
+        {_stat_decrement("old.kb_name", _node_stat_key("old"))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS knowledge_graph_node_stats_au AFTER UPDATE OF kb_name, node_type ON knowledge_graph_node
+    WHEN old.kb_name IS NOT new.kb_name OR old.node_type IS NOT new.node_type BEGIN
+        {_stat_decrement("old.kb_name", _node_stat_key("old"))}
+        {_stat_increment("new.kb_name", _node_stat_key("new"))}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS knowledge_graph_edge_stats_ai AFTER INSERT ON knowledge_graph_edge BEGIN
+        {_stat_increment("new.kb_name", "'edge'")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS knowledge_graph_edge_stats_ad AFTER DELETE ON knowledge_graph_edge BEGIN
+        {_stat_decrement("old.kb_name", "'edge'")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS knowledge_graph_edge_stats_au AFTER UPDATE OF kb_name ON knowledge_graph_edge
+    WHEN old.kb_name IS NOT new.kb_name BEGIN
+        {_stat_decrement("old.kb_name", "'edge'")}
+        {_stat_increment("new.kb_name", "'edge'")}
+    END""",
+    *_STATS_REBUILD_DDL,
+]
+
+_POSTGRES_STATS_DDL = [
+    f"""CREATE OR REPLACE FUNCTION knowledge_graph_node_stats() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.kb_name = NEW.kb_name
+            AND OLD.node_type IS NOT DISTINCT FROM NEW.node_type THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            {_stat_decrement("OLD.kb_name", _node_stat_key("OLD"))}
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            {_stat_increment("NEW.kb_name", _node_stat_key("NEW"))}
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    f"""CREATE OR REPLACE FUNCTION knowledge_graph_edge_stats() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.kb_name = NEW.kb_name THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            {_stat_decrement("OLD.kb_name", "'edge'")}
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            {_stat_increment("NEW.kb_name", "'edge'")}
+        END IF;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql""",
+    f"DROP TRIGGER IF EXISTS {STATS_TRIGGER} ON knowledge_graph_node",
+    f"""CREATE TRIGGER {STATS_TRIGGER} AFTER INSERT OR DELETE OR UPDATE OF kb_name, node_type
+        ON knowledge_graph_node FOR EACH ROW EXECUTE FUNCTION knowledge_graph_node_stats()""",
+    "DROP TRIGGER IF EXISTS knowledge_graph_edge_stats_ai ON knowledge_graph_edge",
+    """CREATE TRIGGER knowledge_graph_edge_stats_ai AFTER INSERT OR DELETE OR UPDATE OF kb_name
+        ON knowledge_graph_edge FOR EACH ROW EXECUTE FUNCTION knowledge_graph_edge_stats()""",
+    *_STATS_REBUILD_DDL,
+]
+
+
+_STATS_TRIGGER_EXISTS_SQL = {
+    "sqlite": "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = :name",
+    "postgresql": "SELECT 1 FROM pg_trigger WHERE tgname = :name",
+}
+
+
+def graph_stats_triggers_exist(conn) -> bool:
+    """维护 knowledge_graph_stats 的触发器是否已建立（触发器在同一事务中一起建立，只需检查其一）"""
+    sql = _STATS_TRIGGER_EXISTS_SQL.get(conn.dialect.name)
+    return sql is not None and conn.execute(text(sql), {"name": STATS_TRIGGER}).first() is not None
+
+
+def create_graph_stats_triggers(engine):
+    """
+    建立维护 knowledge_graph_stats 的触发器，计数与数据写入处于同一事务，统计时不再 COUNT(*) 扫表
+    支持 SQLite 和 PostgreSQL，其它数据库统计时退回到聚合查询
+    触发器已存在时直接返回，每次启动不再全表重新计数
+    """
+    ddl = {
+        "sqlite": _SQLITE_STATS_DDL,
+        "postgresql": _POSTGRES_STATS_DDL,
+    }.get(engine.dialect.name)
+    if not ddl:
+        return False
+    try:
+        with engine.begin() as conn:
+            if graph_stats_triggers_exist(conn):
+                return True
+            for statement in ddl:
+                conn.execute(text(statement))
+        return True
+    except (OperationalError, ProgrammingError):
+        return False
+
+
 # Pydantic Schemas
 class KnowledgeGraphNodeSchema(BaseModel):
     id: int
@@ -54,7 +224,7 @@ class KnowledgeGraphNodeSchema(BaseModel):
     node_id: str
     node_type: Optional[str] = None
     node_name: str
-    properties: Optional[str] = None
+    properties: Optional[Dict] = None
     create_time: Optional[datetime] = None
     update_time: Optional[datetime] = None
 
@@ -69,10 +239,61 @@ class KnowledgeGraphEdgeSchema(BaseModel):
     source_node_id: str
     target_node_id: str
     relation_type: Optional[str] = None
-    properties: Optional[str] = None
+    properties: Optional[Dict] = None
     weight: float = 1.0
     create_time: Optional[datetime] = None
     update_time: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+
+def create_composite_indexes(engine):
+    """
+    为旧版本创建的表补建以 kb_name 开头的复合索引：
+    (kb_name, node_id)、(kb_name, edge_id) 唯一索引用于数据库原生的 upsert，
+    (kb_name, source_node_id)、(kb_name, target_node_id) 用于按节点查询边
+    表中已有重复数据时无法创建唯一索引，此时写入会退回到先查询再插入/更新的方式
+    """
+    success = True
+    for model in (KnowledgeGraphNodeModel, KnowledgeGraphEdgeModel):
+        for index in model.__table__.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except (IntegrityError, OperationalError, ProgrammingError):
+                success = False
+    return success
+
+
+def migrate_properties_to_json(engine):
+    """
+    旧版本的 properties 列为存放 JSON 字符串的 TEXT，转换为数据库原生 JSON 类型：
+    PostgreSQL 转为 JSONB 并建立 GIN 索引，MySQL 转为 JSON；
+    SQLite 的 JSON 类型本身以文本存储，旧数据可直接读取，无需转换
+    """
+    dialect = engine.dialect.name
+    if dialect not in ("postgresql", "mysql"):
+        return True
+    try:
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for model in (KnowledgeGraphNodeModel, KnowledgeGraphEdgeModel):
+                table = model.__tablename__
+                column = next(
+                    c for c in inspector.get_columns(table) if c["name"] == "properties"
+                )
+                if dialect == "postgresql":
+                    if isinstance(column["type"], Text):
+                        conn.execute(text(
+                            f"ALTER TABLE {table} ALTER COLUMN properties "
+                            f"TYPE JSONB USING properties::jsonb"
+                        ))
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{table}_properties_gin "
+                        f"ON {table} USING gin (properties)"
+                    ))
+                elif isinstance(column["type"], Text):
+                    conn.execute(text(f"ALTER TABLE {table} MODIFY properties JSON"))
+        return True
+    except (DataError, OperationalError, ProgrammingError):
+        return False
@@ -1,16 +1,89 @@
-import json
 from typing import Dict, List, Optional
 
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, func, inspect, or_, select, union_all
 
 from chatchat.server.db.models.knowledge_graph_model import (
     KnowledgeGraphEdgeModel,
     KnowledgeGraphEdgeSchema,
     KnowledgeGraphNodeModel,
     KnowledgeGraphNodeSchema,
+    KnowledgeGraphStatsModel,
+    graph_stats_triggers_exist,
 )
 from chatchat.server.db.session import with_session
 
+# 单条 IN 查询的最大参数数量，兼容 SQLite 的变量数限制
+_IN_CLAUSE_CHUNK = 500
+
+# 维护计数表的触发器是否已建立，统计时检测，检测到已建立后不再重复检测
+_stats_triggers_ready: Optional[bool] = None
+
+
+# 各表是否支持数据库原生 upsert（需要冲突列上的唯一索引），首次写入时检测
+_upsert_supported: Dict[str, bool] = {}
+
+
+def _as_dicts(session, statement) -> List[Dict]:
+    """列表查询直接把结果行转成字典，不再逐行经过 Pydantic 校验和 model_dump"""
+    return [dict(row) for row in session.execute(statement).mappings()]
+
+
+def _has_unique_index(session, model, columns: List[str]) -> bool:
+    """表上是否有恰好覆盖 columns 的唯一索引或唯一约束（旧表中有重复数据时补建会失败）"""
+    inspector = inspect(session.connection())
+    table = model.__tablename__
+    candidates = [
+        index["column_names"]
+        for index in inspector.get_indexes(table)
+        if index.get("unique")
+    ] + [constraint["column_names"] for constraint in inspector.get_unique_constraints(table)]
+    return any(sorted(names) == sorted(columns) for names in candidates)
+
+
+def _upsert(session, model, rows: List[Dict], index_elements: List[str]) -> bool:
+    """
+    使用 INSERT ... ON CONFLICT DO UPDATE（MySQL 为 ON DUPLICATE KEY UPDATE）写入，
+    一条语句完成插入或更新；数据库不支持或缺少唯一索引时返回 False，由调用方按原方式写入
+    锁等待超时、连接断开等其它错误照常抛出，不影响后续写入继续使用 upsert
+    """
+    table = model.__tablename__
+    dialect = session.get_bind().dialect.name
+    if not rows or dialect not in ("sqlite", "postgresql", "mysql"):
+        return False
+    if table not in _upsert_supported:
+        _upsert_supported[table] = _has_unique_index(session, model, index_elements)
+    if not _upsert_supported[table]:
+        return False
+
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.mysql import insert
+
+    stmt = insert(model)
+    update_columns = [c for c in rows[0] if c not in index_elements]
+    if dialect == "mysql":
+        set_ = {c: stmt.inserted[c] for c in update_columns}
+        set_["update_time"] = func.now()
+        stmt = stmt.on_duplicate_key_update(set_)
+    else:
+        set_ = {c: stmt.excluded[c] for c in update_columns}
+        set_["update_time"] = func.now()
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+
+    session.execute(stmt, rows)
+    return True
+
+
+def _graph_stats_ready(session) -> bool:
+    """计数表触发器是否可用；只缓存已建立的结果，之后才建立触发器时无需重启即可生效"""
+    global _stats_triggers_ready
+    if not _stats_triggers_ready:
+        _stats_triggers_ready = graph_stats_triggers_exist(session.connection())
+    return _stats_triggers_ready
+
 
 # Node operations
 @with_session
@@ -23,6 +96,19 @@ def add_node_to_db(
     properties: Optional[Dict] = None,
 ):
     """添加节点到数据库"""
+    # 空属性存为 NULL
+    properties = properties or None
+    row = {
+        "kb_name": kb_name,
+        "node_id": node_id,
+        "node_name": node_name,
+        "node_type": node_type,
+        "properties": properties,
+    }
+    if _upsert(session, KnowledgeGraphNodeModel, [row], ["kb_name", "node_id"]):
+        session.commit()
+        return True
+
     node = (
         session.query(KnowledgeGraphNodeModel)
         .filter(
@@ -34,27 +120,78 @@ def add_node_to_db(
         .first()
     )
 
-    properties_str = json.dumps(properties, ensure_ascii=False) if properties else None
-
     if not node:
         node = KnowledgeGraphNodeModel(
             kb_name=kb_name,
             node_id=node_id,
             node_name=node_name,
             node_type=node_type,
-            properties=properties_str,
+            properties=properties,
         )
         session.add(node)
     else:
         # 更新现有节点
         node.node_name = node_name
         node.node_type = node_type
-        node.properties = properties_str
+        node.properties = properties
 
     session.commit()
     return True
 
 
+@with_session
+def add_nodes_to_db(session, kb_name: str, nodes: List[Dict]):
+    """批量添加节点到数据库（单个事务，已存在的节点会被更新）
+    nodes形式：[{"node_id": str, "node_name": str, "node_type": str, "properties": dict}, ...]
+    """
+    count = _write_nodes(session, kb_name, nodes)
+    session.commit()
+    return count
+
+
+def _write_nodes(session, kb_name: str, nodes: List[Dict]) -> int:
+    """写入节点但不提交，便于和其它写操作放在同一个事务中
+    返回处理的输入行数，批次内重复的行也计算在内
+    """
+    # 同一批次中重复的节点以最后一个为准
+    rows = list(
+        {
+            node["node_id"]: {
+                "kb_name": kb_name,
+                "node_id": node["node_id"],
+                "node_name": node["node_name"],
+                "node_type": node.get("node_type"),
+                "properties": node.get("properties") or None,
+            }
+            for node in nodes
+        }.values()
+    )
+
+    if not _upsert(session, KnowledgeGraphNodeModel, rows, ["kb_name", "node_id"]):
+        with session.no_autoflush:
+            existing = {}
+            keys = [row["node_id"] for row in rows]
+            for i in range(0, len(keys), _IN_CLAUSE_CHUNK):
+                for node in session.query(KnowledgeGraphNodeModel).filter(
+                    and_(
+                        KnowledgeGraphNodeModel.kb_name == kb_name,
+                        KnowledgeGraphNodeModel.node_id.in_(keys[i : i + _IN_CLAUSE_CHUNK]),
+                    )
+                ):
+                    existing[node.node_id] = node
+
+            for row in rows:
+                obj = existing.get(row["node_id"])
+                if obj is None:
+                    session.add(KnowledgeGraphNodeModel(**row))
+                else:
+                    obj.node_name = row["node_name"]
+                    obj.node_type = row["node_type"]
+                    obj.properties = row["properties"]
+
+    return len(nodes)
+
+
 @with_session
 def get_node_from_db(session, kb_name: str, node_id: str):
     """从数据库获取节点"""
@@ -73,20 +210,73 @@ def get_node_from_db(session, kb_name: str, node_id: str):
     return None
 
 
+@with_session
+def get_nodes_from_db(session, kb_name: str, node_ids: List[str]):
+    """按节点ID批量获取节点，返回字典列表"""
+    nodes = []
+    for i in range(0, len(node_ids), _IN_CLAUSE_CHUNK):
+        nodes.extend(
+            _as_dicts(
+                session,
+                select(KnowledgeGraphNodeModel.__table__).where(
+                    and_(
+                        KnowledgeGraphNodeModel.kb_name == kb_name,
+                        KnowledgeGraphNodeModel.node_id.in_(
+                            node_ids[i : i + _IN_CLAUSE_CHUNK]
+                        ),
+                    )
+                ),
+            )
+        )
+    return nodes
+
+
 @with_session
 def list_nodes_from_db(
-    session, kb_name: str, node_type: Optional[str] = None, limit: int = 100
+    session,
+    kb_name: str,
+    node_type: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+    after_id: Optional[int] = None,
 ):
-    """列出知识库中的节点"""
-    query = session.query(KnowledgeGraphNodeModel).filter(
+    """列出知识库中的节点，返回字典列表
+
+    after_id 不为空时只返回 id 大于该值的节点，用于按主键游标顺序翻页
+    """
+    query = select(KnowledgeGraphNodeModel.__table__).where(
         KnowledgeGraphNodeModel.kb_name == kb_name
     )
 
     if node_type:
-        query = query.filter(KnowledgeGraphNodeModel.node_type == node_type)
+        query = query.where(KnowledgeGraphNodeModel.node_type == node_type)
 
-    nodes = query.limit(limit).all()
-    return [KnowledgeGraphNodeSchema.model_validate(node) for node in nodes]
+    if after_id is not None:
+        query = query.where(KnowledgeGraphNodeModel.id > after_id)
+
+    query = query.order_by(KnowledgeGraphNodeModel.id).offset(offset).limit(limit)
+    return _as_dicts(session, query)
+
+
+@with_session
+def search_nodes_from_db(session, kb_name: str, keyword: str, limit: int = 50):
+    """按名称或类型子串搜索节点（不区分大小写，按 id 排序），返回字典列表"""
+    keyword = keyword.lower()
+    query = (
+        select(KnowledgeGraphNodeModel.__table__)
+        .where(
+            and_(
+                KnowledgeGraphNodeModel.kb_name == kb_name,
+                or_(
+                    func.lower(KnowledgeGraphNodeModel.node_name).contains(keyword, autoescape=True),
+                    func.lower(KnowledgeGraphNodeModel.node_type).contains(keyword, autoescape=True),
+                ),
+            )
+        )
+        .order_by(KnowledgeGraphNodeModel.id)
+        .limit(limit)
+    )
+    return _as_dicts(session, query)
 
 
 @with_session
@@ -120,23 +310,36 @@ def delete_node_from_db(session, kb_name: str, node_id: str):
 
 
 @with_session
-def search_nodes_from_db(session, kb_name: str, keyword: str, limit: int = 50):
-    """搜索节点"""
-    nodes = (
-        session.query(KnowledgeGraphNodeModel)
-        .filter(
+def delete_nodes_from_db(session, kb_name: str, node_ids: List[str]) -> int:
+    """批量删除节点及其相关的边，在一个事务中完成，返回删除的节点数"""
+    ids = list(dict.fromkeys(node_ids))
+    deleted = 0
+    # 删除边时 source/target 两个 IN 条件共用参数上限
+    chunk = _IN_CLAUSE_CHUNK // 2
+    for i in range(0, len(ids), chunk):
+        batch = ids[i : i + chunk]
+        session.query(KnowledgeGraphEdgeModel).filter(
             and_(
-                KnowledgeGraphNodeModel.kb_name == kb_name,
+                KnowledgeGraphEdgeModel.kb_name == kb_name,
                 or_(
-                    KnowledgeGraphNodeModel.node_name.like(f"%{keyword}%"),
-                    KnowledgeGraphNodeModel.node_type.like(f"%{keyword}%"),
+                    KnowledgeGraphEdgeModel.source_node_id.in_(batch),
+                    KnowledgeGraphEdgeModel.target_node_id.in_(batch),
                 ),
             )
+        ).delete()
+        deleted += (
+            session.query(KnowledgeGraphNodeModel)
+            .filter(
+                and_(
+                    KnowledgeGraphNodeModel.kb_name == kb_name,
+                    KnowledgeGraphNodeModel.node_id.in_(batch),
+                )
+            )
+            .delete()
         )
-        .limit(limit)
-        .all()
-    )
-    return [KnowledgeGraphNodeSchema.model_validate(node) for node in nodes]
+
+    session.commit()
+    return deleted
 
 
 # Edge operations
@@ -152,6 +355,21 @@ def add_edge_to_db(
     weight: float = 1.0,
 ):
     """添加边到数据库"""
+    # 空属性存为 NULL
+    properties = properties or None
+    row = {
+        "kb_name": kb_name,
+        "edge_id": edge_id,
+        "source_node_id": source_node_id,
+        "target_node_id": target_node_id,
+        "relation_type": relation_type,
+        "properties": properties,
+        "weight": weight,
+    }
+    if _upsert(session, KnowledgeGraphEdgeModel, [row], ["kb_name", "edge_id"]):
+        session.commit()
+        return True
+
     edge = (
         session.query(KnowledgeGraphEdgeModel)
         .filter(
@@ -163,8 +381,6 @@ def add_edge_to_db(
         .first()
     )
 
-    properties_str = json.dumps(properties, ensure_ascii=False) if properties else None
-
     if not edge:
         edge = KnowledgeGraphEdgeModel(
             kb_name=kb_name,
@@ -172,7 +388,7 @@ def add_edge_to_db(
             source_node_id=source_node_id,
             target_node_id=target_node_id,
             relation_type=relation_type,
-            properties=properties_str,
+            properties=properties,
             weight=weight,
         )
         session.add(edge)
@@ -181,13 +397,71 @@ def add_edge_to_db(
         edge.source_node_id = source_node_id
         edge.target_node_id = target_node_id
         edge.relation_type = relation_type
-        edge.properties = properties_str
+        edge.properties = properties
         edge.weight = weight
 
     session.commit()
     return True
 
 
+@with_session
+def add_edges_to_db(session, kb_name: str, edges: List[Dict]):
+    """批量添加边到数据库（单个事务，已存在的边会被更新）
+    edges形式：[{"edge_id": str, "source_node_id": str, "target_node_id": str,
+                "relation_type": str, "properties": dict, "weight": float}, ...]
+    """
+    count = _write_edges(session, kb_name, edges)
+    session.commit()
+    return count
+
+
+def _write_edges(session, kb_name: str, edges: List[Dict]) -> int:
+    """写入边但不提交，便于和其它写操作放在同一个事务中
+    返回处理的输入行数，批次内重复的行也计算在内
+    """
+    # 同一批次中重复的边以最后一个为准
+    rows = list(
+        {
+            edge["edge_id"]: {
+                "kb_name": kb_name,
+                "edge_id": edge["edge_id"],
+                "source_node_id": edge["source_node_id"],
+                "target_node_id": edge["target_node_id"],
+                "relation_type": edge.get("relation_type"),
+                "properties": edge.get("properties") or None,
+                "weight": edge.get("weight", 1.0),
+            }
+            for edge in edges
+        }.values()
+    )
+
+    if not _upsert(session, KnowledgeGraphEdgeModel, rows, ["kb_name", "edge_id"]):
+        with session.no_autoflush:
+            existing = {}
+            keys = [row["edge_id"] for row in rows]
+            for i in range(0, len(keys), _IN_CLAUSE_CHUNK):
+                for edge in session.query(KnowledgeGraphEdgeModel).filter(
+                    and_(
+                        KnowledgeGraphEdgeModel.kb_name == kb_name,
+                        KnowledgeGraphEdgeModel.edge_id.in_(keys[i : i + _IN_CLAUSE_CHUNK]),
+                    )
+                ):
+                    existing[edge.edge_id] = edge
+
+            for row in rows:
+                obj = existing.get(row["edge_id"])
+                if obj is None:
+                    session.add(KnowledgeGraphEdgeModel(**row))
+                else:
+                    obj.source_node_id = row["source_node_id"]
+                    obj.target_node_id = row["target_node_id"]
+                    obj.relation_type = row["relation_type"]
+                    obj.properties = row["properties"]
+                    obj.weight = row["weight"]
+
+    return len(edges)
+
+
 @with_session
 def get_edge_from_db(session, kb_name: str, edge_id: str):
     """从数据库获取边"""
@@ -213,14 +487,19 @@ def list_edges_from_db(
     node_id: Optional[str] = None,
     relation_type: Optional[str] = None,
     limit: int = 100,
+    offset: int = 0,
+    after_id: Optional[int] = None,
 ):
-    """列出知识库中的边"""
-    query = session.query(KnowledgeGraphEdgeModel).filter(
+    """列出知识库中的边，返回字典列表
+
+    after_id 不为空时只返回 id 大于该值的边，用于按主键游标顺序翻页
+    """
+    query = select(KnowledgeGraphEdgeModel.__table__).where(
         KnowledgeGraphEdgeModel.kb_name == kb_name
     )
 
     if node_id:
-        query = query.filter(
+        query = query.where(
             or_(
                 KnowledgeGraphEdgeModel.source_node_id == node_id,
                 KnowledgeGraphEdgeModel.target_node_id == node_id,
@@ -228,10 +507,101 @@ def list_edges_from_db(
         )
 
     if relation_type:
-        query = query.filter(KnowledgeGraphEdgeModel.relation_type == relation_type)
+        query = query.where(KnowledgeGraphEdgeModel.relation_type == relation_type)
+
+    if after_id is not None:
+        query = query.where(KnowledgeGraphEdgeModel.id > after_id)
+
+    query = query.order_by(KnowledgeGraphEdgeModel.id).offset(offset).limit(limit)
+    return _as_dicts(session, query)
+
+
+@with_session
+def list_edges_bulk_from_db(
+    session, kb_name: str, node_ids: List[str], limit_per_node: int = 20
+):
+    """一次查询列出与多个节点相关的边，每条边只返回一次，返回字典列表
+
+    与逐个节点调用 list_edges_from_db(node_id=..., limit=limit_per_node) 的结果一致：
+    每个节点只保留按ID排序的前 limit_per_node 条边。
+    每个节点的截断和去重都在数据库中完成（ROW_NUMBER 窗口函数 + DISTINCT），不会读出多余的边
+    """
+    edge = KnowledgeGraphEdgeModel
+    edge_ids = set()
+    # source/target 两个 IN 条件共用参数上限
+    chunk = _IN_CLAUSE_CHUNK // 2
+    for i in range(0, len(node_ids), chunk):
+        ids = node_ids[i : i + chunk]
+        # (边, 端点) 对，自环只计一次
+        incident = union_all(
+            select(edge.id.label("edge_row"), edge.source_node_id.label("node_id")).where(
+                and_(edge.kb_name == kb_name, edge.source_node_id.in_(ids))
+            ),
+            select(edge.id, edge.target_node_id).where(
+                and_(
+                    edge.kb_name == kb_name,
+                    edge.target_node_id.in_(ids),
+                    edge.source_node_id != edge.target_node_id,
+                )
+            ),
+        ).subquery()
+        ranked = select(
+            incident.c.edge_row,
+            func.row_number()
+            .over(partition_by=incident.c.node_id, order_by=incident.c.edge_row)
+            .label("rank"),
+        ).subquery()
+        edge_ids.update(
+            session.scalars(
+                select(ranked.c.edge_row).where(ranked.c.rank <= limit_per_node).distinct()
+            )
+        )
 
-    edges = query.limit(limit).all()
-    return [KnowledgeGraphEdgeSchema.model_validate(edge) for edge in edges]
+    edges = []
+    row_ids = sorted(edge_ids)
+    for i in range(0, len(row_ids), _IN_CLAUSE_CHUNK):
+        edges.extend(
+            _as_dicts(
+                session,
+                select(edge.__table__)
+                .where(edge.id.in_(row_ids[i : i + _IN_CLAUSE_CHUNK]))
+                .order_by(edge.id),
+            )
+        )
+    return edges
+
+
+@with_session
+def list_subgraph_edges_from_db(
+    session, kb_name: str, node_ids: List[str], limit: int = 1000
+):
+    """列出两端都在给定节点中的边（按ID排序，最多 limit 条），返回字典列表
+
+    源节点、目标节点各按半个参数上限分批，逐批组合查询，过滤完全在数据库中完成
+    """
+    edge = KnowledgeGraphEdgeModel
+    ids = list(dict.fromkeys(node_ids))
+    chunk = _IN_CLAUSE_CHUNK // 2
+    edges = []
+    for i in range(0, len(ids), chunk):
+        for j in range(0, len(ids), chunk):
+            edges.extend(
+                _as_dicts(
+                    session,
+                    select(edge.__table__)
+                    .where(
+                        and_(
+                            edge.kb_name == kb_name,
+                            edge.source_node_id.in_(ids[i : i + chunk]),
+                            edge.target_node_id.in_(ids[j : j + chunk]),
+                        )
+                    )
+                    .order_by(edge.id)
+                    .limit(limit),
+                )
+            )
+    edges.sort(key=lambda e: e["id"])
+    return edges[:limit]
 
 
 @with_session
@@ -252,9 +622,36 @@ def delete_edge_from_db(session, kb_name: str, edge_id: str):
     return result > 0
 
 
+@with_session
+def delete_edges_from_db(session, kb_name: str, edge_ids: List[str]) -> int:
+    """批量删除边，在一个事务中完成，返回删除的边数"""
+    ids = list(dict.fromkeys(edge_ids))
+    deleted = 0
+    for i in range(0, len(ids), _IN_CLAUSE_CHUNK):
+        deleted += (
+            session.query(KnowledgeGraphEdgeModel)
+            .filter(
+                and_(
+                    KnowledgeGraphEdgeModel.kb_name == kb_name,
+                    KnowledgeGraphEdgeModel.edge_id.in_(ids[i : i + _IN_CLAUSE_CHUNK]),
+                )
+            )
+            .delete()
+        )
+
+    session.commit()
+    return deleted
+
+
 @with_session
 def clear_graph_from_db(session, kb_name: str):
     """清空知识库的所有图谱数据"""
+    _delete_graph(session, kb_name)
+    session.commit()
+    return True
+
+
+def _delete_graph(session, kb_name: str):
     session.query(KnowledgeGraphEdgeModel).filter(
         KnowledgeGraphEdgeModel.kb_name == kb_name
     ).delete()
@@ -262,23 +659,64 @@ def clear_graph_from_db(session, kb_name: str):
         KnowledgeGraphNodeModel.kb_name == kb_name
     ).delete()
 
+
+@with_session
+def import_graph_to_db(
+    session,
+    kb_name: str,
+    nodes: List[Dict],
+    edges: List[Dict],
+    clear_existing: bool = False,
+):
+    """
+    在一个事务中导入节点和边（可选先清空原有数据），只提交一次，任何一步失败整体回滚
+    nodes、edges 的形式分别与 add_nodes_to_db、add_edges_to_db 相同，返回 (节点数, 边数)
+    """
+    if clear_existing:
+        _delete_graph(session, kb_name)
+    node_count = _write_nodes(session, kb_name, nodes)
+    edge_count = _write_edges(session, kb_name, edges)
     session.commit()
-    return True
+    return node_count, edge_count
 
 
 @with_session
 def get_graph_stats(session, kb_name: str):
-    """获取图谱统计信息"""
-    node_count = (
-        session.query(KnowledgeGraphNodeModel)
-        .filter(KnowledgeGraphNodeModel.kb_name == kb_name)
-        .count()
-    )
-
-    edge_count = (
-        session.query(KnowledgeGraphEdgeModel)
-        .filter(KnowledgeGraphEdgeModel.kb_name == kb_name)
-        .count()
-    )
+    """获取图谱统计信息：节点数、边数和各类型节点数（无类型的节点计入 None）"""
+    by_type = {}
+    edge_count = 0
+    if _graph_stats_ready(session):
+        # 触发器维护的计数表，按主键读取，不扫描节点和边
+        rows = session.query(
+            KnowledgeGraphStatsModel.stat_key, KnowledgeGraphStatsModel.total
+        ).filter(
+            and_(
+                KnowledgeGraphStatsModel.kb_name == kb_name,
+                KnowledgeGraphStatsModel.total > 0,
+            )
+        )
+        for stat_key, total in rows:
+            if stat_key == "edge":
+                edge_count = total
+            else:
+                by_type[stat_key[5:] if stat_key.startswith("node:") else None] = total
+    else:
+        by_type = dict(
+            session.query(
+                KnowledgeGraphNodeModel.node_type, func.count(KnowledgeGraphNodeModel.id)
+            )
+            .filter(KnowledgeGraphNodeModel.kb_name == kb_name)
+            .group_by(KnowledgeGraphNodeModel.node_type)
+            .all()
+        )
+        edge_count = (
+            session.query(func.count(KnowledgeGraphEdgeModel.id))
+            .filter(KnowledgeGraphEdgeModel.kb_name == kb_name)
+            .scalar()
+        )
 
-    return {"node_count": node_count, "edge_count": edge_count}
+    return {
+        "node_count": sum(by_type.values()),
+        "edge_count": edge_count,
+        "by_type": by_type,
+    }
@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class SemanticQueryCache:
+    """
+    按查询语义相似度复用检索结果的缓存：
+    新查询的向量与已缓存查询的余弦相似度不低于 threshold 时，直接返回缓存结果。
+    向量归一化后保存在一个预分配的矩阵中，查找即一次矩阵乘法；满了按 LRU 淘汰。
+    """
+
+    def __init__(self, max_size: int = 1000, threshold: float = 0.95, ttl: float = 300):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._expire = np.zeros(max_size, dtype=np.float64)
+        self._last_used = np.zeros(max_size, dtype=np.int64)
+        self._values: List[Any] = [None] * max_size
+        self._size = 0
+        self._tick = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, embedding: List[float]) -> Optional[Any]:
+        with self._lock:
+            if not self._size:
+                return None
+            query = self._normalize(embedding)
+            if query.shape[0] != self._vectors.shape[1]:
+                return None
+            scores = self._vectors[: self._size] @ query
+            scores[self._expire[: self._size] < time.time()] = -np.inf
+            i = int(np.argmax(scores))
+            if scores[i] < self.threshold:
+                return None
+            self._tick += 1
+            self._last_used[i] = self._tick
+            return self._values[i]
+
+    def set(self, embedding: List[float], value: Any):
+        with self._lock:
+            vector = self._normalize(embedding)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+                self._size = 0
+            if self._size < self.max_size:
+                slot = self._size
+                self._size += 1
+            else:
+                # 优先复用已过期的位置，否则淘汰最久未使用的
+                expired = np.flatnonzero(self._expire < time.time())
+                slot = int(expired[0]) if expired.size else int(np.argmin(self._last_used))
+            self._tick += 1
+            self._vectors[slot] = vector
+            self._expire[slot] = time.time() + self.ttl
+            self._last_used[slot] = self._tick
+            self._values[slot] = value
+
+
+_semantic_caches: Dict[Hashable, SemanticQueryCache] = {}
+_semantic_caches_lock = threading.Lock()
+
+
+def get_semantic_cache(key: Hashable) -> SemanticQueryCache:
+    """按 key（如知识库名称及检索参数）获取对应的语义缓存"""
+    with _semantic_caches_lock:
+        cache = _semantic_caches.get(key)
+        if cache is None:
+            cache = _semantic_caches[key] = SemanticQueryCache()
+        return cache
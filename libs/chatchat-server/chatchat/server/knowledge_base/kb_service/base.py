@@ -1,3 +1,4 @@
+import itertools
 import operator
 import os
 from abc import ABC, abstractmethod
@@ -55,7 +56,14 @@ class SupportedVSType:
     CHROMADB = "chromadb"
 
 
+# 知识库内容版本号的全局计数器，文档增删改时取下一个值
+_version_counter = itertools.count(1)
+
+
 class KBService(ABC):
+    # 各知识库内容的版本号，文档增删改时更新，检索结果缓存将其作为键的一部分，内容变化后自然失效
+    _versions: Dict[str, int] = {}
+
     def __init__(
         self,
         knowledge_base_name: str,
@@ -83,6 +91,14 @@ class KBService(ABC):
     def check_embed_model(self) -> Tuple[bool, str]:
         return _check_embed_model(self.embed_model)
 
+    @classmethod
+    def get_version(cls, kb_name: str) -> int:
+        """获取知识库内容的版本号"""
+        return cls._versions.get(kb_name, 0)
+
+    def _bump_version(self):
+        KBService._versions[self.kb_name] = next(_version_counter)
+
     def create_kb(self):
         """
         创建知识库
@@ -104,6 +120,7 @@ class KBService(ABC):
         """
         self.do_clear_vs()
         status = delete_files_from_db(self.kb_name)
+        self._bump_version()
         return status
 
     def drop_kb(self):
@@ -112,6 +129,7 @@ class KBService(ABC):
         """
         self.do_drop_kb()
         status = delete_kb_from_db(self.kb_name)
+        self._bump_version()
         return status
 
     def add_doc(self, kb_file: KnowledgeFile, docs: List[Document] = [], **kwargs):
@@ -149,6 +167,7 @@ class KBService(ABC):
                 docs_count=len(docs),
                 doc_infos=doc_infos,
             )
+            self._bump_version()
         else:
             status = False
         return status
@@ -161,6 +180,7 @@ class KBService(ABC):
         """
         self.do_delete_doc(kb_file, **kwargs)
         status = delete_file_from_db(kb_file)
+        self._bump_version()
         if delete_content and os.path.exists(kb_file.filepath):
             os.remove(kb_file.filepath)
         return status
@@ -233,6 +253,7 @@ class KBService(ABC):
             ids.append(_id)
             pending_docs.append(doc)
         self.do_add_doc(docs=pending_docs, ids=ids)
+        self._bump_version()
         return True
 
     def list_docs(
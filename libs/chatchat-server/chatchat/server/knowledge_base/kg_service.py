@@ -2,22 +2,44 @@
 知识图谱服务层
 提供图谱的构建、查询、编辑、保存等功能
 """
-import json
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
-import networkx as nx
+import msgspec
+import numpy as np
 
 from chatchat.server.db.repository.knowledge_graph_repository import (
     add_edge_to_db,
+    add_edges_to_db,
     add_node_to_db,
+    add_nodes_to_db,
     clear_graph_from_db,
     delete_edge_from_db,
+    delete_edges_from_db,
     delete_node_from_db,
+    delete_nodes_from_db,
     get_edge_from_db,
     get_graph_stats,
     get_node_from_db,
+    get_nodes_from_db,
+    import_graph_to_db,
+    list_edges_bulk_from_db,
     list_edges_from_db,
     list_nodes_from_db,
+    list_subgraph_edges_from_db,
     search_nodes_from_db,
 )
 from chatchat.utils import build_logger
@@ -25,12 +47,425 @@ from chatchat.utils import build_logger
 logger = build_logger()
 
 
+def _edge_id(source_node_id: str, relation_type: Optional[str], target_node_id: str) -> str:
+    return f"{source_node_id}_{relation_type}_{target_node_id}"
+
+
+def _expand_level(
+    frontier: Iterable[Hashable],
+    neighbors: Callable[[Hashable], Iterable[Hashable]],
+    parents: Dict[Hashable, List[Hashable]],
+) -> List[Hashable]:
+    """将BFS向外扩展一层，记录新节点的所有父节点，返回新的前沿"""
+    level_parents: Dict[Hashable, List[Hashable]] = {}
+    for current in frontier:
+        # 同一对节点之间可能有多条不同关系的边，邻居去重，避免返回重复路径
+        for neighbor in dict.fromkeys(neighbors(current)):
+            if neighbor in parents:
+                continue
+            if neighbor not in level_parents:
+                level_parents[neighbor] = []
+            level_parents[neighbor].append(current)
+    parents.update(level_parents)
+    return list(level_parents)
+
+
+def _collect_paths(
+    parents: Dict[Hashable, List[Hashable]], root: Hashable, node: Hashable
+) -> List[List[Hashable]]:
+    """沿父节点回溯，还原 root 到 node 的所有最短路径"""
+    paths = []
+    stack = [(node, [node])]
+    while stack:
+        current, path = stack.pop()
+        if current == root:
+            paths.append(path[::-1])
+            continue
+        for parent in parents[current]:
+            stack.append((parent, path + [parent]))
+    return paths
+
+
+def _bfs_shortest_paths(
+    successors: Callable[[Hashable], Iterable[Hashable]],
+    source_node_id: Hashable,
+    target_node_id: Hashable,
+    max_length: int,
+) -> List[List[Hashable]]:
+    """逐层BFS，返回source到target的所有最短路径，路径长度（边数）不超过max_length
+
+    图谱中的边按单位长度计算，BFS 比带权最短路径或枚举所有简单路径要快得多
+    """
+    if source_node_id == target_node_id:
+        return [[source_node_id]]
+
+    parents: Dict[Hashable, List[Hashable]] = {source_node_id: []}
+    frontier = [source_node_id]
+    depth = 0
+    while frontier and depth < max_length and target_node_id not in parents:
+        depth += 1
+        frontier = _expand_level(frontier, successors, parents)
+
+    if target_node_id not in parents:
+        return []
+    return _collect_paths(parents, source_node_id, target_node_id)
+
+
+def _all_simple_paths(
+    successors: Callable[[Hashable], Iterable[Hashable]],
+    source_node_id: Hashable,
+    target_node_id: Hashable,
+    max_length: int,
+) -> List[List[Hashable]]:
+    """DFS枚举source到target的所有简单路径，路径长度（边数）不超过max_length
+
+    结果与 networkx.all_simple_paths(cutoff=max_length) 一致，路径数可能随 max_length 指数增长
+    """
+    if source_node_id == target_node_id:
+        return [[source_node_id]]
+
+    paths = []
+    path = [source_node_id]
+    on_path = {source_node_id}
+    # 同一对节点之间可能有多条不同关系的边，邻居去重后再展开
+    stack = [iter(dict.fromkeys(successors(source_node_id)))]
+    while stack:
+        neighbor = next(stack[-1], None)
+        if neighbor is None:
+            stack.pop()
+            on_path.discard(path.pop())
+            continue
+        if neighbor in on_path:
+            continue
+        if neighbor == target_node_id:
+            if len(path) <= max_length:
+                paths.append(path + [neighbor])
+        elif len(path) < max_length:
+            path.append(neighbor)
+            on_path.add(neighbor)
+            stack.append(iter(dict.fromkeys(successors(neighbor))))
+    return paths
+
+
+def _bidirectional_shortest_paths(
+    successors: Callable[[Hashable], Iterable[Hashable]],
+    predecessors: Callable[[Hashable], Iterable[Hashable]],
+    source_node_id: Hashable,
+    target_node_id: Hashable,
+    max_length: int,
+) -> List[List[Hashable]]:
+    """双向BFS，返回source到target的所有最短路径，路径长度（边数）不超过max_length
+
+    每次扩展较小的一侧前沿，两侧在中间相遇即停止，展开的节点数约为单向BFS的平方根
+    """
+    if source_node_id == target_node_id:
+        return [[source_node_id]]
+
+    forward: Dict[Hashable, List[Hashable]] = {source_node_id: []}
+    backward: Dict[Hashable, List[Hashable]] = {target_node_id: []}
+    forward_frontier = [source_node_id]
+    backward_frontier = [target_node_id]
+    meeting = []
+    depth = 0
+    while forward_frontier and backward_frontier and depth < max_length:
+        depth += 1
+        # 相遇点只可能出现在本层新扩展的节点中，且都位于最短路径上
+        if len(forward_frontier) <= len(backward_frontier):
+            forward_frontier = _expand_level(forward_frontier, successors, forward)
+            meeting = [node for node in forward_frontier if node in backward]
+        else:
+            backward_frontier = _expand_level(backward_frontier, predecessors, backward)
+            meeting = [node for node in backward_frontier if node in forward]
+        if meeting:
+            break
+
+    paths = []
+    for node in meeting:
+        tails = _collect_paths(backward, target_node_id, node)
+        for head in _collect_paths(forward, source_node_id, node):
+            for tail in tails:
+                paths.append(head + tail[-2::-1])
+    return paths
+
+
+def _build_csr(
+    rows: np.ndarray, cols: np.ndarray, num_nodes: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """按行号构建CSR：返回 (indptr, indices, edge_idx)，edge_idx 指向原始边列表的下标"""
+    order = np.argsort(rows, kind="stable").astype(np.int32)
+    indptr = np.zeros(num_nodes + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=num_nodes), out=indptr[1:])
+    return indptr, cols[order], order
+
+
+class _CSRGraph:
+    """图谱的CSR（压缩稀疏行）邻接表示，用于内存中的邻居展开和路径搜索
+
+    节点以整数下标表示，出边和入边各保存一份 indptr/indices/edge_idx 数组，
+    u 的出邻居为 out_indices[out_indptr[u]:out_indptr[u + 1]]
+    入边CSR在首次按入方向遍历时才构建，只沿出边遍历时不产生额外开销
+    删除边时只在 alive 中打上墓碑标记，墓碑过多时再压缩重建
+    """
+
+    # 墓碑边占比超过该值时压缩
+    COMPACT_RATIO = 0.25
+
+    def __init__(self, edges: List[Dict]):
+        self.edges = edges
+        self.node_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.edge_slot: Dict[str, int] = {}
+        self.alive = np.ones(len(edges), dtype=bool)
+        self.num_deleted = 0
+
+        sources = np.empty(len(edges), dtype=np.int32)
+        targets = np.empty(len(edges), dtype=np.int32)
+        for i, edge in enumerate(edges):
+            sources[i] = self._node_index(edge["source_node_id"])
+            targets[i] = self._node_index(edge["target_node_id"])
+            self.edge_slot[edge["edge_id"]] = i
+
+        self._sources = sources
+        self._targets = targets
+        self.out_indptr, self.out_indices, self.out_edge_idx = _build_csr(
+            sources, targets, len(self.node_ids)
+        )
+        self._in_csr: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    @property
+    def in_csr(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """入边CSR (in_indptr, in_indices, in_edge_idx)"""
+        if self._in_csr is None:
+            self._in_csr = _build_csr(self._targets, self._sources, len(self.node_ids))
+        return self._in_csr
+
+    def _node_index(self, node_id: str) -> int:
+        idx = self.index.get(node_id)
+        if idx is None:
+            idx = self.index[node_id] = len(self.node_ids)
+            self.node_ids.append(node_id)
+        return idx
+
+    def remove_edge(self, edge_id: str) -> bool:
+        """O(1) 标记删除一条边，返回该边是否存在"""
+        slot = self.edge_slot.pop(edge_id, None)
+        if slot is None:
+            return False
+        self.alive[slot] = False
+        self.num_deleted += 1
+        return True
+
+    def remove_node(self, node_id: str) -> int:
+        """标记删除与节点相连的所有边（向量化比较，不构建入边CSR），返回删除的边数"""
+        u = self.index.get(node_id)
+        if u is None:
+            return 0
+        slots = np.flatnonzero(self.alive & ((self._sources == u) | (self._targets == u)))
+        for slot in slots.tolist():
+            self.edge_slot.pop(self.edges[slot]["edge_id"], None)
+        self.alive[slots] = False
+        self.num_deleted += len(slots)
+        return len(slots)
+
+    def needs_compaction(self) -> bool:
+        return self.num_deleted > self.COMPACT_RATIO * len(self.edges)
+
+    def compact(self) -> "_CSRGraph":
+        """丢弃墓碑边，用内存中剩余的边重建CSR"""
+        return _CSRGraph([edge for edge, alive in zip(self.edges, self.alive) if alive])
+
+    def _slice(
+        self, indptr: np.ndarray, indices: np.ndarray, edge_idx: np.ndarray, u: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = indptr[u], indptr[u + 1]
+        neighbors, edges = indices[start:end], edge_idx[start:end]
+        if self.num_deleted:
+            mask = self.alive[edges]
+            neighbors, edges = neighbors[mask], edges[mask]
+        return neighbors, edges
+
+    def successors(self, u: int) -> List[int]:
+        neighbors, _ = self._slice(
+            self.out_indptr, self.out_indices, self.out_edge_idx, u
+        )
+        return neighbors.tolist()
+
+    def predecessors(self, u: int) -> List[int]:
+        neighbors, _ = self._slice(*self.in_csr, u)
+        return neighbors.tolist()
+
+    def _gather(
+        self, indptr: np.ndarray, indices: np.ndarray, edge_idx: np.ndarray, frontier: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        # 把各前沿节点的 [start, end) 区间拼接成一个下标数组
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(
+            counts.sum()
+        )
+        neighbors, edges = indices[positions], edge_idx[positions]
+        if self.num_deleted:
+            mask = self.alive[edges]
+            neighbors, edges = neighbors[mask], edges[mask]
+        return neighbors, edges
+
+    def expand(self, frontier: np.ndarray, direction: str) -> Tuple[np.ndarray, np.ndarray]:
+        """一次展开整层前沿节点，返回 (邻居下标, 边下标)，direction 为 'in'、'out' 或 'both'"""
+        parts = []
+        if direction in ("out", "both"):
+            parts.append(
+                self._gather(self.out_indptr, self.out_indices, self.out_edge_idx, frontier)
+            )
+        if direction in ("in", "both"):
+            parts.append(self._gather(*self.in_csr, frontier))
+        if not parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        return (
+            np.concatenate([neighbors for neighbors, _ in parts]),
+            np.concatenate([edges for _, edges in parts]),
+        )
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        raise ImportError(
+            "Could not import pyarrow python package. "
+            "Please install it with `pip install pyarrow`."
+        )
+    return pa
+
+
+def _trigrams(text: str) -> set:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class _TrigramIndex:
+    """节点名称/类型的三元组（trigram）倒排索引，用于 search_nodes 的子串匹配
+
+    关键词的所有三元组都出现的节点才可能匹配，再对这一小批候选做真实的子串校验
+    重复的 (关键词, limit) 直接命中结果缓存，缓存随索引一起在节点修改后失效
+    """
+
+    # 每个索引缓存的搜索结果数
+    RESULT_CACHE_SIZE = 256
+
+    def __init__(self, nodes: List[Dict]):
+        self.nodes = nodes
+        self._cached_search = lru_cache(maxsize=self.RESULT_CACHE_SIZE)(self._search)
+        # 与数据库 LIKE 一致，按小写匹配名称或类型
+        self.texts = [
+            ((node.get("node_name") or "").lower(), (node.get("node_type") or "").lower())
+            for node in nodes
+        ]
+        self.postings: Dict[str, set] = {}
+        for i, (name, node_type) in enumerate(self.texts):
+            for gram in _trigrams(name) | _trigrams(node_type):
+                self.postings.setdefault(gram, set()).add(i)
+
+    def search(self, keyword: str, limit: int) -> List[Dict]:
+        # 缓存中保存的是节点下标，每次返回新的字典，调用方修改结果不会影响缓存
+        return [dict(self.nodes[i]) for i in self._cached_search(keyword.lower(), limit)]
+
+    def _search(self, keyword: str, limit: int) -> Tuple[int, ...]:
+        grams = _trigrams(keyword)
+        if grams:
+            postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+            candidates = sorted(set.intersection(*postings))
+        else:
+            # 关键词不足三个字符时没有三元组，直接扫描内存中的节点
+            candidates = range(len(self.nodes))
+
+        result = []
+        for i in candidates:
+            name, node_type = self.texts[i]
+            if keyword in name or keyword in node_type:
+                result.append(i)
+                if len(result) >= limit:
+                    break
+        return tuple(result)
+
+
 class KnowledgeGraphService:
     """知识图谱服务类"""
 
+    # LLM 上下文缓存的最大条目数
+    CONTEXT_CACHE_SIZE = 128
+    # 统计信息缓存的有效秒数（本实例的写入会立即使缓存失效，该时限用于兜底其它进程的写入）
+    STATS_CACHE_TTL = 5.0
+    # 节点搜索索引的有效秒数（本实例的写入会立即使索引失效，该时限用于兜底其它进程或直接写库的修改）
+    TRIGRAM_INDEX_TTL = 60.0
+    # 节点数超过该值时不在内存中建立搜索索引，直接在数据库中 LIKE 查询
+    TRIGRAM_INDEX_MAX_NODES = 200_000
+
     def __init__(self, kb_name: str):
         self.kb_name = kb_name
-        self.graph = nx.DiGraph()  # 有向图
+        # 同一实例会被并发请求共享，修改内存中的索引和缓存时需要加锁
+        self._lock = threading.RLock()
+        # 遍历用的CSR邻接结构，首次遍历时构建，图谱修改后失效
+        self._csr: Optional[_CSRGraph] = None
+        # (构建时间, 节点搜索用的倒排索引)，首次搜索时构建，节点修改或超过 TRIGRAM_INDEX_TTL 后失效
+        self._trigram_index: Optional[Tuple[float, _TrigramIndex]] = None
+        # (query, top_k) -> (LLM上下文, 命中节点)，热门问题直接复用，图谱有任何修改即清空
+        self._context_cache: OrderedDict = OrderedDict()
+        # 图谱版本号，每次修改递增，外部缓存可据此判断结果是否过期
+        self.version = 0
+        # (图谱版本号, 缓存时间, 统计信息)，供频繁轮询的看板复用
+        self._stats_cache: Optional[Tuple[int, float, Dict[str, Any]]] = None
+
+    def _invalidate_csr(self):
+        with self._lock:
+            self._csr = None
+
+    def _invalidate_context_cache(self):
+        with self._lock:
+            self._context_cache.clear()
+            self.version += 1
+
+    def _invalidate_trigram_index(self):
+        with self._lock:
+            self._trigram_index = None
+
+    def _get_trigram_index(self) -> Optional[_TrigramIndex]:
+        """返回节点搜索索引，图谱节点数超过 TRIGRAM_INDEX_MAX_NODES 时返回 None"""
+        with self._lock:
+            if (
+                self._trigram_index is not None
+                and time.monotonic() - self._trigram_index[0] < self.TRIGRAM_INDEX_TTL
+            ):
+                return self._trigram_index[1]
+            self._trigram_index = None
+            if self.get_stats()["node_count"] > self.TRIGRAM_INDEX_MAX_NODES:
+                return None
+            nodes = list(self._iter_pages(self.list_nodes))
+            self._trigram_index = (time.monotonic(), _TrigramIndex(nodes))
+            return self._trigram_index[1]
+
+    def _get_csr(self) -> _CSRGraph:
+        with self._lock:
+            if self._csr is None:
+                edges = list(self._iter_pages(self.list_edges))
+                self._csr = _CSRGraph(edges)
+            return self._csr
+
+    @staticmethod
+    def _iter_pages(
+        list_func: Callable[..., List[Dict]], page_size: int = 1000
+    ) -> Iterator[Dict]:
+        """分页调用 list_nodes/list_edges，逐条产出结果
+
+        按ID游标翻页（id > 上一页最后一条），每页都走主键索引，不会像OFFSET那样越翻越慢
+        """
+        after_id = None
+        while True:
+            page = list_func(limit=page_size, after_id=after_id)
+            yield from page
+            if len(page) < page_size:
+                break
+            after_id = page[-1]["id"]
 
     def add_node(
         self,
@@ -41,11 +476,6 @@ class KnowledgeGraphService:
     ) -> bool:
         """添加节点"""
         try:
-            # 添加到networkx图
-            self.graph.add_node(
-                node_id, name=node_name, node_type=node_type, **(properties or {})
-            )
-
             # 保存到数据库
             add_node_to_db(
                 kb_name=self.kb_name,
@@ -54,9 +484,13 @@ class KnowledgeGraphService:
                 node_type=node_type,
                 properties=properties,
             )
+            self._invalidate_csr()
+            self._invalidate_trigram_index()
+            self._invalidate_context_cache()
 
-            logger.info(
-                f"Added node: {node_id} ({node_name}) to knowledge graph {self.kb_name}"
+            # 单条写入在批量导入等场景会被频繁调用，使用惰性格式化的debug日志
+            logger.debug(
+                "Added node: {} ({}) to knowledge graph {}", node_id, node_name, self.kb_name
             )
             return True
         except Exception as e:
@@ -73,16 +507,7 @@ class KnowledgeGraphService:
     ) -> bool:
         """添加边"""
         try:
-            edge_id = f"{source_node_id}_{relation_type}_{target_node_id}"
-
-            # 添加到networkx图
-            self.graph.add_edge(
-                source_node_id,
-                target_node_id,
-                relation_type=relation_type,
-                weight=weight,
-                **(properties or {}),
-            )
+            edge_id = _edge_id(source_node_id, relation_type, target_node_id)
 
             # 保存到数据库
             add_edge_to_db(
@@ -94,94 +519,159 @@ class KnowledgeGraphService:
                 properties=properties,
                 weight=weight,
             )
+            self._invalidate_csr()
+            self._invalidate_context_cache()
 
-            logger.info(
-                f"Added edge: {source_node_id} -> {target_node_id} ({relation_type})"
+            logger.debug(
+                "Added edge: {} -> {} ({})", source_node_id, target_node_id, relation_type
             )
             return True
         except Exception as e:
             logger.error(f"Error adding edge: {e}")
             return False
 
+    @staticmethod
+    def _edge_rows(edges: List[Dict]) -> List[Dict]:
+        """返回补全了 edge_id、weight 的数据库写入行"""
+        return [
+            {
+                **edge,
+                "edge_id": _edge_id(
+                    edge["source_node_id"], edge.get("relation_type"), edge["target_node_id"]
+                ),
+                "weight": edge.get("weight", 1.0),
+            }
+            for edge in edges
+        ]
+
+    def bulk_add_nodes(self, nodes: List[Dict]) -> int:
+        """批量添加节点，单个事务写入数据库，返回处理的节点数（含批次内重复的节点）
+
+        每个节点应包含: node_id, node_name, node_type(可选), properties(可选)
+        """
+        if not nodes:
+            return 0
+        count = add_nodes_to_db(kb_name=self.kb_name, nodes=nodes)
+        self._invalidate_csr()
+        self._invalidate_trigram_index()
+        self._invalidate_context_cache()
+        logger.info(f"Added {count} nodes to knowledge graph {self.kb_name}")
+        return count
+
+    def bulk_add_edges(self, edges: List[Dict]) -> int:
+        """批量添加边，单个事务写入数据库，返回处理的边数（含批次内重复的边）
+
+        每条边应包含: source_node_id, target_node_id, relation_type(可选), properties(可选), weight(可选)
+        """
+        if not edges:
+            return 0
+        rows = self._edge_rows(edges)
+        count = add_edges_to_db(kb_name=self.kb_name, edges=rows)
+        self._invalidate_csr()
+        self._invalidate_context_cache()
+        logger.info(f"Added {count} edges to knowledge graph {self.kb_name}")
+        return count
+
+    def _import(
+        self, nodes: List[Dict], edges: List[Dict], clear_existing: bool
+    ) -> Tuple[int, int]:
+        """在一个数据库事务中导入节点和边（可选先清空），返回 (节点数, 边数)"""
+        try:
+            return import_graph_to_db(
+                kb_name=self.kb_name,
+                nodes=nodes,
+                edges=self._edge_rows(edges),
+                clear_existing=clear_existing,
+            )
+        finally:
+            self._invalidate_csr()
+            self._invalidate_trigram_index()
+            self._invalidate_context_cache()
+
     def get_node(self, node_id: str) -> Optional[Dict]:
         """获取节点信息"""
         node = get_node_from_db(kb_name=self.kb_name, node_id=node_id)
         if node:
-            result = node.model_dump()
-            if result.get("properties"):
-                try:
-                    result["properties"] = json.loads(result["properties"])
-                except:
-                    pass
-            return result
+            return node.model_dump()
         return None
 
+    def get_nodes(self, node_ids: List[str]) -> List[Dict]:
+        """批量获取节点信息，按node_ids的顺序返回存在的节点"""
+        nodes = {
+            node["node_id"]: node
+            for node in get_nodes_from_db(kb_name=self.kb_name, node_ids=node_ids)
+        }
+        return [dict(nodes[node_id]) for node_id in node_ids if node_id in nodes]
+
     def get_edge(self, edge_id: str) -> Optional[Dict]:
         """获取边信息"""
         edge = get_edge_from_db(kb_name=self.kb_name, edge_id=edge_id)
         if edge:
-            result = edge.model_dump()
-            if result.get("properties"):
-                try:
-                    result["properties"] = json.loads(result["properties"])
-                except:
-                    pass
-            return result
+            return edge.model_dump()
         return None
 
     def list_nodes(
-        self, node_type: Optional[str] = None, limit: int = 100
+        self,
+        node_type: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+        after_id: Optional[int] = None,
     ) -> List[Dict]:
         """列出节点"""
-        nodes = list_nodes_from_db(
-            kb_name=self.kb_name, node_type=node_type, limit=limit
+        return list_nodes_from_db(
+            kb_name=self.kb_name,
+            node_type=node_type,
+            limit=limit,
+            offset=offset,
+            after_id=after_id,
         )
-        result = []
-        for node in nodes:
-            node_dict = node.model_dump()
-            if node_dict.get("properties"):
-                try:
-                    node_dict["properties"] = json.loads(node_dict["properties"])
-                except:
-                    pass
-            result.append(node_dict)
-        return result
 
     def list_edges(
         self,
         node_id: Optional[str] = None,
         relation_type: Optional[str] = None,
         limit: int = 100,
+        offset: int = 0,
+        after_id: Optional[int] = None,
     ) -> List[Dict]:
         """列出边"""
-        edges = list_edges_from_db(
+        return list_edges_from_db(
             kb_name=self.kb_name,
             node_id=node_id,
             relation_type=relation_type,
             limit=limit,
+            offset=offset,
+            after_id=after_id,
+        )
+
+    def list_edges_for_nodes(
+        self, node_ids: List[str], limit_per_node: int = 20
+    ) -> List[Dict]:
+        """一次查询列出与多个节点相关的边（已去重），每个节点最多 limit_per_node 条"""
+        return list_edges_bulk_from_db(
+            kb_name=self.kb_name, node_ids=node_ids, limit_per_node=limit_per_node
+        )
+
+    def list_subgraph_edges(self, node_ids: List[str], limit: int = 1000) -> List[Dict]:
+        """列出两端都在给定节点中的边，即这些节点构成的子图中的边"""
+        return list_subgraph_edges_from_db(
+            kb_name=self.kb_name, node_ids=node_ids, limit=limit
         )
-        result = []
-        for edge in edges:
-            edge_dict = edge.model_dump()
-            if edge_dict.get("properties"):
-                try:
-                    edge_dict["properties"] = json.loads(edge_dict["properties"])
-                except:
-                    pass
-            result.append(edge_dict)
-        return result
 
     def delete_node(self, node_id: str) -> bool:
         """删除节点（同时删除相关的边）"""
         try:
-            # 从networkx图中删除
-            if self.graph.has_node(node_id):
-                self.graph.remove_node(node_id)
-
             # 从数据库删除
             delete_node_from_db(kb_name=self.kb_name, node_id=node_id)
+            self._invalidate_trigram_index()
+            self._invalidate_context_cache()
+            with self._lock:
+                # 在CSR中把相关的边标记删除，无需从数据库重建
+                if self._csr is not None and self._csr.remove_node(node_id):
+                    if self._csr.needs_compaction():
+                        self._csr = self._csr.compact()
 
-            logger.info(f"Deleted node: {node_id} from knowledge graph {self.kb_name}")
+            logger.debug("Deleted node: {} from knowledge graph {}", node_id, self.kb_name)
             return True
         except Exception as e:
             logger.error(f"Error deleting node: {e}")
@@ -193,35 +683,65 @@ class KnowledgeGraphService:
             # 从数据库获取边信息
             edge = get_edge_from_db(kb_name=self.kb_name, edge_id=edge_id)
             if edge:
-                # 从networkx图中删除
-                if self.graph.has_edge(edge.source_node_id, edge.target_node_id):
-                    self.graph.remove_edge(edge.source_node_id, edge.target_node_id)
-
                 # 从数据库删除
                 delete_edge_from_db(kb_name=self.kb_name, edge_id=edge_id)
+                self._invalidate_context_cache()
+                with self._lock:
+                    # 在CSR中标记删除，无需从数据库重建
+                    if self._csr is not None and self._csr.remove_edge(edge_id):
+                        if self._csr.needs_compaction():
+                            self._csr = self._csr.compact()
 
-                logger.info(f"Deleted edge: {edge_id} from knowledge graph {self.kb_name}")
+                logger.debug(
+                    "Deleted edge: {} from knowledge graph {}", edge_id, self.kb_name
+                )
                 return True
             return False
         except Exception as e:
             logger.error(f"Error deleting edge: {e}")
             return False
 
+    def bulk_delete_nodes(self, node_ids: List[str]) -> int:
+        """批量删除节点（同时删除相关的边），单个事务完成，返回删除的节点数"""
+        if not node_ids:
+            return 0
+        count = delete_nodes_from_db(kb_name=self.kb_name, node_ids=node_ids)
+        self._invalidate_trigram_index()
+        self._invalidate_context_cache()
+        with self._lock:
+            # 在CSR中把相关的边标记删除，全部处理完后再判断是否需要压缩
+            if self._csr is not None:
+                for node_id in node_ids:
+                    self._csr.remove_node(node_id)
+                if self._csr.needs_compaction():
+                    self._csr = self._csr.compact()
+        logger.info(f"Deleted {count} nodes from knowledge graph {self.kb_name}")
+        return count
+
+    def bulk_delete_edges(self, edge_ids: List[str]) -> int:
+        """批量删除边，单个事务完成，返回删除的边数"""
+        if not edge_ids:
+            return 0
+        count = delete_edges_from_db(kb_name=self.kb_name, edge_ids=edge_ids)
+        self._invalidate_context_cache()
+        with self._lock:
+            if self._csr is not None:
+                for edge_id in edge_ids:
+                    self._csr.remove_edge(edge_id)
+                if self._csr.needs_compaction():
+                    self._csr = self._csr.compact()
+        logger.info(f"Deleted {count} edges from knowledge graph {self.kb_name}")
+        return count
+
     def search_nodes(self, keyword: str, limit: int = 50) -> List[Dict]:
-        """搜索节点"""
-        nodes = search_nodes_from_db(
-            kb_name=self.kb_name, keyword=keyword, limit=limit
-        )
-        result = []
-        for node in nodes:
-            node_dict = node.model_dump()
-            if node_dict.get("properties"):
-                try:
-                    node_dict["properties"] = json.loads(node_dict["properties"])
-                except:
-                    pass
-            result.append(node_dict)
-        return result
+        """搜索节点（按名称或类型子串匹配）
+
+        优先使用内存中的三元组倒排索引，图谱过大时直接查询数据库
+        """
+        index = self._get_trigram_index()
+        if index is None:
+            return search_nodes_from_db(kb_name=self.kb_name, keyword=keyword, limit=limit)
+        return index.search(keyword, limit)
 
     def get_neighbors(
         self, node_id: str, direction: str = "both", max_depth: int = 1
@@ -236,92 +756,86 @@ class KnowledgeGraphService:
         result = {"nodes": [], "edges": []}
 
         try:
-            # 加载相关的图数据
-            self._load_subgraph(node_id, max_depth)
-
-            visited_nodes = set()
-            visited_edges = set()
-
-            def _traverse(current_id: str, depth: int):
-                if depth > max_depth or current_id in visited_nodes:
-                    return
-
-                visited_nodes.add(current_id)
-                node_info = self.get_node(current_id)
-                if node_info:
-                    result["nodes"].append(node_info)
-
-                if depth < max_depth:
-                    # 获取出边
-                    if direction in ["out", "both"]:
-                        edges = list_edges_from_db(
-                            kb_name=self.kb_name, node_id=current_id, limit=100
-                        )
-                        for edge in edges:
-                            if edge.source_node_id == current_id:
-                                edge_dict = edge.model_dump()
-                                if edge_dict.get("properties"):
-                                    try:
-                                        edge_dict["properties"] = json.loads(
-                                            edge_dict["properties"]
-                                        )
-                                    except:
-                                        pass
-                                
-                                edge_key = (edge.source_node_id, edge.target_node_id, edge.relation_type)
-                                if edge_key not in visited_edges:
-                                    visited_edges.add(edge_key)
-                                    result["edges"].append(edge_dict)
-                                    _traverse(edge.target_node_id, depth + 1)
-
-                    # 获取入边
-                    if direction in ["in", "both"]:
-                        edges = list_edges_from_db(
-                            kb_name=self.kb_name, node_id=current_id, limit=100
-                        )
-                        for edge in edges:
-                            if edge.target_node_id == current_id:
-                                edge_dict = edge.model_dump()
-                                if edge_dict.get("properties"):
-                                    try:
-                                        edge_dict["properties"] = json.loads(
-                                            edge_dict["properties"]
-                                        )
-                                    except:
-                                        pass
-                                
-                                edge_key = (edge.source_node_id, edge.target_node_id, edge.relation_type)
-                                if edge_key not in visited_edges:
-                                    visited_edges.add(edge_key)
-                                    result["edges"].append(edge_dict)
-                                    _traverse(edge.source_node_id, depth + 1)
-
-            _traverse(node_id, 0)
+            csr = self._get_csr()
+            start = csr.index.get(node_id)
+            if start is None:
+                result["nodes"] = self.get_nodes([node_id])
+                return result
+
+            # 按层广度优先遍历，每层用一次向量化展开代替逐节点、逐边的循环；
+            # 遍历阶段只记录节点和边的下标，最后统一批量查询节点详情
+            node_seen = np.zeros(len(csr.node_ids), dtype=bool)
+            edge_seen = np.zeros(len(csr.edges), dtype=bool)
+            node_seen[start] = True
+            frontier = np.array([start], dtype=np.int64)
+            visited_nodes = [frontier]
+            visited_edges = []
+
+            for _ in range(max_depth):
+                neighbors, edges = csr.expand(frontier, direction)
+                # 同一条边可能从两端各展开一次，保留首次出现的位置
+                _, first = np.unique(edges, return_index=True)
+                first.sort()
+                neighbors, edges = neighbors[first], edges[first]
+                new_edges = ~edge_seen[edges]
+                neighbors, edges = neighbors[new_edges], edges[new_edges]
+                edge_seen[edges] = True
+                visited_edges.append(edges)
+
+                _, first = np.unique(neighbors, return_index=True)
+                first.sort()
+                frontier = neighbors[first]
+                frontier = frontier[~node_seen[frontier]]
+                if not frontier.size:
+                    break
+                node_seen[frontier] = True
+                visited_nodes.append(frontier)
+
+            result["nodes"] = self.get_nodes(
+                [csr.node_ids[u] for layer in visited_nodes for u in layer.tolist()]
+            )
+            result["edges"] = [
+                csr.edges[i] for layer in visited_edges for i in layer.tolist()
+            ]
 
         except Exception as e:
             logger.error(f"Error getting neighbors: {e}")
 
         return result
 
-    def _load_subgraph(self, node_id: str, depth: int):
-        """加载子图到networkx"""
-        # 这里可以优化，只加载需要的部分
-        pass
-
     def clear_graph(self) -> bool:
         """清空图谱"""
         try:
-            self.graph.clear()
             clear_graph_from_db(kb_name=self.kb_name)
+            self._invalidate_csr()
+            self._invalidate_trigram_index()
+            self._invalidate_context_cache()
             logger.info(f"Cleared knowledge graph {self.kb_name}")
             return True
         except Exception as e:
             logger.error(f"Error clearing graph: {e}")
             return False
 
-    def get_stats(self) -> Dict[str, int]:
-        """获取图谱统计信息"""
-        return get_graph_stats(kb_name=self.kb_name)
+    def get_stats(self) -> Dict[str, Any]:
+        """获取图谱统计信息（读取数据库维护的计数表，不扫描节点和边，结果短时缓存）"""
+        with self._lock:
+            cached = self._stats_cache
+            version = self.version
+        if (
+            cached is None
+            or cached[0] != version
+            or time.monotonic() - cached[1] >= self.STATS_CACHE_TTL
+        ):
+            stats = get_graph_stats(kb_name=self.kb_name)
+            stats["by_type"] = {
+                node_type or "未分类": count
+                for node_type, count in stats["by_type"].items()
+            }
+            cached = (version, time.monotonic(), stats)
+            with self._lock:
+                self._stats_cache = cached
+        stats = cached[2]
+        return {**stats, "by_type": dict(stats["by_type"])}
 
     def export_graph(self) -> Dict[str, Any]:
         """导出图谱数据"""
@@ -330,68 +844,188 @@ class KnowledgeGraphService:
 
         return {"kb_name": self.kb_name, "nodes": nodes, "edges": edges}
 
+    def iter_export(self, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """逐条导出图谱数据，按页读取数据库，避免一次性加载整个图谱
+
+        依次产出 {"type": "node", ...} 和 {"type": "edge", ...} 记录
+        """
+        for list_func, record_type in (
+            (self.list_nodes, "node"),
+            (self.list_edges, "edge"),
+        ):
+            for item in self._iter_pages(list_func, page_size):
+                yield {"type": record_type, **item}
+
+    def export_arrow(self) -> List[bytes]:
+        """以 Arrow IPC 格式导出图谱，返回节点、边两个IPC流
+
+        节点: node_id, node_name, node_type(字典编码), properties(MessagePack)
+        边: source_node_id/target_node_id(共享同一个节点ID字典的整数下标), relation_type(字典编码),
+            weight, properties(MessagePack)
+        """
+        pa = _import_pyarrow()
+        nodes = list(self._iter_pages(self.list_nodes))
+        edges = list(self._iter_pages(self.list_edges))
+
+        index: Dict[str, int] = {}
+        for node in nodes:
+            index.setdefault(node["node_id"], len(index))
+        sources = [index.setdefault(e["source_node_id"], len(index)) for e in edges]
+        targets = [index.setdefault(e["target_node_id"], len(index)) for e in edges]
+        node_ids = pa.array(list(index), pa.string())
+
+        def encode_properties(items: List[Dict]):
+            return pa.array(
+                [
+                    msgspec.msgpack.encode(x["properties"]) if x.get("properties") else None
+                    for x in items
+                ],
+                pa.binary(),
+            )
+
+        nodes_batch = pa.record_batch(
+            {
+                "node_id": pa.array([n["node_id"] for n in nodes], pa.string()),
+                "node_name": pa.array([n["node_name"] for n in nodes], pa.string()),
+                "node_type": pa.array(
+                    [n["node_type"] for n in nodes], pa.string()
+                ).dictionary_encode(),
+                "properties": encode_properties(nodes),
+            }
+        )
+        edges_batch = pa.record_batch(
+            {
+                "source_node_id": pa.DictionaryArray.from_arrays(
+                    pa.array(sources, pa.int32()), node_ids
+                ),
+                "target_node_id": pa.DictionaryArray.from_arrays(
+                    pa.array(targets, pa.int32()), node_ids
+                ),
+                "relation_type": pa.array(
+                    [e["relation_type"] for e in edges], pa.string()
+                ).dictionary_encode(),
+                "weight": pa.array([e["weight"] for e in edges], pa.float64()),
+                "properties": encode_properties(edges),
+            }
+        )
+
+        streams = []
+        for batch in (nodes_batch, edges_batch):
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, batch.schema) as writer:
+                writer.write_batch(batch)
+            streams.append(sink.getvalue().to_pybytes())
+        return streams
+
+    def import_arrow(self, data: bytes, clear_existing: bool = False) -> Dict[str, int]:
+        """导入 export_arrow 导出的数据（节点、边两个连续的IPC流），按列批量写入"""
+        pa = _import_pyarrow()
+        reader = pa.BufferReader(data)
+        nodes_table = pa.ipc.open_stream(reader).read_all()
+        edges_table = pa.ipc.open_stream(reader).read_all()
+
+        def decode_properties(table) -> List[Optional[Dict]]:
+            return [
+                msgspec.msgpack.decode(x) if x is not None else None
+                for x in table.column("properties").to_pylist()
+            ]
+
+        nodes = [
+            {
+                "node_id": node_id,
+                "node_name": node_name,
+                "node_type": node_type,
+                "properties": properties,
+            }
+            for node_id, node_name, node_type, properties in zip(
+                nodes_table.column("node_id").to_pylist(),
+                nodes_table.column("node_name").to_pylist(),
+                nodes_table.column("node_type").to_pylist(),
+                decode_properties(nodes_table),
+            )
+        ]
+        edges = [
+            {
+                "source_node_id": source,
+                "target_node_id": target,
+                "relation_type": relation_type,
+                "weight": weight,
+                "properties": properties,
+            }
+            for source, target, relation_type, weight, properties in zip(
+                edges_table.column("source_node_id").to_pylist(),
+                edges_table.column("target_node_id").to_pylist(),
+                edges_table.column("relation_type").to_pylist(),
+                edges_table.column("weight").to_pylist(),
+                decode_properties(edges_table),
+            )
+        ]
+        node_count, edge_count = self._import(nodes, edges, clear_existing)
+        logger.info(
+            f"Imported {node_count} nodes and {edge_count} edges to {self.kb_name} from Arrow IPC"
+        )
+        return {"node_count": node_count, "edge_count": edge_count}
+
     def import_graph(self, graph_data: Dict[str, Any], clear_existing: bool = False):
         """导入图谱数据"""
         try:
-            if clear_existing:
-                self.clear_graph()
-
-            # 导入节点
-            for node in graph_data.get("nodes", []):
-                self.add_node(
-                    node_id=node["node_id"],
-                    node_name=node["node_name"],
-                    node_type=node.get("node_type"),
-                    properties=node.get("properties"),
-                )
-
-            # 导入边
-            for edge in graph_data.get("edges", []):
-                self.add_edge(
-                    source_node_id=edge["source_node_id"],
-                    target_node_id=edge["target_node_id"],
-                    relation_type=edge.get("relation_type"),
-                    properties=edge.get("properties"),
-                    weight=edge.get("weight", 1.0),
-                )
-
-            logger.info(f"Imported graph data to {self.kb_name}")
+            # 节点和边在同一个事务中批量写入
+            node_count, edge_count = self._import(
+                graph_data.get("nodes", []), graph_data.get("edges", []), clear_existing
+            )
+            logger.info(
+                f"Imported {node_count} nodes and {edge_count} edges to {self.kb_name}"
+            )
             return True
         except Exception as e:
             logger.error(f"Error importing graph: {e}")
             return False
 
     def find_path(
-        self, source_node_id: str, target_node_id: str, max_length: int = 5
+        self,
+        source_node_id: str,
+        target_node_id: str,
+        max_length: int = 5,
+        shortest_only: bool = False,
     ) -> List[List[str]]:
-        """查找两个节点之间的路径"""
+        """查找两个节点之间的路径（按跳数计，不超过max_length）
+
+        默认返回所有简单路径，shortest_only 为 True 时只返回最短路径
+        """
         try:
-            # 加载相关数据到networkx
-            # 这里简化处理，实际应用中需要更智能的加载策略
-            nodes = self.list_nodes(limit=1000)
-            edges = self.list_edges(limit=1000)
+            csr = self._get_csr()
+            if source_node_id not in csr.index or target_node_id not in csr.index:
+                return [[source_node_id]] if source_node_id == target_node_id else []
 
-            # 构建临时图
-            temp_graph = nx.DiGraph()
-            for node in nodes:
-                temp_graph.add_node(node["node_id"])
-            for edge in edges:
-                temp_graph.add_edge(edge["source_node_id"], edge["target_node_id"])
-
-            # 查找所有简单路径
-            paths = []
-            try:
-                all_paths = nx.all_simple_paths(
-                    temp_graph,
-                    source_node_id,
-                    target_node_id,
-                    cutoff=max_length,
-                )
-                paths = list(all_paths)
-            except nx.NetworkXNoPath:
-                pass
+            search = _bfs_shortest_paths if shortest_only else _all_simple_paths
+            paths = search(
+                csr.successors,
+                csr.index[source_node_id],
+                csr.index[target_node_id],
+                max_length,
+            )
+            return [[csr.node_ids[i] for i in path] for path in paths]
+        except Exception as e:
+            logger.error(f"Error finding path: {e}")
+            return []
 
-            return paths
+    def find_path_bidirectional(
+        self, source_node_id: str, target_node_id: str, max_length: int = 5
+    ) -> List[List[str]]:
+        """使用双向BFS查找两个节点之间的最短路径，结果与 find_path 相同"""
+        try:
+            csr = self._get_csr()
+            if source_node_id not in csr.index or target_node_id not in csr.index:
+                return [[source_node_id]] if source_node_id == target_node_id else []
+
+            paths = _bidirectional_shortest_paths(
+                csr.successors,
+                csr.predecessors,
+                csr.index[source_node_id],
+                csr.index[target_node_id],
+                max_length,
+            )
+            return [[csr.node_ids[i] for i in path] for path in paths]
         except Exception as e:
             logger.error(f"Error finding path: {e}")
             return []
@@ -404,17 +1038,60 @@ class KnowledgeGraphService:
         根据查询关键词，从知识图谱中提取相关的节点和关系，
         格式化为LLM可理解的文本上下文
         """
+        context, _ = self.get_context_and_nodes(query=query, top_k=top_k)
+        return context
+
+    def get_context_and_nodes(
+        self, query: str, top_k: int = 10
+    ) -> Tuple[str, List[Dict]]:
+        """只搜索一次节点，同时返回LLM图谱上下文和命中的节点列表（结果会被缓存）"""
+        key = (query, top_k)
+        with self._lock:
+            cached = self._context_cache.get(key)
+            if cached is not None:
+                self._context_cache.move_to_end(key)
+                return cached[0], list(cached[1])
+
         try:
-            # 搜索相关节点
             nodes = self.search_nodes(keyword=query, limit=top_k)
+        except Exception as e:
+            logger.error(f"Error generating LLM context: {e}")
+            return "", []
+        context = self._format_graph_context(nodes)
 
+        with self._lock:
+            self._context_cache[key] = (context, nodes)
+            while len(self._context_cache) > self.CONTEXT_CACHE_SIZE:
+                self._context_cache.popitem(last=False)
+        return context, list(nodes)
+
+    def _format_graph_context(self, nodes: List[Dict]) -> str:
+        """将节点及其关系格式化为LLM可理解的文本上下文"""
+        try:
             if not nodes:
                 return ""
 
+            # 一次查询取出所有命中节点的相关边，再一次查询取出边另一端的节点
+            edges = self.list_edges_for_nodes(
+                [node["node_id"] for node in nodes], limit_per_node=20
+            )
+            endpoint_ids = list(
+                dict.fromkeys(
+                    node_id
+                    for edge in edges
+                    for node_id in (edge["source_node_id"], edge["target_node_id"])
+                )
+            )
+            names = {
+                endpoint["node_id"]: endpoint["node_name"]
+                for endpoint in self.get_nodes(endpoint_ids)
+            }
+
             # 构建上下文文本
             context_parts = ["# 知识图谱上下文\n"]
 
             for node in nodes:
+                node_id = node["node_id"]
                 # 添加节点信息
                 context_parts.append(
                     f"## 实体: {node['node_name']} ({node.get('node_type', '未分类')})"
@@ -422,28 +1099,33 @@ class KnowledgeGraphService:
 
                 if node.get("properties"):
                     context_parts.append("属性:")
-                    for key, value in node["properties"].items():
-                        context_parts.append(f"  - {key}: {value}")
+                    context_parts.extend(
+                        f"  - {key}: {value}" for key, value in node["properties"].items()
+                    )
 
-                # 获取相关边
-                edges = self.list_edges(node_id=node["node_id"], limit=20)
+                # 相关边按ID排序，取该节点的前20条，与逐个节点查询的结果一致
+                node_edges = [
+                    edge
+                    for edge in edges
+                    if node_id in (edge["source_node_id"], edge["target_node_id"])
+                ][:20]
 
-                if edges:
+                if node_edges:
                     context_parts.append("关系:")
-                    for edge in edges:
-                        if edge["source_node_id"] == node["node_id"]:
+                    for edge in node_edges:
+                        if edge["source_node_id"] == node_id:
                             # 出边
-                            target = self.get_node(edge["target_node_id"])
-                            if target:
+                            target_name = names.get(edge["target_node_id"])
+                            if target_name is not None:
                                 context_parts.append(
-                                    f"  - {edge.get('relation_type', '关联')} -> {target['node_name']}"
+                                    f"  - {edge.get('relation_type', '关联')} -> {target_name}"
                                 )
                         else:
                             # 入边
-                            source = self.get_node(edge["source_node_id"])
-                            if source:
+                            source_name = names.get(edge["source_node_id"])
+                            if source_name is not None:
                                 context_parts.append(
-                                    f"  - {source['node_name']} {edge.get('relation_type', '关联')} -> {node['node_name']}"
+                                    f"  - {source_name} {edge.get('relation_type', '关联')} -> {node['node_name']}"
                                 )
 
                 context_parts.append("")
@@ -453,3 +1135,9 @@ class KnowledgeGraphService:
         except Exception as e:
             logger.error(f"Error generating LLM context: {e}")
             return ""
+
+
+@lru_cache(maxsize=32)
+def get_kg_service(kb_name: str) -> KnowledgeGraphService:
+    """获取知识库对应的 KnowledgeGraphService，同一知识库复用同一个实例"""
+    return KnowledgeGraphService(kb_name=kb_name)
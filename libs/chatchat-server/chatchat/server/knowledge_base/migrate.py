@@ -10,6 +10,9 @@ from chatchat.server.db.models.conversation_model import ConversationModel
 from chatchat.server.db.models.knowledge_graph_model import (
     KnowledgeGraphEdgeModel,
     KnowledgeGraphNodeModel,
+    create_composite_indexes,
+    create_graph_stats_triggers,
+    migrate_properties_to_json,
 )
 from chatchat.server.db.models.message_model import MessageModel
 from chatchat.server.db.repository.knowledge_file_repository import (
@@ -45,6 +48,9 @@ logger = build_logger()
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    create_composite_indexes(engine)
+    migrate_properties_to_json(engine)
+    create_graph_stats_triggers(engine)
 
 
 def reset_tables():
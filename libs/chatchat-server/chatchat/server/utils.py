@@ -349,9 +349,37 @@ def get_OpenAI(
     return model
 
 
+@cached(
+    max_size=1024,
+    ttl=300,
+    algorithm=CachingAlgorithmFlag.LRU,
+    custom_key_maker=lambda embed_model, text, embeddings: (embed_model, text),
+)
+def _embed_query_cached(embed_model: str, text: str, embeddings: Embeddings) -> List[float]:
+    return embeddings.embed_query(text)
+
+
+class QueryCachedEmbeddings(Embeddings):
+    '''
+    按 (模型名称, 查询文本) 缓存近期的查询向量，同一个问题在语义缓存查找和向量库检索中只请求一次嵌入接口
+    文档向量化不做缓存，直接转发
+    '''
+
+    def __init__(self, embeddings: Embeddings, embed_model: str):
+        self.embeddings = embeddings
+        self.embed_model = embed_model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return _embed_query_cached(self.embed_model, text, self.embeddings)
+
+
 def get_Embeddings(
         embed_model: str = None,
         local_wrap: bool = False,  # use local wrapped api
+        query_cache: bool = True,  # cache query embeddings, see QueryCachedEmbeddings
 ) -> Embeddings:
     from langchain_community.embeddings import OllamaEmbeddings
     from langchain_openai import OpenAIEmbeddings
@@ -376,24 +404,25 @@ def get_Embeddings(
                 openai_proxy=model_info.get("api_proxy"),
             )
         if model_info.get("platform_type") == "openai":
-            return OpenAIEmbeddings(**params)
+            embeddings = OpenAIEmbeddings(**params)
         elif model_info.get("platform_type") == "ollama":
-            return OllamaEmbeddings(
+            embeddings = OllamaEmbeddings(
                 base_url=model_info.get("api_base_url").replace("/v1", ""),
                 model=embed_model,
             )
         elif model_info.get("platform_type") == "zhipuai":
-            return ZhipuAIEmbeddings(
+            embeddings = ZhipuAIEmbeddings(
                 base_url=model_info.get("api_base_url"),
                 api_key=model_info.get("api_key"),
                 zhipuai_proxy=model_info.get("api_proxy"),
                 model=embed_model,
             )
         else:
-            return LocalAIEmbeddings(**params)
+            embeddings = LocalAIEmbeddings(**params)
     except Exception as e:
         logger.exception(f"failed to create Embeddings for model: {embed_model}.")
         raise e
+    return QueryCachedEmbeddings(embeddings, embed_model) if query_cache else embeddings
 
 
 def check_embed_model(embed_model: str = None) -> Tuple[bool, str]:
@@ -401,7 +430,8 @@ def check_embed_model(embed_model: str = None) -> Tuple[bool, str]:
     check weather embed_model accessable, use default embed model if None
     '''
     embed_model = embed_model or get_default_embedding()
-    embeddings = get_Embeddings(embed_model=embed_model)
+    # 连通性检查不使用查询向量缓存，确保每次都真实请求嵌入接口
+    embeddings = get_Embeddings(embed_model=embed_model, query_cache=False)
     try:
         embeddings.embed_query("this is a test")
         return True, ""
@@ -156,6 +156,9 @@ class KBSettings(BaseFileSettings):
     SCORE_THRESHOLD: float = 2.0
     """知识库匹配相关度阈值，取值范围在0-2之间，SCORE越小，相关度越高，取到2相当于不筛选，建议设置在0.5左右"""
 
+    KB_CONTEXT_MAX_LENGTH: int = 0
+    """知识库对话中单段文档送入大模型上下文的最大长度，超出部分截断，默认为0不截断"""
+
     DEFAULT_SEARCH_ENGINE: t.Literal["bing", "duckduckgo", "metaphor", "searx"] = "duckduckgo"
     """默认搜索引擎"""
 
@@ -3,102 +3,185 @@
 提供多种可视化方式：Plotly交互式图谱、PyVis网络图、D3.js图谱
 """
 import json
-from typing import Dict, List
+from collections import Counter
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Tuple
+import numpy as np
+import orjson
 import streamlit as st
 import streamlit.components.v1 as components
 
+from chatchat.utils import build_logger
+
+logger = build_logger()
+
+
+# 节点数与边数之和超过该值时改用 WebGL 渲染（go.Scattergl），避免 SVG 元素过多拖慢浏览器
+_WEBGL_THRESHOLD = 200
+
+# 能量布局需要计算所有节点对之间的斥力（N×N矩阵），超过该节点数时退回 spring_layout
+_ENERGY_LAYOUT_MAX_NODES = 1000
+
+# 各可视化方式共用的节点类型配色（只读），未知类型使用 _DEFAULT_COLOR
+_DEFAULT_COLOR = '#95A5A6'
+_TYPE_COLORS = MappingProxyType({
+    'Person': '#FF6B6B',
+    'Company': '#4ECDC4',
+    'Product': '#45B7D1',
+    'Location': '#FFA07A',
+    'Organization': '#98D8C8',
+    'Event': '#FFD93D',
+    '未分类': _DEFAULT_COLOR
+})
+
+
+@lru_cache(maxsize=1)
+def _load_minimize():
+    """导入 scipy.optimize.minimize，未安装 scipy（可选依赖 layout）时返回 None 并只提示一次"""
+    try:
+        from scipy.optimize import minimize
+    except ImportError:
+        logger.warning(
+            "scipy is not installed, falling back to nx.spring_layout for graph layout. "
+            "Install the 'layout' extra (pip install scipy) to enable the energy layout."
+        )
+        return None
+    return minimize
+
+
+def _energy_layout(G, k: float = 1.0, gravity: float = 1.0, max_iter: int = 50) -> Dict:
+    """用 L-BFGS 直接最小化 Fruchterman-Reingold 能量计算节点布局
+
+    能量 = 边长的三次方（引力）- 节点对距离的对数（斥力）+ 到原点距离的平方（重力，
+    防止不连通的部分互相无限远离），梯度解析计算，比逐步迭代的力导向收敛更快。
+    未安装 scipy 或节点过多时退回 nx.spring_layout
+    """
+    import networkx as nx
+
+    n = G.number_of_nodes()
+    minimize = _load_minimize()
+    if minimize is None or n < 3 or n > _ENERGY_LAYOUT_MAX_NODES:
+        return nx.spring_layout(G, k=k, iterations=max_iter)
+
+    node_ids = list(G)
+    index = {node: i for i, node in enumerate(node_ids)}
+    edges = np.array(
+        [(index[u], index[v]) for u, v in G.edges() if u != v], dtype=np.int64
+    ).reshape(-1, 2)
+    sources, targets = edges[:, 0], edges[:, 1]
+    diagonal = np.eye(n, dtype=bool)
+
+    def energy_and_grad(x):
+        pos = x.reshape(n, 2)
+        grad = gravity * pos
+        energy = 0.5 * gravity * (pos ** 2).sum()
+
+        # 引力：沿边 E = d^3 / 3k，dE/dx = d * (xi - xj) / k
+        delta = pos[sources] - pos[targets]
+        dist = np.sqrt((delta ** 2).sum(axis=1))
+        energy += (dist ** 3).sum() / (3 * k)
+        force = (dist / k)[:, None] * delta
+        np.add.at(grad, sources, force)
+        np.add.at(grad, targets, -force)
+
+        # 斥力：所有节点对 E = -k^2 * log(d)，dE/dxi = -k^2 * (xi - xj) / d^2
+        # 用 |xi|^2 + |xj|^2 - 2 xi·xj 计算距离矩阵，避免构造 N×N×2 的差值数组
+        sq_norm = (pos ** 2).sum(axis=1)
+        sq_dist = np.maximum(sq_norm[:, None] + sq_norm[None, :] - 2 * pos @ pos.T, 1e-9)
+        sq_dist[diagonal] = 1.0
+        energy -= 0.25 * k * k * np.log(sq_dist).sum()
+        inv = 1.0 / sq_dist
+        inv[diagonal] = 0.0
+        grad -= k * k * (inv.sum(axis=1)[:, None] * pos - inv @ pos)
+        return energy, grad.ravel()
+
+    x0 = np.random.default_rng(0).random(2 * n)
+    result = minimize(
+        energy_and_grad, x0, jac=True, method="L-BFGS-B", options={"maxiter": max_iter}
+    )
+    pos = nx.rescale_layout(result.x.reshape(n, 2))
+    return dict(zip(node_ids, pos))
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _compute_layout(node_ids: Tuple, edge_pairs: Tuple) -> Dict:
+    """按图结构（节点ID、边的端点）缓存布局结果，Streamlit 重新运行页面时图不变就不再重复计算"""
+    import networkx as nx
+
+    G = nx.DiGraph()
+    G.add_nodes_from(node_ids)
+    G.add_edges_from(edge_pairs)
+    pos = _energy_layout(G, k=1, max_iter=50)
+    return {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+
 
 def visualize_with_plotly(nodes: List[Dict], edges: List[Dict]):
     """使用Plotly绘制交互式图谱"""
     try:
         import plotly.graph_objects as go
-        import networkx as nx
+        import plotly.io as pio
         
-        # 创建NetworkX图
-        G = nx.DiGraph()
+        # 图中坐标、文本数组较多，改用orjson（C实现）序列化图表，比默认的json引擎快得多
+        pio.json.config.default_engine = "orjson"
         
-        # 添加节点
-        node_colors = {}
-        node_types = set()
-        for node in nodes:
-            node_id = node['node_id']
-            node_type = node.get('node_type', '未分类')
-            node_types.add(node_type)
-            G.add_node(node_id, 
-                      name=node['node_name'], 
-                      type=node_type,
-                      properties=node.get('properties', {}))
-            node_colors[node_id] = node_type
+        # 大图使用WebGL渲染
+        scatter_cls = go.Scattergl if len(nodes) + len(edges) > _WEBGL_THRESHOLD else go.Scatter
         
-        # 添加边
-        for edge in edges:
-            G.add_edge(edge['source_node_id'], 
-                      edge['target_node_id'],
-                      relation=edge.get('relation_type', '关联'),
-                      weight=edge.get('weight', 1.0))
+        # 节点按ID去重（同ID以最后一次出现为准），直接使用原始列表构建轨迹，不再构造NetworkX图
+        node_by_id = {node['node_id']: node for node in nodes}
+        edge_pairs = tuple((edge['source_node_id'], edge['target_node_id']) for edge in edges)
         
-        # 使用spring layout布局
-        pos = nx.spring_layout(G, k=1, iterations=50)
+        # 使用力导向能量最小化布局（按图结构缓存）
+        pos = _compute_layout(tuple(node_by_id), edge_pairs)
         
-        # 为不同类型的节点分配颜色
-        type_colors = {
-            'Person': '#FF6B6B',
-            'Company': '#4ECDC4',
-            'Product': '#45B7D1',
-            'Location': '#FFA07A',
-            'Organization': '#98D8C8',
-            'Event': '#FFD93D',
-            '未分类': '#95A5A6'
-        }
+        # 所有边合并为一条轨迹，各边之间用None断开，避免每条边一个trace导致渲染和悬停变慢
+        edge_x, edge_y, edge_text = [], [], []
+        for (source, target), edge in zip(edge_pairs, edges):
+            x0, y0 = pos[source]
+            x1, y1 = pos[target]
+            text = f"{source} → [{edge.get('relation_type', '关联')}] → {target}"
+            edge_x += [x0, x1, None]
+            edge_y += [y0, y1, None]
+            edge_text += [text, text, None]
         
-        # 创建边的轨迹
-        edge_traces = []
-        for edge in G.edges(data=True):
-            x0, y0 = pos[edge[0]]
-            x1, y1 = pos[edge[1]]
-            
-            # 计算箭头方向
-            relation = edge[2].get('relation', '关联')
-            
-            edge_trace = go.Scatter(
-                x=[x0, x1, None],
-                y=[y0, y1, None],
+        edge_traces = [
+            scatter_cls(
+                x=edge_x,
+                y=edge_y,
                 mode='lines',
                 line=dict(width=2, color='#888'),
                 hoverinfo='text',
-                text=f"{edge[0]} → [{relation}] → {edge[1]}",
+                text=edge_text,
                 showlegend=False
             )
-            edge_traces.append(edge_trace)
+        ]
         
-        # 按类型分组节点
-        node_traces_by_type = {}
-        for node in G.nodes():
-            node_type = G.nodes[node].get('type', '未分类')
-            if node_type not in node_traces_by_type:
-                node_traces_by_type[node_type] = {
-                    'x': [],
-                    'y': [],
-                    'text': [],
-                    'customdata': []
-                }
-            
-            x, y = pos[node]
-            node_traces_by_type[node_type]['x'].append(x)
-            node_traces_by_type[node_type]['y'].append(y)
-            node_traces_by_type[node_type]['text'].append(
-                f"{G.nodes[node]['name']}<br>类型: {node_type}<br>ID: {node}"
-            )
-            node_traces_by_type[node_type]['customdata'].append(node)
+        # 节点坐标、类型、名称一次性整理成数组，按类型用布尔掩码切片，不再逐节点分组
+        node_ids = list(node_by_id)
+        pos_arr = np.array([pos[node] for node in node_ids], dtype=float).reshape(-1, 2)
+        ids_arr = np.array(node_ids, dtype=object)
+        types_arr = np.array(
+            [node.get('node_type', '未分类') for node in node_by_id.values()], dtype=object
+        )
+        names_arr = np.array([node['node_name'] for node in node_by_id.values()], dtype=object)
+        hover_arr = np.array(
+            [
+                f"{name}<br>类型: {node_type}<br>ID: {node}"
+                for node, name, node_type in zip(node_ids, names_arr, types_arr)
+            ],
+            dtype=object
+        )
         
         # 创建节点轨迹
         node_traces = []
-        for node_type, data in node_traces_by_type.items():
-            color = type_colors.get(node_type, '#95A5A6')
+        for node_type in dict.fromkeys(types_arr.tolist()):
+            mask = types_arr == node_type
+            color = _TYPE_COLORS.get(node_type, _DEFAULT_COLOR)
             
-            node_trace = go.Scatter(
-                x=data['x'],
-                y=data['y'],
+            node_trace = scatter_cls(
+                x=pos_arr[mask, 0].tolist(),
+                y=pos_arr[mask, 1].tolist(),
                 mode='markers+text',
                 marker=dict(
                     size=30,
@@ -106,19 +189,28 @@ def visualize_with_plotly(nodes: List[Dict], edges: List[Dict]):
                     line=dict(width=2, color='white'),
                     symbol='circle'
                 ),
-                text=[G.nodes[n]['name'] for n in data['customdata']],
+                text=names_arr[mask].tolist(),
                 textposition="top center",
                 textfont=dict(size=10, color='black'),
                 hoverinfo='text',
-                hovertext=data['text'],
+                hovertext=hover_arr[mask].tolist(),
                 name=node_type,
-                customdata=data['customdata']
+                customdata=ids_arr[mask].tolist()
             )
             node_traces.append(node_trace)
         
         # 组合所有轨迹
         fig = go.Figure(data=edge_traces + node_traces)
         
+        # 坐标范围在服务端已知，直接给出，浏览器端不必再遍历所有点自动计算；留出边距容纳节点和上方的名称
+        all_pos = np.array(list(pos.values()), dtype=float).reshape(-1, 2)
+        pad = 0.15
+        if len(all_pos):
+            x_range = [float(all_pos[:, 0].min()) - pad, float(all_pos[:, 0].max()) + pad]
+            y_range = [float(all_pos[:, 1].min()) - pad, float(all_pos[:, 1].max()) + pad]
+        else:
+            x_range = y_range = [-1 - pad, 1 + pad]
+        
         # 更新布局
         fig.update_layout(
             title={
@@ -130,8 +222,10 @@ def visualize_with_plotly(nodes: List[Dict], edges: List[Dict]):
             showlegend=True,
             hovermode='closest',
             margin=dict(b=0, l=0, r=0, t=40),
-            xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-            yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+            xaxis=dict(range=x_range, autorange=False, showgrid=False, zeroline=False, showticklabels=False),
+            yaxis=dict(range=y_range, autorange=False, showgrid=False, zeroline=False, showticklabels=False),
+            # 页面重新运行时保留用户的平移、缩放状态
+            uirevision='kg',
             plot_bgcolor='rgba(250,250,250,1)',
             height=700,
             legend=dict(
@@ -156,12 +250,20 @@ def visualize_with_plotly(nodes: List[Dict], edges: List[Dict]):
         return False
 
 
+def _parse_properties(properties) -> Dict:
+    """节点属性统一转为字典：接口返回的是字典，旧数据可能是JSON字符串，无法解析时视为空"""
+    if isinstance(properties, str) and properties:
+        try:
+            properties = orjson.loads(properties)
+        except orjson.JSONDecodeError:
+            return {}
+    return properties if isinstance(properties, dict) else {}
+
+
 def visualize_with_pyvis(nodes: List[Dict], edges: List[Dict]):
     """使用PyVis生成交互式网络图"""
     try:
         from pyvis.network import Network
-        import tempfile
-        import os
         
         # 创建网络
         net = Network(
@@ -191,37 +293,29 @@ def visualize_with_pyvis(nodes: List[Dict], edges: List[Dict]):
         }
         """)
         
-        # 定义颜色映射
-        type_colors = {
-            'Person': '#FF6B6B',
-            'Company': '#4ECDC4',
-            'Product': '#45B7D1',
-            'Location': '#FFA07A',
-            'Organization': '#98D8C8',
-            'Event': '#FFD93D',
-            '未分类': '#95A5A6'
+        # 每种节点类型的颜色只解析一次
+        node_colors = {
+            node_type: _TYPE_COLORS.get(node_type, _DEFAULT_COLOR)
+            for node_type in {node.get('node_type', '未分类') for node in nodes}
         }
         
+        # 循环之前一次性解析所有节点的属性
+        node_props = [_parse_properties(node.get('properties')) for node in nodes]
+        
         # 添加节点
-        for node in nodes:
+        for node, props in zip(nodes, node_props):
             node_id = node['node_id']
             node_name = node['node_name']
             node_type = node.get('node_type', '未分类')
-            color = type_colors.get(node_type, '#95A5A6')
+            color = node_colors[node_type]
             
             # 构建标题（悬停显示）
-            title = f"<b>{node_name}</b><br>"
-            title += f"ID: {node_id}<br>"
-            title += f"类型: {node_type}"
+            title = f"<b>{node_name}</b><br>ID: {node_id}<br>类型: {node_type}"
             
-            if node.get('properties'):
-                try:
-                    props = json.loads(node['properties']) if isinstance(node['properties'], str) else node['properties']
-                    title += "<br><br><b>属性:</b><br>"
-                    for k, v in props.items():
-                        title += f"{k}: {v}<br>"
-                except:
-                    pass
+            if props:
+                title += "<br><br><b>属性:</b><br>" + "".join(
+                    f"{k}: {v}<br>" for k, v in props.items()
+                )
             
             net.add_node(
                 node_id,
@@ -232,35 +326,44 @@ def visualize_with_pyvis(nodes: List[Dict], edges: List[Dict]):
                 font={'size': 14}
             )
         
-        # 添加边
+        # 添加边：net.add_edge 每次都在节点ID列表中线性查找两端节点，边多时是 O(E·N)，
+        # 这里改用集合判断端点是否存在，并按 pyvis 的边格式直接追加
+        node_id_set = set(net.get_nodes())
         for edge in edges:
             source = edge['source_node_id']
             target = edge['target_node_id']
+            if source not in node_id_set or target not in node_id_set:
+                continue
             relation = edge.get('relation_type', '关联')
-            weight = edge.get('weight', 1.0)
             
-            net.add_edge(
-                source,
-                target,
-                title=relation,
-                label=relation,
-                arrows='to',
-                color={'color': '#888888'},
-                width=weight * 2,
-                font={'size': 10, 'align': 'middle'}
-            )
-        
-        # 保存到临时文件
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8') as f:
-            html_file = f.name
-            net.save_graph(html_file)
-        
-        # 读取并显示
-        with open(html_file, 'r', encoding='utf-8') as f:
-            html_content = f.read()
+            net.edges.append({
+                'from': source,
+                'to': target,
+                'title': relation,
+                'label': relation,
+                'arrows': 'to',
+                'color': {'color': '#888888'},
+                'width': edge.get('weight', 1.0) * 2,
+                'font': {'size': 10, 'align': 'middle'}
+            })
         
-        # 清理临时文件
-        os.unlink(html_file)
+        if hasattr(net, 'generate_html'):
+            # pyvis >= 0.3 可直接在内存中生成HTML
+            html_content = net.generate_html(notebook=False)
+        else:
+            import tempfile
+            import os
+            
+            # 旧版本只能保存到临时文件再读取
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.html', mode='w', encoding='utf-8') as f:
+                html_file = f.name
+                net.save_graph(html_file)
+            
+            with open(html_file, 'r', encoding='utf-8') as f:
+                html_content = f.read()
+            
+            # 清理临时文件
+            os.unlink(html_file)
         
         # 显示在streamlit中
         components.html(html_content, height=750, scrolling=False)
@@ -275,64 +378,52 @@ def visualize_with_pyvis(nodes: List[Dict], edges: List[Dict]):
         return False
 
 
-def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
-    """使用D3.js绘制力导向图（原生JavaScript，无需额外依赖）"""
-    
-    # 准备数据
-    d3_nodes = []
-    for node in nodes:
-        d3_nodes.append({
-            'id': node['node_id'],
-            'name': node['node_name'],
-            'type': node.get('node_type', '未分类'),
-            'properties': node.get('properties', {})
-        })
-    
-    d3_edges = []
-    for edge in edges:
-        d3_edges.append({
-            'source': edge['source_node_id'],
-            'target': edge['target_node_id'],
-            'relation': edge.get('relation_type', '关联'),
-            'weight': edge.get('weight', 1.0)
-        })
-    
-    # 构建HTML
-    html_content = f"""
+# D3.js 页面模板中不随数据变化的部分，只在导入时构建一次，渲染时与数据拼接
+_D3_HTML_HEAD = """
     <!DOCTYPE html>
     <html>
     <head>
         <meta charset="utf-8">
         <style>
-            body {{
+            body {
                 margin: 0;
                 padding: 0;
                 font-family: Arial, sans-serif;
-            }}
-            #graph {{
+            }
+            #graph {
+                position: relative;
                 width: 100%;
                 height: 700px;
                 border: 1px solid #ddd;
                 background-color: #fafafa;
-            }}
-            .node {{
+            }
+            #graph canvas {
+                position: absolute;
+                left: 0;
+                top: 0;
+                pointer-events: none;
+            }
+            #graph svg {
+                position: relative;
+            }
+            .node {
                 cursor: pointer;
                 stroke: #fff;
                 stroke-width: 2px;
-            }}
-            .node text {{
+            }
+            .node text {
                 font-size: 12px;
                 pointer-events: none;
-            }}
-            .link {{
+            }
+            .link {
                 stroke: #999;
                 stroke-opacity: 0.6;
-            }}
-            .link-label {{
+            }
+            .link-label {
                 font-size: 10px;
                 fill: #666;
-            }}
-            .tooltip {{
+            }
+            .tooltip {
                 position: absolute;
                 background-color: white;
                 border: 1px solid #ddd;
@@ -342,29 +433,41 @@ def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
                 pointer-events: none;
                 box-shadow: 0 2px 4px rgba(0,0,0,0.2);
                 z-index: 1000;
-            }}
+            }
         </style>
     </head>
     <body>
         <div id="graph"></div>
         <script src="https://d3js.org/d3.v7.min.js"></script>
         <script>
-            const nodes = {json.dumps(d3_nodes)};
-            const links = {json.dumps(d3_edges)};
-            
-            // 颜色映射
-            const typeColors = {{
-                'Person': '#FF6B6B',
-                'Company': '#4ECDC4',
-                'Product': '#45B7D1',
-                'Location': '#FFA07A',
-                'Organization': '#98D8C8',
-                'Event': '#FFD93D',
-                '未分类': '#95A5A6'
-            }};
+"""
+
+_D3_HTML_TAIL = """            
+            // 连线两端直接替换为节点对象，渲染时不再依赖模拟按ID解析
+            const nodesById = new Map(nodes.map(d => [d.id, d]));
+            links.forEach(l => {
+                l.source = nodesById.get(l.source);
+                l.target = nodesById.get(l.target);
+            });
             
             const width = document.getElementById('graph').clientWidth;
             const height = 700;
+            const margin = 50;
+            
+            // 将预先计算的布局坐标缩放到画布范围内
+            nodes.forEach(d => {
+                d.x = margin + (d.x + 1) / 2 * (width - 2 * margin);
+                d.y = margin + (d.y + 1) / 2 * (height - 2 * margin);
+            });
+            
+            // 边较多时连线标签统一画在SVG下方的一个canvas上，避免每条边一个<text>元素
+            const useCanvasLabels = links.length > 100;
+            const labelContext = useCanvasLabels
+                ? d3.select("#graph").append("canvas")
+                    .attr("width", width)
+                    .attr("height", height)
+                    .node().getContext("2d")
+                : null;
             
             // 创建SVG
             const svg = d3.select("#graph")
@@ -378,12 +481,12 @@ def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
                 .attr("class", "tooltip")
                 .style("opacity", 0);
             
-            // 创建力导向模拟
-            const simulation = d3.forceSimulation(nodes)
-                .force("link", d3.forceLink(links).id(d => d.id).distance(150))
+            // 创建力导向模拟（仅在启用物理动画时创建）
+            const simulation = physics ? d3.forceSimulation(nodes)
+                .force("link", d3.forceLink(links).distance(150))
                 .force("charge", d3.forceManyBody().strength(-300))
                 .force("center", d3.forceCenter(width / 2, height / 2))
-                .force("collision", d3.forceCollide().radius(40));
+                .force("collision", d3.forceCollide().radius(40)) : null;
             
             // 添加箭头标记
             svg.append("defs").selectAll("marker")
@@ -410,7 +513,7 @@ def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
                 .style("stroke-width", d => Math.sqrt(d.weight) * 2);
             
             // 连线标签
-            const linkLabel = svg.append("g")
+            const linkLabel = useCanvasLabels ? null : svg.append("g")
                 .selectAll("text")
                 .data(links)
                 .enter().append("text")
@@ -432,14 +535,14 @@ def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
                 .attr("class", "node")
                 .attr("r", 20)
                 .style("fill", d => typeColors[d.type] || typeColors['未分类'])
-                .on("mouseover", function(event, d) {{
+                .on("mouseover", function(event, d) {
                     d3.select(this).transition()
                         .duration(200)
                         .attr("r", 25);
                     
-                    let html = `<b>${{d.name}}</b><br>`;
-                    html += `ID: ${{d.id}}<br>`;
-                    html += `类型: ${{d.type}}`;
+                    let html = `<b>${d.name}</b><br>`;
+                    html += `ID: ${d.id}<br>`;
+                    html += `类型: ${d.type}`;
                     
                     tooltip.transition()
                         .duration(200)
@@ -447,8 +550,8 @@ def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
                     tooltip.html(html)
                         .style("left", (event.pageX + 10) + "px")
                         .style("top", (event.pageY - 28) + "px");
-                }})
-                .on("mouseout", function(d) {{
+                })
+                .on("mouseout", function(d) {
                     d3.select(this).transition()
                         .duration(200)
                         .attr("r", 20);
@@ -456,7 +559,7 @@ def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
                     tooltip.transition()
                         .duration(500)
                         .style("opacity", 0);
-                }});
+                });
             
             // 节点标签
             node.append("text")
@@ -467,49 +570,141 @@ def visualize_with_d3js(nodes: List[Dict], edges: List[Dict]):
                 .style("font-weight", "bold");
             
             // 更新位置
-            simulation.on("tick", () => {{
+            function ticked() {
                 link
                     .attr("x1", d => d.source.x)
                     .attr("y1", d => d.source.y)
                     .attr("x2", d => d.target.x)
                     .attr("y2", d => d.target.y);
                 
-                linkLabel
-                    .attr("x", d => (d.source.x + d.target.x) / 2)
-                    .attr("y", d => (d.source.y + d.target.y) / 2);
+                if (labelContext) {
+                    labelContext.clearRect(0, 0, width, height);
+                    labelContext.font = "10px Arial, sans-serif";
+                    labelContext.fillStyle = "#666";
+                    links.forEach(d => labelContext.fillText(
+                        d.relation ?? "",
+                        (d.source.x + d.target.x) / 2,
+                        (d.source.y + d.target.y) / 2
+                    ));
+                } else {
+                    linkLabel
+                        .attr("x", d => (d.source.x + d.target.x) / 2)
+                        .attr("y", d => (d.source.y + d.target.y) / 2);
+                }
                 
                 node
-                    .attr("transform", d => `translate(${{d.x}},${{d.y}})`);
-            }});
+                    .attr("transform", d => `translate(${d.x},${d.y})`);
+            }
+            
+            ticked();
+            if (physics) {
+                // 已有初始布局，从较低的能量开始模拟即可
+                simulation.alpha(0.3).on("tick", ticked);
+            }
             
             // 拖拽函数
-            function dragstarted(event, d) {{
-                if (!event.active) simulation.alphaTarget(0.3).restart();
+            function dragstarted(event, d) {
+                if (physics && !event.active) simulation.alphaTarget(0.3).restart();
                 d.fx = d.x;
                 d.fy = d.y;
-            }}
+            }
             
-            function dragged(event, d) {{
+            function dragged(event, d) {
                 d.fx = event.x;
                 d.fy = event.y;
-            }}
+                if (!physics) {
+                    // 静态模式下直接移动节点并重绘
+                    d.x = event.x;
+                    d.y = event.y;
+                    ticked();
+                }
+            }
             
-            function dragended(event, d) {{
-                if (!event.active) simulation.alphaTarget(0);
+            function dragended(event, d) {
+                if (physics && !event.active) simulation.alphaTarget(0);
                 d.fx = null;
                 d.fy = null;
-            }}
+            }
         </script>
     </body>
     </html>
     """
+
+
+def visualize_with_d3js(nodes: List[Dict], edges: List[Dict], physics: bool = False):
+    """使用D3.js绘制力导向图（原生JavaScript，无需额外依赖）
+
+    节点位置在Python端预先计算（按图结构缓存），浏览器直接渲染静态图；
+    physics 为 True 时才在浏览器中运行力导向模拟
+    """
+    
+    # 预先计算布局，坐标范围为[-1, 1]，在浏览器中按画布大小缩放
+    pos = _compute_layout(
+        tuple(node['node_id'] for node in nodes),
+        tuple((edge['source_node_id'], edge['target_node_id']) for edge in edges),
+    )
+    
+    # 准备数据（页面脚本只用到名称、类型和坐标，不传节点属性以减小页面体积）
+    d3_nodes = []
+    for node in nodes:
+        x, y = pos[node['node_id']]
+        d3_nodes.append({
+            'id': node['node_id'],
+            'name': node['node_name'],
+            'type': node.get('node_type', '未分类'),
+            'x': x,
+            'y': y
+        })
+    
+    d3_edges = []
+    for edge in edges:
+        d3_edges.append({
+            'source': edge['source_node_id'],
+            'target': edge['target_node_id'],
+            'relation': edge.get('relation_type', '关联'),
+            'weight': edge.get('weight', 1.0)
+        })
+    
+    # 构建HTML
+    html_content = "".join([
+        _D3_HTML_HEAD,
+        "            const nodes = ", orjson.dumps(d3_nodes).decode(), ";\n",
+        "            const links = ", orjson.dumps(d3_edges).decode(), ";\n",
+        "            const physics = ", json.dumps(physics), ";\n",
+        "            const typeColors = ", orjson.dumps(dict(_TYPE_COLORS)).decode(), ";\n",
+        _D3_HTML_TAIL,
+    ])
     
     # 显示
     components.html(html_content, height=750, scrolling=False)
     return True
 
 
-def show_graph_visualization(nodes: List[Dict], edges: List[Dict], method: str = "d3js"):
+def _sample_graph(nodes: List[Dict], edges: List[Dict], max_nodes: int) -> Tuple[List[Dict], List[Dict]]:
+    """按连接数保留前 max_nodes 个节点（保持原有顺序），只保留两端都在其中的边"""
+    degree = Counter()
+    for edge in edges:
+        degree[edge['source_node_id']] += 1
+        degree[edge['target_node_id']] += 1
+    degrees = np.array([degree[node['node_id']] for node in nodes])
+    # argpartition 线性时间选出连接数最多的节点，无需整体排序
+    keep = np.sort(np.argpartition(-degrees, max_nodes - 1)[:max_nodes])
+    nodes = [nodes[i] for i in keep.tolist()]
+    node_ids = {node['node_id'] for node in nodes}
+    edges = [
+        edge for edge in edges
+        if edge['source_node_id'] in node_ids and edge['target_node_id'] in node_ids
+    ]
+    return nodes, edges
+
+
+def show_graph_visualization(
+    nodes: List[Dict],
+    edges: List[Dict],
+    method: str = "d3js",
+    physics: bool = False,
+    max_nodes: int = 500,
+):
     """
     显示图谱可视化
     
@@ -517,17 +712,24 @@ def show_graph_visualization(nodes: List[Dict], edges: List[Dict], method: str =
         nodes: 节点列表
         edges: 边列表
         method: 可视化方法 ('plotly', 'pyvis', 'd3js')
+        physics: D3.js 图是否在浏览器中运行力导向物理动画
+        max_nodes: 最多展示的节点数，超出时按连接数采样，避免浏览器卡死
     """
     if not nodes:
         st.warning("⚠️ 暂无节点数据，无法可视化")
         return False
     
+    if len(nodes) > max_nodes:
+        total = len(nodes)
+        nodes, edges = _sample_graph(nodes, edges, max_nodes)
+        st.info(f"ℹ️ 节点过多，已按连接数采样 {max_nodes}/{total} 个节点")
+    
     if method == "plotly":
         return visualize_with_plotly(nodes, edges)
     elif method == "pyvis":
         return visualize_with_pyvis(nodes, edges)
     elif method == "d3js":
-        return visualize_with_d3js(nodes, edges)
+        return visualize_with_d3js(nodes, edges, physics=physics)
     else:
         st.error(f"❌ 不支持的可视化方法: {method}")
         return False
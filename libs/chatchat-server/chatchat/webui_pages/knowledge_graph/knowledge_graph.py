@@ -2,18 +2,290 @@
 知识图谱管理页面
 提供图谱的可视化、节点/边管理、导入导出等功能
 """
-import json
-from typing import Dict, List
-
+import csv
+import functools
+import gzip
+import io
+import os
+import tempfile
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import msgspec
+import orjson
 import pandas as pd
 import streamlit as st
 import streamlit_antd_components as sac
-from st_aggrid import AgGrid, JsCode
-from st_aggrid.grid_options_builder import GridOptionsBuilder
 
+from chatchat.server.utils import api_address
 from chatchat.webui_pages.utils import *
 from chatchat.webui_pages.knowledge_graph.graph_visualizer import show_graph_visualization
 
+# Streamlit 1.37 起 fragment 转正为 st.fragment，当前锁定的 1.34 版本只有 st.experimental_fragment
+_fragment = getattr(st, "fragment", None) or st.experimental_fragment
+
+
+# Streamlit 每次交互都会重新运行整个页面，只读的列表、统计请求在 TTL 内直接复用结果，
+# 图谱数据有变动时调用 _clear_graph_cache() 使其失效
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_list_kbs(_api: ApiRequest) -> List[Dict]:
+    return _api.list_knowledge_bases()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_graph_stats(_api: ApiRequest, kb_name: str) -> Dict:
+    return _api.get_graph_stats(kb_name)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_list_nodes(_api: ApiRequest, kb_name: str, node_type: str = None, limit: int = 100) -> Dict:
+    return _api.list_graph_nodes(kb_name, node_type, limit)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_list_edges(
+    _api: ApiRequest,
+    kb_name: str,
+    node_id: str = None,
+    relation_type: str = None,
+    limit: int = 100,
+) -> Dict:
+    return _api.list_graph_edges(kb_name, node_id, relation_type, limit)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_subgraph_edges(_api: ApiRequest, kb_name: str, node_ids: Tuple[str, ...], limit: int = 1000) -> Dict:
+    return _api.list_graph_subgraph_edges(kb_name, list(node_ids), limit)
+
+
+def _clear_graph_cache():
+    """清除图谱统计、节点列表、关系列表的缓存，以及会话中保存的导出结果"""
+    _cached_graph_stats.clear()
+    _cached_list_nodes.clear()
+    _cached_list_edges.clear()
+    _cached_subgraph_edges.clear()
+    _drop_graph_export()
+
+
+def _drop_graph_export():
+    """移除会话中保存的导出结果，并删除对应的临时文件"""
+    export = st.session_state.pop("kg_export", None)
+    if export and os.path.exists(export["path"]):
+        os.remove(export["path"])
+
+
+# 节点、关系列表每页显示的条数
+_PAGE_SIZE = 50
+
+# 图谱对话中逐条以对话气泡显示的最近消息数，更早的消息合并显示在折叠区域中
+_CHAT_HISTORY_WINDOW = 20
+
+
+def _paginate(items: List[Dict], key: str) -> List[Dict]:
+    """数据超过一页时显示页码输入框，只返回当前页的数据"""
+    page_count = (len(items) + _PAGE_SIZE - 1) // _PAGE_SIZE
+    if page_count <= 1:
+        return items
+    page = st.number_input(
+        f"页码（共 {page_count} 页）", min_value=1, max_value=page_count, value=1, key=key
+    )
+    return items[(page - 1) * _PAGE_SIZE : page * _PAGE_SIZE]
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_props(properties: str):
+    """解析JSON字符串形式的属性，按原字符串缓存，页面重新运行时不再重复解析"""
+    return orjson.loads(properties)
+
+
+def _parse_csv_rows(text: str, min_fields: int) -> List[List[str]]:
+    """按CSV格式解析批量输入（字段可用引号包含逗号），去掉字段首尾空白，跳过空行和字段数不足的行"""
+    return [
+        [field.strip() for field in row]
+        for row in csv.reader(io.StringIO(text))
+        if len(row) >= min_fields
+    ]
+
+
+# 批量创建时每个请求携带的最大条数
+_BATCH_CHUNK_SIZE = 500
+
+
+def _batch_create_in_chunks(create_func: Callable[[List[Dict]], Dict], items: List[Dict]) -> Dict:
+    """
+    批量数据按块依次提交，避免单个请求体过大；不并发提交，避免 SQLite 等数据库出现 "database is locked"
+
+    超过一块时显示进度条，累加服务端在 data 中返回的成功/失败数，返回与单次调用相同格式的汇总结果
+    某一块请求失败即停止，并报告已完成的批数
+    """
+    chunks = [items[i : i + _BATCH_CHUNK_SIZE] for i in range(0, len(items), _BATCH_CHUNK_SIZE)]
+    if len(chunks) == 1:
+        return create_func(chunks[0])
+
+    progress = st.progress(0.0, text=f"已完成 0/{len(chunks)} 批")
+    success_count = failed_count = 0
+    for done, chunk in enumerate(chunks, 1):
+        result = create_func(chunk) or {}
+        if result.get("code") != 200:
+            progress.empty()
+            return {
+                "code": 500,
+                "msg": f"成功 {success_count} 个, 失败 {failed_count} 个；"
+                f"共 {len(chunks)} 批，第 {done} 批请求失败: {result.get('msg', '请求失败')}",
+            }
+        counts = result.get("data") or {}
+        success_count += counts.get("success_count", 0)
+        failed_count += counts.get("failed_count", 0)
+        progress.progress(done / len(chunks), text=f"已完成 {done}/{len(chunks)} 批")
+    progress.empty()
+
+    return {
+        "code": 200,
+        "msg": f"批量创建完成: 成功 {success_count} 个, 失败 {failed_count} 个",
+        "data": {"success_count": success_count, "failed_count": failed_count},
+    }
+
+
+class _ImportNode(msgspec.Struct):
+    node_id: str
+    node_name: str
+    node_type: Optional[str] = None
+    properties: Optional[Dict] = None
+
+
+class _ImportEdge(msgspec.Struct):
+    source_node_id: str
+    target_node_id: str
+    relation_type: Optional[str] = None
+    properties: Optional[Dict] = None
+    weight: float = 1.0
+
+
+class _ImportGraph(msgspec.Struct):
+    nodes: List[_ImportNode] = []
+    edges: List[_ImportEdge] = []
+
+
+_import_graph_decoder = msgspec.json.Decoder(_ImportGraph)
+
+
+def _load_uploaded_graph(uploaded_file) -> Tuple[Dict, int, int]:
+    """
+    解析上传的图谱文件（.json 或 .json.gz），解析的同时用 msgspec 校验节点和边的字段，
+    格式不符时抛出 msgspec.ValidationError；导出文件中的 id、create_time 等多余字段会被忽略
+
+    重复的节点（相同 node_id）和边（相同 起点-关系-终点，即服务端的 edge_id）以最后一条为准去重，
+    返回 (图谱数据, 去除的重复节点数, 去除的重复边数)
+
+    结果按上传文件ID保存在会话中，页面重新运行时不再重复解压、解析和去重同一个文件
+    """
+    cached = st.session_state.get("kg_upload")
+    if cached and cached["file_id"] == uploaded_file.file_id:
+        return cached["result"]
+
+    raw = uploaded_file.getvalue()
+    if uploaded_file.name.endswith(".gz"):
+        raw = gzip.decompress(raw)
+    graph_data = msgspec.to_builtins(_import_graph_decoder.decode(raw))
+
+    node_count, edge_count = len(graph_data["nodes"]), len(graph_data["edges"])
+    graph_data["nodes"] = list({node["node_id"]: node for node in graph_data["nodes"]}.values())
+    graph_data["edges"] = list(
+        {
+            (edge["source_node_id"], edge["relation_type"], edge["target_node_id"]): edge
+            for edge in graph_data["edges"]
+        }.values()
+    )
+    result = (
+        graph_data,
+        node_count - len(graph_data["nodes"]),
+        edge_count - len(graph_data["edges"]),
+    )
+    st.session_state.kg_upload = {"file_id": uploaded_file.file_id, "result": result}
+    return result
+
+
+# 导入图谱时每个请求携带的节点/边数量
+_IMPORT_BATCH_SIZE = 1000
+
+
+def _import_graph_in_batches(
+    api: ApiRequest, kb_name: str, nodes: List[Dict], edges: List[Dict], clear_existing: bool
+) -> Dict:
+    """
+    将图谱拆成若干批导入，避免单个请求体过大
+
+    各批依次提交，避免 SQLite 等数据库在并发写入时出现 "database is locked"；
+    仅第一批携带 clear_existing。某一批失败即停止，并报告已完成的批数，
+    服务端按 node_id/edge_id 覆盖写入，重新导入同一文件即可补齐
+    """
+    batches = [
+        {"nodes": nodes[i : i + _IMPORT_BATCH_SIZE], "edges": []}
+        for i in range(0, len(nodes), _IMPORT_BATCH_SIZE)
+    ] + [
+        {"nodes": [], "edges": edges[i : i + _IMPORT_BATCH_SIZE]}
+        for i in range(0, len(edges), _IMPORT_BATCH_SIZE)
+    ] or [{"nodes": [], "edges": []}]
+
+    progress = st.progress(0.0, text=f"已导入 0/{len(batches)} 批")
+    for done, batch in enumerate(batches, 1):
+        result = api.import_knowledge_graph(kb_name, batch, clear_existing and done == 1) or {}
+        if result.get("code") != 200:
+            progress.empty()
+            return {
+                "code": 500,
+                "msg": f"共 {len(batches)} 批，第 {done} 批导入失败（已完成 {done - 1} 批）: "
+                f"{result.get('msg', '请求失败')}",
+            }
+        progress.progress(done / len(batches), text=f"已导入 {done}/{len(batches)} 批")
+    progress.empty()
+
+    return {"code": 200, "msg": f"成功导入 {len(nodes)} 个节点、{len(edges)} 条边到 {kb_name}"}
+
+
+# 导入导出预览中展示的节点/边条数
+_PREVIEW_SIZE = 50
+
+
+def _export_graph_to_file(api: ApiRequest, kb_name: str, fp, pretty: bool = False) -> Dict:
+    """
+    流式拉取图谱（NDJSON），逐条写入文件，生成与导入格式一致的 {"kb_name", "nodes", "edges"} JSON
+    默认输出紧凑格式，pretty 为 True 时按 2 空格缩进输出，便于阅读但文件更大、序列化更慢
+
+    不在内存中组装整个图谱，返回节点/边数量和少量预览数据
+    """
+    if pretty:
+        head = b'{\n  "kb_name": ' + orjson.dumps(kb_name) + b',\n  "nodes": ['
+        item_prefix, middle, tail = b"\n    ", b'\n  ],\n  "edges": [', b"\n  ]\n}"
+    else:
+        head = b'{"kb_name":' + orjson.dumps(kb_name) + b',"nodes":['
+        item_prefix, middle, tail = b"", b'],"edges":[', b"]}"
+
+    preview = {"nodes": [], "edges": []}
+    counts = {"node": 0, "edge": 0}
+    fp.write(head)
+    in_edges = False
+    for record in api.export_knowledge_graph_stream(kb_name):
+        record_type = record.pop("type", None)
+        if record_type not in counts:
+            raise RuntimeError(record.get("msg") or "导出数据格式错误")
+        # 服务端先输出全部节点，再输出全部边
+        if record_type == "edge" and not in_edges:
+            fp.write(middle)
+            in_edges = True
+        if counts[record_type]:
+            fp.write(b",")
+        if pretty:
+            fp.write(item_prefix + orjson.dumps(record, option=orjson.OPT_INDENT_2).replace(b"\n", item_prefix))
+        else:
+            fp.write(orjson.dumps(record))
+        counts[record_type] += 1
+        if counts[record_type] <= _PREVIEW_SIZE:
+            preview[f"{record_type}s"].append(record)
+    fp.write(tail if in_edges else middle + tail)
+    return {"node_count": counts["node"], "edge_count": counts["edge"], "preview": preview}
+
 
 def knowledge_graph_page(api: ApiRequest, is_lite: bool = False):
     """知识图谱管理主页面"""
@@ -33,18 +305,15 @@ def knowledge_graph_page(api: ApiRequest, is_lite: bool = False):
 
         with col1:
             # 知识库选择
-            kb_list = api.list_knowledge_bases()
+            kb_list = _cached_list_kbs(api)
             kb_names = [kb["kb_name"] for kb in kb_list] if kb_list else []
+            kb_index = {name: i for i, name in enumerate(kb_names)}
 
             if kb_names:
                 st.session_state.kg_kb_name = st.selectbox(
                     "选择知识库",
                     kb_names,
-                    index=0 if not st.session_state.kg_kb_name else (
-                        kb_names.index(st.session_state.kg_kb_name)
-                        if st.session_state.kg_kb_name in kb_names
-                        else 0
-                    ),
+                    index=kb_index.get(st.session_state.kg_kb_name, 0),
                     key="kg_kb_selector",
                 )
             else:
@@ -54,6 +323,8 @@ def knowledge_graph_page(api: ApiRequest, is_lite: bool = False):
         with col2:
             # 获取图谱统计
             if st.button("🔄 刷新统计", use_container_width=True):
+                _cached_list_kbs.clear()
+                _clear_graph_cache()
                 st.rerun()
 
         with col3:
@@ -62,6 +333,7 @@ def knowledge_graph_page(api: ApiRequest, is_lite: bool = False):
                 if st.session_state.kg_kb_name:
                     with st.spinner("清空中..."):
                         result = api.clear_knowledge_graph(st.session_state.kg_kb_name)
+                        _clear_graph_cache()
                         if result.get("code") == 200:
                             st.success("✅ 图谱已清空")
                             st.rerun()
@@ -107,10 +379,12 @@ def show_graph_overview(api: ApiRequest, kb_name: str):
     st.header("📈 图谱概览")
 
     # 获取统计信息
-    stats_result = api.get_graph_stats(kb_name)
+    stats_result = _cached_graph_stats(api, kb_name)
 
     if stats_result.get("code") == 200:
         stats = stats_result.get("data", {})
+        node_count = stats.get("node_count", 0)
+        edge_count = stats.get("edge_count", 0)
 
         # 显示统计卡片
         col1, col2, col3 = st.columns(3)
@@ -118,26 +392,20 @@ def show_graph_overview(api: ApiRequest, kb_name: str):
         with col1:
             st.metric(
                 label="📍 节点数量",
-                value=stats.get("node_count", 0),
+                value=node_count,
                 help="图谱中的实体总数",
             )
 
         with col2:
             st.metric(
                 label="🔗 关系数量",
-                value=stats.get("edge_count", 0),
+                value=edge_count,
                 help="图谱中的关系总数",
             )
 
         with col3:
-            density = 0
-            if stats.get("node_count", 0) > 1:
-                max_edges = stats.get("node_count", 0) * (stats.get("node_count", 0) - 1)
-                density = (
-                    stats.get("edge_count", 0) / max_edges * 100
-                    if max_edges > 0
-                    else 0
-                )
+            # 有向图最多 n*(n-1) 条边
+            density = edge_count / (node_count * (node_count - 1)) * 100 if node_count > 1 else 0
             st.metric(
                 label="📊 图谱密度",
                 value=f"{density:.2f}%",
@@ -148,13 +416,19 @@ def show_graph_overview(api: ApiRequest, kb_name: str):
 
         # 最近的节点
         st.subheader("🔍 最近的节点")
-        nodes_result = api.list_graph_nodes(kb_name, limit=10)
+        nodes_result = _cached_list_nodes(api, kb_name, limit=10)
         if nodes_result.get("code") == 200:
             nodes = nodes_result.get("data", [])
             if nodes:
-                df = pd.DataFrame(nodes)
-                df = df[["node_id", "node_name", "node_type", "create_time"]]
-                df.columns = ["节点ID", "节点名称", "节点类型", "创建时间"]
+                # 只取需要显示的列直接构建，不再先用完整数据构建再筛选、重命名
+                df = pd.DataFrame(
+                    {
+                        "节点ID": [n["node_id"] for n in nodes],
+                        "节点名称": [n["node_name"] for n in nodes],
+                        "节点类型": [n.get("node_type") for n in nodes],
+                        "创建时间": [n.get("create_time") for n in nodes],
+                    }
+                )
                 st.dataframe(df, use_container_width=True)
             else:
                 st.info("暂无节点数据")
@@ -163,21 +437,19 @@ def show_graph_overview(api: ApiRequest, kb_name: str):
 
         # 最近的关系
         st.subheader("🔗 最近的关系")
-        edges_result = api.list_graph_edges(kb_name, limit=10)
+        edges_result = _cached_list_edges(api, kb_name, limit=10)
         if edges_result.get("code") == 200:
             edges = edges_result.get("data", [])
             if edges:
-                df = pd.DataFrame(edges)
-                df = df[
-                    [
-                        "source_node_id",
-                        "relation_type",
-                        "target_node_id",
-                        "weight",
-                        "create_time",
-                    ]
-                ]
-                df.columns = ["源节点", "关系类型", "目标节点", "权重", "创建时间"]
+                df = pd.DataFrame(
+                    {
+                        "源节点": [e["source_node_id"] for e in edges],
+                        "关系类型": [e.get("relation_type") for e in edges],
+                        "目标节点": [e["target_node_id"] for e in edges],
+                        "权重": pd.Series([e.get("weight") for e in edges], dtype="float64"),
+                        "创建时间": [e.get("create_time") for e in edges],
+                    }
+                )
                 st.dataframe(df, use_container_width=True)
             else:
                 st.info("暂无关系数据")
@@ -228,7 +500,7 @@ def show_node_list(api: ApiRequest, kb_name: str):
     if search_keyword:
         nodes_result = api.search_graph_nodes(kb_name, search_keyword, limit)
     else:
-        nodes_result = api.list_graph_nodes(kb_name, node_type_filter, limit)
+        nodes_result = _cached_list_nodes(api, kb_name, node_type_filter, limit)
 
     if nodes_result.get("code") == 200:
         nodes = nodes_result.get("data", [])
@@ -236,69 +508,100 @@ def show_node_list(api: ApiRequest, kb_name: str):
         if nodes:
             st.success(f"找到 {len(nodes)} 个节点")
 
-            # 显示节点表格
-            for i, node in enumerate(nodes):
-                with st.expander(
-                    f"📍 {node['node_name']} ({node.get('node_type', 'N/A')})"
-                ):
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        st.write(f"**节点ID:** {node['node_id']}")
-                        st.write(f"**节点类型:** {node.get('node_type', 'N/A')}")
-                        st.write(f"**创建时间:** {node.get('create_time', 'N/A')}")
-
-                    with col2:
-                        if node.get("properties"):
-                            try:
-                                props = (
-                                    json.loads(node["properties"])
-                                    if isinstance(node["properties"], str)
-                                    else node["properties"]
-                                )
-                                st.write("**属性:**")
-                                st.json(props)
-                            except:
-                                st.write(f"**属性:** {node['properties']}")
-
-                    # 操作按钮
-                    col_a, col_b, col_c = st.columns(3)
-
-                    with col_a:
-                        if st.button(
-                            "🔍 查看邻居", key=f"neighbors_{i}", use_container_width=True
-                        ):
-                            st.session_state[f"show_neighbors_{i}"] = True
+            # 分页显示节点表格，只为选中的节点渲染详情和操作按钮，避免每个节点一组控件
+            page_nodes = _paginate(nodes, "node_list_page")
+            df = pd.DataFrame(
+                page_nodes, columns=["node_id", "node_name", "node_type", "create_time"]
+            )
+            df.columns = ["节点ID", "节点名称", "节点类型", "创建时间"]
+            st.dataframe(df, use_container_width=True, hide_index=True)
+
+            # 批量删除：选中本页要删除的节点，一次请求完成删除，只重新加载一次列表
+            node_labels = {node["node_id"]: f"{node['node_name']} ({node['node_id']})" for node in page_nodes}
+            pending_delete = st.multiselect(
+                "选择要批量删除的节点",
+                list(node_labels),
+                format_func=node_labels.get,
+                key="node_list_pending_delete",
+            )
+            if pending_delete and st.button(
+                f"🗑️ 删除所选的 {len(pending_delete)} 个节点", type="secondary"
+            ):
+                result = api.batch_delete_graph_nodes(kb_name, pending_delete)
+                _clear_graph_cache()
+                if result.get("code") == 200:
+                    st.success(f"✅ {result.get('msg')}")
+                    st.rerun()
+                else:
+                    st.error(f"❌ 批量删除失败: {result.get('msg')}")
 
-                    with col_b:
-                        if st.button(
-                            "✏️ 编辑", key=f"edit_{i}", use_container_width=True
-                        ):
-                            st.session_state[f"edit_node_{i}"] = node
-
-                    with col_c:
-                        if st.button(
-                            "🗑️ 删除",
-                            key=f"delete_{i}",
-                            type="secondary",
-                            use_container_width=True,
-                        ):
-                            result = api.delete_graph_node(kb_name, node["node_id"])
-                            if result.get("code") == 200:
-                                st.success("✅ 节点已删除")
-                                st.rerun()
-                            else:
-                                st.error(f"❌ 删除失败: {result.get('msg')}")
-
-                    # 显示邻居
-                    if st.session_state.get(f"show_neighbors_{i}"):
-                        neighbors_result = api.get_node_neighbors(
-                            kb_name, node["node_id"], "both", 1
-                        )
-                        if neighbors_result.get("code") == 200:
-                            data = neighbors_result.get("data", {})
-                            st.write(f"**邻居节点数:** {len(data.get('nodes', []))}")
-                            st.write(f"**相关关系数:** {len(data.get('edges', []))}")
+            node = st.selectbox(
+                "选择节点查看详情",
+                page_nodes,
+                format_func=lambda n: f"📍 {n['node_name']} ({n.get('node_type', 'N/A')})",
+                key="node_list_selected",
+            )
+            with st.expander(
+                f"📍 {node['node_name']} ({node.get('node_type', 'N/A')})", expanded=True
+            ):
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.write(f"**节点ID:** {node['node_id']}")
+                    st.write(f"**节点类型:** {node.get('node_type', 'N/A')}")
+                    st.write(f"**创建时间:** {node.get('create_time', 'N/A')}")
+
+                with col2:
+                    if node.get("properties"):
+                        try:
+                            props = (
+                                _parse_props(node["properties"])
+                                if isinstance(node["properties"], str)
+                                else node["properties"]
+                            )
+                            st.write("**属性:**")
+                            st.json(props)
+                        except:
+                            st.write(f"**属性:** {node['properties']}")
+
+                # 操作按钮
+                col_a, col_b, col_c = st.columns(3)
+
+                with col_a:
+                    if st.button(
+                        "🔍 查看邻居", key=f"neighbors_{node['node_id']}", use_container_width=True
+                    ):
+                        st.session_state[f"show_neighbors_{node['node_id']}"] = True
+
+                with col_b:
+                    if st.button(
+                        "✏️ 编辑", key=f"edit_{node['node_id']}", use_container_width=True
+                    ):
+                        st.session_state[f"edit_node_{node['node_id']}"] = node
+
+                with col_c:
+                    if st.button(
+                        "🗑️ 删除",
+                        key=f"delete_{node['node_id']}",
+                        type="secondary",
+                        use_container_width=True,
+                    ):
+                        result = api.delete_graph_node(kb_name, node["node_id"])
+                        _clear_graph_cache()
+                        if result.get("code") == 200:
+                            st.success("✅ 节点已删除")
+                            st.rerun()
+                        else:
+                            st.error(f"❌ 删除失败: {result.get('msg')}")
+
+                # 显示邻居
+                if st.session_state.get(f"show_neighbors_{node['node_id']}"):
+                    # 只有展开邻居的节点才会查询，不做缓存，以免看不到其它会话刚做的修改
+                    neighbors_result = api.get_node_neighbors(kb_name, node["node_id"], "both", 1)
+                    if neighbors_result.get("code") == 200:
+                        data = neighbors_result.get("data", {})
+                        st.write(f"**邻居节点数:** {len(data.get('nodes', []))}")
+                        st.write(f"**相关关系数:** {len(data.get('edges', []))}")
         else:
             st.info("暂无节点数据")
     else:
@@ -340,8 +643,8 @@ def show_create_node(api: ApiRequest, kb_name: str):
                 properties = None
                 if properties_text.strip():
                     try:
-                        properties = json.loads(properties_text)
-                    except json.JSONDecodeError:
+                        properties = orjson.loads(properties_text)
+                    except orjson.JSONDecodeError:
                         st.error("❌ 属性格式错误，请输入有效的JSON")
                         return
 
@@ -353,6 +656,7 @@ def show_create_node(api: ApiRequest, kb_name: str):
                     node_type=node_type,
                     properties=properties,
                 )
+                _clear_graph_cache()
 
                 if result.get("code") == 200:
                     st.success(f"✅ 节点 '{node_name}' 创建成功！")
@@ -386,22 +690,27 @@ def show_batch_create_nodes(api: ApiRequest, kb_name: str):
             st.error("❌ 请输入节点数据")
             return
 
-        lines = [line.strip() for line in nodes_text.split("\n") if line.strip()]
-        nodes = []
-
-        for line in lines:
-            parts = [p.strip() for p in line.split(",")]
-            if len(parts) >= 2:
-                node = {
-                    "node_id": parts[0],
-                    "node_name": parts[1],
-                    "node_type": parts[2] if len(parts) > 2 else None,
-                }
-                nodes.append(node)
+        nodes = [
+            {
+                "node_id": parts[0],
+                "node_name": parts[1],
+                "node_type": parts[2] if len(parts) > 2 else None,
+            }
+            for parts in _parse_csv_rows(nodes_text, 2)
+        ]
+
+        # 重复的节点ID以最后一行为准（与服务端的处理一致），去重后再提交
+        row_count = len(nodes)
+        nodes = list({node["node_id"]: node for node in nodes}.values())
+        if len(nodes) < row_count:
+            st.info(f"已去除 {row_count - len(nodes)} 条重复节点，去重后 {len(nodes)} 条")
 
         if nodes:
             with st.spinner(f"正在创建 {len(nodes)} 个节点..."):
-                result = api.batch_create_graph_nodes(kb_name, nodes)
+                result = _batch_create_in_chunks(
+                    lambda chunk: api.batch_create_graph_nodes(kb_name, chunk), nodes
+                )
+                _clear_graph_cache()
 
                 if result.get("code") == 200:
                     st.success(f"✅ {result.get('msg')}")
@@ -452,7 +761,7 @@ def show_edge_list(api: ApiRequest, kb_name: str):
     with col3:
         limit = st.number_input("显示数量", min_value=10, max_value=1000, value=50)
 
-    edges_result = api.list_graph_edges(kb_name, node_id_filter, relation_type_filter, limit)
+    edges_result = _cached_list_edges(api, kb_name, node_id_filter, relation_type_filter, limit)
 
     if edges_result.get("code") == 200:
         edges = edges_result.get("data", [])
@@ -460,48 +769,85 @@ def show_edge_list(api: ApiRequest, kb_name: str):
         if edges:
             st.success(f"找到 {len(edges)} 条关系")
 
-            # 显示关系表格
-            for i, edge in enumerate(edges):
-                with st.expander(
-                    f"🔗 {edge['source_node_id']} → [{edge.get('relation_type', 'N/A')}] → {edge['target_node_id']}"
-                ):
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        st.write(f"**边ID:** {edge['edge_id']}")
-                        st.write(f"**源节点:** {edge['source_node_id']}")
-                        st.write(f"**目标节点:** {edge['target_node_id']}")
-
-                    with col2:
-                        st.write(f"**关系类型:** {edge.get('relation_type', 'N/A')}")
-                        st.write(f"**权重:** {edge.get('weight', 1.0)}")
-                        st.write(f"**创建时间:** {edge.get('create_time', 'N/A')}")
-
-                    if edge.get("properties"):
-                        try:
-                            props = (
-                                json.loads(edge["properties"])
-                                if isinstance(edge["properties"], str)
-                                else edge["properties"]
-                            )
-                            st.write("**属性:**")
-                            st.json(props)
-                        except:
-                            pass
+            # 分页显示关系表格，只为选中的关系渲染详情和删除按钮
+            page_edges = _paginate(edges, "edge_list_page")
+            df = pd.DataFrame(
+                page_edges,
+                columns=["source_node_id", "relation_type", "target_node_id", "weight", "create_time"],
+            )
+            df.columns = ["源节点", "关系类型", "目标节点", "权重", "创建时间"]
+            st.dataframe(df, use_container_width=True, hide_index=True)
+
+            # 批量删除：选中本页要删除的关系，一次请求完成删除
+            edge_labels = {
+                edge["edge_id"]: f"{edge['source_node_id']} → [{edge.get('relation_type', 'N/A')}] → {edge['target_node_id']}"
+                for edge in page_edges
+            }
+            pending_delete = st.multiselect(
+                "选择要批量删除的关系",
+                list(edge_labels),
+                format_func=edge_labels.get,
+                key="edge_list_pending_delete",
+            )
+            if pending_delete and st.button(
+                f"🗑️ 删除所选的 {len(pending_delete)} 条关系", type="secondary"
+            ):
+                result = api.batch_delete_graph_edges(kb_name, pending_delete)
+                _clear_graph_cache()
+                if result.get("code") == 200:
+                    st.success(f"✅ {result.get('msg')}")
+                    st.rerun()
+                else:
+                    st.error(f"❌ 批量删除失败: {result.get('msg')}")
 
-                    # 删除按钮
-                    if st.button(
-                        "🗑️ 删除",
-                        key=f"delete_edge_{i}",
-                        type="secondary",
-                        use_container_width=True,
-                    ):
-                        result = api.delete_graph_edge(kb_name, edge["edge_id"])
-                        if result.get("code") == 200:
-                            st.success("✅ 关系已删除")
-                            st.rerun()
-                        else:
-                            st.error(f"❌ 删除失败: {result.get('msg')}")
+            edge = st.selectbox(
+                "选择关系查看详情",
+                page_edges,
+                format_func=lambda e: f"🔗 {e['source_node_id']} → [{e.get('relation_type', 'N/A')}] → {e['target_node_id']}",
+                key="edge_list_selected",
+            )
+            with st.expander(
+                f"🔗 {edge['source_node_id']} → [{edge.get('relation_type', 'N/A')}] → {edge['target_node_id']}",
+                expanded=True,
+            ):
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.write(f"**边ID:** {edge['edge_id']}")
+                    st.write(f"**源节点:** {edge['source_node_id']}")
+                    st.write(f"**目标节点:** {edge['target_node_id']}")
+
+                with col2:
+                    st.write(f"**关系类型:** {edge.get('relation_type', 'N/A')}")
+                    st.write(f"**权重:** {edge.get('weight', 1.0)}")
+                    st.write(f"**创建时间:** {edge.get('create_time', 'N/A')}")
+
+                if edge.get("properties"):
+                    try:
+                        props = (
+                            _parse_props(edge["properties"])
+                            if isinstance(edge["properties"], str)
+                            else edge["properties"]
+                        )
+                        st.write("**属性:**")
+                        st.json(props)
+                    except:
+                        pass
+
+                # 删除按钮
+                if st.button(
+                    "🗑️ 删除",
+                    key=f"delete_edge_{edge['edge_id']}",
+                    type="secondary",
+                    use_container_width=True,
+                ):
+                    result = api.delete_graph_edge(kb_name, edge["edge_id"])
+                    _clear_graph_cache()
+                    if result.get("code") == 200:
+                        st.success("✅ 关系已删除")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ 删除失败: {result.get('msg')}")
         else:
             st.info("暂无关系数据")
     else:
@@ -545,8 +891,8 @@ def show_create_edge(api: ApiRequest, kb_name: str):
                 properties = None
                 if properties_text.strip():
                     try:
-                        properties = json.loads(properties_text)
-                    except json.JSONDecodeError:
+                        properties = orjson.loads(properties_text)
+                    except orjson.JSONDecodeError:
                         st.error("❌ 属性格式错误，请输入有效的JSON")
                         return
 
@@ -559,6 +905,7 @@ def show_create_edge(api: ApiRequest, kb_name: str):
                     properties=properties,
                     weight=weight,
                 )
+                _clear_graph_cache()
 
                 if result.get("code") == 200:
                     st.success(f"✅ 关系创建成功！")
@@ -591,22 +938,32 @@ def show_batch_create_edges(api: ApiRequest, kb_name: str):
             st.error("❌ 请输入关系数据")
             return
 
-        lines = [line.strip() for line in edges_text.split("\n") if line.strip()]
-        edges = []
-
-        for line in lines:
-            parts = [p.strip() for p in line.split(",")]
-            if len(parts) >= 3:
-                edge = {
-                    "source_node_id": parts[0],
-                    "relation_type": parts[1],
-                    "target_node_id": parts[2],
-                }
-                edges.append(edge)
+        edges = [
+            {
+                "source_node_id": parts[0],
+                "relation_type": parts[1],
+                "target_node_id": parts[2],
+            }
+            for parts in _parse_csv_rows(edges_text, 3)
+        ]
+
+        # 源节点、关系类型、目标节点相同的行是同一条关系，只提交一次
+        row_count = len(edges)
+        edges = list(
+            {
+                (edge["source_node_id"], edge["relation_type"], edge["target_node_id"]): edge
+                for edge in edges
+            }.values()
+        )
+        if len(edges) < row_count:
+            st.info(f"已去除 {row_count - len(edges)} 条重复关系，去重后 {len(edges)} 条")
 
         if edges:
             with st.spinner(f"正在创建 {len(edges)} 条关系..."):
-                result = api.batch_create_graph_edges(kb_name, edges)
+                result = _batch_create_in_chunks(
+                    lambda chunk: api.batch_create_graph_edges(kb_name, chunk), edges
+                )
+                _clear_graph_cache()
 
                 if result.get("code") == 200:
                     st.success(f"✅ {result.get('msg')}")
@@ -617,8 +974,13 @@ def show_batch_create_edges(api: ApiRequest, kb_name: str):
             st.error("❌ 没有有效的关系数据")
 
 
+@_fragment
 def show_graph_visualization(api: ApiRequest, kb_name: str):
-    """图谱可视化"""
+    """
+    图谱可视化
+
+    作为 fragment 运行：本区域内的控件变化只重新执行该函数，不再触发整个页面重新运行
+    """
     st.header("🎨 图谱可视化")
 
     st.caption("交互式3D图谱，支持拖拽节点、缩放、悬停查看详情")
@@ -639,6 +1001,12 @@ def show_graph_visualization(api: ApiRequest, kb_name: str):
     with col3:
         refresh_btn = st.button("🔄 刷新", use_container_width=True)
 
+    enable_physics = st.checkbox(
+        "启用物理动画",
+        value=False,
+        help="仅对D3.js生效：默认直接显示预先计算好的布局，开启后在浏览器中运行力导向模拟"
+    )
+
     # 映射可视化方法
     method_map = {
         "D3.js 力导向图 (推荐)": "d3js",
@@ -647,12 +1015,16 @@ def show_graph_visualization(api: ApiRequest, kb_name: str):
     }
     selected_method = method_map[viz_method]
 
+    if refresh_btn:
+        _clear_graph_cache()
+
     # 加载和显示图谱
     if st.button("🎨 生成可视化", type="primary", use_container_width=True) or refresh_btn:
         with st.spinner("加载图谱数据..."):
-            # 获取节点和边
-            nodes_result = api.list_graph_nodes(kb_name, limit=max_nodes)
-            edges_result = api.list_graph_edges(kb_name, limit=max_nodes * 2)
+            # 获取节点，再只取两端都在这些节点中的边，不再拉取大量端点不在图中的边
+            nodes_result = _cached_list_nodes(api, kb_name, limit=max_nodes)
+            node_ids = tuple(node["node_id"] for node in nodes_result.get("data") or [])
+            edges_result = _cached_subgraph_edges(api, kb_name, node_ids, limit=max_nodes * 2)
 
             if nodes_result.get("code") == 200 and edges_result.get("code") == 200:
                 nodes = nodes_result.get("data", [])
@@ -684,7 +1056,7 @@ def show_graph_visualization(api: ApiRequest, kb_name: str):
 
                     # 显示可视化
                     from chatchat.webui_pages.knowledge_graph.graph_visualizer import show_graph_visualization as viz
-                    success = viz(nodes, edges, method=selected_method)
+                    success = viz(nodes, edges, method=selected_method, physics=enable_physics)
 
                     if success:
                         st.divider()
@@ -695,34 +1067,30 @@ def show_graph_visualization(api: ApiRequest, kb_name: str):
                             
                             with col_a:
                                 # 节点类型统计
-                                node_types = {}
-                                for node in nodes:
-                                    ntype = node.get("node_type") or "未分类"
-                                    node_types[ntype] = node_types.get(ntype, 0) + 1
+                                node_types = Counter(node.get("node_type") or "未分类" for node in nodes)
                                 
                                 st.write("**节点类型分布:**")
-                                for ntype, count in sorted(node_types.items(), key=lambda x: -x[1]):
+                                for ntype, count in node_types.most_common():
                                     st.write(f"- {ntype}: {count}")
                             
                             with col_b:
                                 # 关系类型统计
                                 if edges:
-                                    relation_types = {}
-                                    for edge in edges:
-                                        rtype = edge.get("relation_type") or "未分类"
-                                        relation_types[rtype] = relation_types.get(rtype, 0) + 1
+                                    relation_types = Counter(
+                                        edge.get("relation_type") or "未分类" for edge in edges
+                                    )
                                     
                                     st.write("**关系类型分布:**")
-                                    for rtype, count in sorted(relation_types.items(), key=lambda x: -x[1]):
+                                    for rtype, count in relation_types.most_common():
                                         st.write(f"- {rtype}: {count}")
                             
                             with col_c:
                                 st.write("**图谱度量:**")
                                 st.write(f"- 总节点数: {len(nodes)}")
                                 st.write(f"- 总边数: {len(edges)}")
-                                if len(nodes) > 1:
-                                    max_edges = len(nodes) * (len(nodes) - 1)
-                                    density = len(edges) / max_edges * 100 if max_edges > 0 else 0
+                                node_count = len(nodes)
+                                if node_count > 1:
+                                    density = len(edges) / (node_count * (node_count - 1)) * 100
                                     st.write(f"- 密度: {density:.2f}%")
 
                 else:
@@ -765,6 +1133,7 @@ def show_graph_visualization(api: ApiRequest, kb_name: str):
                 # 批量创建
                 nodes_result = api.batch_create_graph_nodes(kb_name, example_nodes)
                 edges_result = api.batch_create_graph_edges(kb_name, example_edges)
+                _clear_graph_cache()
                 
                 if nodes_result.get("code") == 200 and edges_result.get("code") == 200:
                     st.success("✅ 示例图谱创建成功！点击上方'生成可视化'按钮查看效果")
@@ -795,8 +1164,18 @@ def show_graph_chat(api: ApiRequest, kb_name: str):
     if "kg_chat_history" not in st.session_state:
         st.session_state.kg_chat_history = []
 
-    # 显示对话历史
-    for msg in st.session_state.kg_chat_history:
+    # 显示对话历史：最近的消息逐条显示，更早的消息拼接后一次性渲染，避免对话越长页面元素越多
+    chat_history = st.session_state.kg_chat_history
+    older_messages = chat_history[:-_CHAT_HISTORY_WINDOW]
+    if older_messages:
+        with st.expander(f"更早的 {len(older_messages)} 条消息"):
+            st.markdown(
+                "\n\n".join(
+                    f"**{'用户' if msg['role'] == 'user' else '助手'}**: {msg['content']}"
+                    for msg in older_messages
+                )
+            )
+    for msg in chat_history[-_CHAT_HISTORY_WINDOW:]:
         with st.chat_message(msg["role"]):
             st.write(msg["content"])
 
@@ -920,62 +1299,118 @@ def show_import_export(api: ApiRequest, kb_name: str):
 
         st.write("将当前图谱导出为JSON格式，可用于备份或迁移")
 
-        if st.button("导出图谱", type="primary", use_container_width=True):
-            with st.spinner("导出中..."):
-                result = api.export_knowledge_graph(kb_name)
+        compress = st.checkbox("gzip 压缩（.json.gz）", value=False)
 
-                if result.get("code") == 200:
-                    graph_data = result.get("data", {})
+        # 浏览器直接从API服务流式下载，WebUI 不经手文件内容，适合大型图谱
+        download_url = f"{api_address(is_public=True)}/knowledge_graph/download_graph?" + urlencode(
+            {"kb_name": kb_name, "compress": str(compress).lower()}
+        )
+        st.link_button("⬇️ 直接下载（适合大型图谱）", download_url, use_container_width=True)
 
-                    # 转换为JSON字符串
-                    json_str = json.dumps(graph_data, ensure_ascii=False, indent=2)
+        pretty = st.checkbox("美化输出（缩进排版，文件更大、导出更慢）", value=False)
 
-                    st.success(
-                        f"✅ 导出成功！节点: {len(graph_data.get('nodes', []))}, 边: {len(graph_data.get('edges', []))}"
-                    )
+        if st.button("导出图谱", type="primary", use_container_width=True):
+            _drop_graph_export()
+            with st.spinner("导出中..."):
+                # 流式写入临时文件，避免在内存中同时保留图谱对象和序列化后的字符串
+                with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as fp:
+                    export_path = fp.name
+                try:
+                    # 图谱JSON中大量重复的键名和关系类型，gzip 压缩后体积通常只有原来的几分之一
+                    opener = functools.partial(gzip.open, compresslevel=6) if compress else open
+                    with opener(export_path, "wb") as fp:
+                        result = _export_graph_to_file(api, kb_name, fp, pretty)
+
+                    # 会话中只保存临时文件路径和统计信息，点击下载等操作触发重新运行时不必重新导出
+                    st.session_state.kg_export = {
+                        "kb_name": kb_name,
+                        "compress": compress,
+                        "pretty": pretty,
+                        "path": export_path,
+                        **result,
+                    }
+                except Exception as e:
+                    os.remove(export_path)
+                    st.error(f"❌ 导出失败: {e}")
+
+        export = st.session_state.get("kg_export")
+        if (
+            export
+            and export["kb_name"] == kb_name
+            and export["compress"] == compress
+            and export["pretty"] == pretty
+            and os.path.exists(export["path"])
+        ):
+            st.success(
+                f"✅ 导出成功！节点: {export['node_count']}, 边: {export['edge_count']}"
+            )
 
-                    # 下载按钮
-                    st.download_button(
-                        label="💾 下载JSON文件",
-                        data=json_str,
-                        file_name=f"{kb_name}_graph_export.json",
-                        mime="application/json",
-                        use_container_width=True,
-                    )
+            # 下载按钮，直接传入文件对象，由 Streamlit 读取临时文件
+            with open(export["path"], "rb") as fp:
+                st.download_button(
+                    label="💾 下载JSON文件",
+                    data=fp,
+                    file_name=f"{kb_name}_graph_export.json" + (".gz" if compress else ""),
+                    mime="application/gzip" if compress else "application/json",
+                    use_container_width=True,
+                )
 
-                    # 预览
-                    with st.expander("预览数据"):
-                        st.json(graph_data)
-                else:
-                    st.error(f"❌ 导出失败: {result.get('msg')}")
+            # 预览（仅前若干条）
+            with st.expander(f"预览数据（前 {_PREVIEW_SIZE} 条）"):
+                st.json(export["preview"])
 
     with tab2:
         st.subheader("导入图谱数据")
 
-        st.write("从JSON文件导入图谱数据")
+        st.write("从JSON文件（或 gzip 压缩的 .json.gz 文件）导入图谱数据")
 
-        uploaded_file = st.file_uploader("选择JSON文件", type=["json"])
+        uploaded_file = st.file_uploader("选择JSON文件", type=["json", "gz"])
 
         clear_existing = st.checkbox("导入前清空现有图谱", value=False)
 
         if uploaded_file is not None:
-            try:
-                # 读取文件
-                graph_data = json.load(uploaded_file)
+            # 文件名和大小无需解析即可得到；解析留到预览或导入时按需进行
+            st.write("**文件信息:**")
+            st.write(f"- 文件名: {uploaded_file.name}")
+            st.write(f"- 文件大小: {uploaded_file.size / 1e6:.1f} MB")
 
-                # 预览
-                st.write("**文件预览:**")
-                st.write(f"- 节点数: {len(graph_data.get('nodes', []))}")
-                st.write(f"- 边数: {len(graph_data.get('edges', []))}")
+            try:
+                previewed = st.checkbox("解析并预览", value=False)
+                if previewed:
+                    graph_data, duplicate_nodes, duplicate_edges = _load_uploaded_graph(uploaded_file)
+                    nodes = graph_data["nodes"]
+                    edges = graph_data["edges"]
+                    if duplicate_nodes or duplicate_edges:
+                        st.info(f"已去除重复节点 {duplicate_nodes} 个、重复边 {duplicate_edges} 条")
 
-                with st.expander("查看详细内容"):
-                    st.json(graph_data)
+                    # 预览
+                    st.write("**文件预览:**")
+                    st.write(f"- 节点数: {len(nodes)}")
+                    st.write(f"- 边数: {len(edges)}")
+
+                    # 只预览前若干条，完整数据需显式勾选后才发送到浏览器渲染
+                    with st.expander("查看详细内容"):
+                        if st.checkbox("显示完整数据", value=False):
+                            st.json(graph_data)
+                        else:
+                            st.caption(f"仅显示前 {_PREVIEW_SIZE} 个节点和边")
+                            st.json(
+                                {
+                                    "nodes": nodes[:_PREVIEW_SIZE],
+                                    "edges": edges[:_PREVIEW_SIZE],
+                                }
+                            )
 
                 if st.button("开始导入", type="primary", use_container_width=True):
                     with st.spinner("导入中..."):
-                        result = api.import_knowledge_graph(
-                            kb_name, graph_data, clear_existing
+                        # 已预览过的文件直接复用会话中缓存的解析结果
+                        graph_data, duplicate_nodes, duplicate_edges = _load_uploaded_graph(uploaded_file)
+                        if not previewed and (duplicate_nodes or duplicate_edges):
+                            st.info(f"已去除重复节点 {duplicate_nodes} 个、重复边 {duplicate_edges} 条")
+                        result = _import_graph_in_batches(
+                            api, kb_name, graph_data["nodes"], graph_data["edges"], clear_existing
                         )
+                        _clear_graph_cache()
 
                         if result.get("code") == 200:
                             st.success(f"✅ {result.get('msg')}")
@@ -983,7 +1418,12 @@ def show_import_export(api: ApiRequest, kb_name: str):
                         else:
                             st.error(f"❌ 导入失败: {result.get('msg')}")
 
-            except json.JSONDecodeError:
+            except msgspec.ValidationError as e:
+                st.error(f"❌ 文件内容不符合图谱格式: {e}")
+            except msgspec.DecodeError:
                 st.error("❌ 文件格式错误，请上传有效的JSON文件")
             except Exception as e:
                 st.error(f"❌ 读取文件失败: {str(e)}")
+        else:
+            # 移除上传文件后释放会话中缓存的解析结果
+            st.session_state.pop("kg_upload", None)
@@ -732,6 +732,14 @@ class ApiRequest:
         resp = self.get("/knowledge_graph/list_edges", params=params)
         return self._get_response_value(resp, as_json=True)
 
+    def list_graph_subgraph_edges(
+        self, kb_name: str, node_ids: List[str], limit: int = 1000
+    ) -> Dict:
+        """列出两端都在给定节点中的边"""
+        data = {"kb_name": kb_name, "node_ids": node_ids, "limit": limit}
+        resp = self.post("/knowledge_graph/list_subgraph_edges", json=data)
+        return self._get_response_value(resp, as_json=True)
+
     def create_graph_node(
         self,
         kb_name: str,
@@ -784,6 +792,18 @@ class ApiRequest:
         resp = self.post("/knowledge_graph/delete_edge", json=data)
         return self._get_response_value(resp, as_json=True)
 
+    def batch_delete_graph_nodes(self, kb_name: str, node_ids: List[str]) -> Dict:
+        """批量删除图谱节点"""
+        data = {"kb_name": kb_name, "node_ids": node_ids}
+        resp = self.post("/knowledge_graph/batch_delete_nodes", json=data)
+        return self._get_response_value(resp, as_json=True)
+
+    def batch_delete_graph_edges(self, kb_name: str, edge_ids: List[str]) -> Dict:
+        """批量删除图谱边"""
+        data = {"kb_name": kb_name, "edge_ids": edge_ids}
+        resp = self.post("/knowledge_graph/batch_delete_edges", json=data)
+        return self._get_response_value(resp, as_json=True)
+
     def search_graph_nodes(
         self, kb_name: str, keyword: str, limit: int = 50
     ) -> Dict:
@@ -822,6 +842,22 @@ class ApiRequest:
         resp = self.get("/knowledge_graph/export_graph", params={"kb_name": kb_name})
         return self._get_response_value(resp, as_json=True)
 
+    def export_knowledge_graph_stream(self, kb_name: str) -> Iterator[Dict]:
+        """
+        流式导出知识图谱（NDJSON），逐条产出 {"type": "node"|"edge", ...} 记录
+        服务端出错时产出一条不含 type 字段的 {"code": ..., "msg": ...}
+        """
+        response = self.get(
+            "/knowledge_graph/export_graph",
+            params={"kb_name": kb_name, "stream": True},
+            stream=True,
+            timeout=None,
+        )
+        with response as r:
+            for line in r.iter_lines():
+                if line:
+                    yield json.loads(line)
+
     def import_knowledge_graph(
         self, kb_name: str, graph_data: Dict, clear_existing: bool = False
     ) -> Dict:
@@ -0,0 +1,150 @@
+import gzip
+
+import msgspec
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from chatchat.server.api_server import kg_routes
+
+MSGPACK = kg_routes.MSGPACK_MEDIA_TYPE
+NODES = [{"node_id": "a", "node_name": "Alice", "node_type": "Person", "properties": None}]
+STATS = {"node_count": 1, "edge_count": 0, "by_type": {"Person": 1}}
+
+
+class FakeKGService:
+    def __init__(self):
+        self.calls = []
+
+    def search_nodes(self, keyword, limit=50):
+        self.calls.append(("search_nodes", keyword, limit))
+        return NODES
+
+    def get_stats(self):
+        return STATS
+
+    def add_node(self, **kwargs):
+        self.calls.append(("add_node", kwargs))
+        return True
+
+    def bulk_add_nodes(self, nodes):
+        self.calls.append(("bulk_add_nodes", nodes))
+        # 模拟服务端有一个节点写入失败
+        return len(nodes) - 1
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FakeKGService()
+    monkeypatch.setattr(kg_routes, "get_kg_service", lambda kb_name: service)
+    return service
+
+
+@pytest.fixture
+def client(service):
+    app = FastAPI()
+    app.include_router(kg_routes.kg_router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("request_type", ["json", "msgpack"])
+@pytest.mark.parametrize("response_type", ["json", "msgpack"])
+def test_search_nodes_content_types(client, service, request_type, response_type):
+    body = {"kb_name": "kb", "keyword": "ali", "limit": 5}
+    kwargs = {"headers": {}}
+    if request_type == "msgpack":
+        kwargs["content"] = msgspec.msgpack.encode(body)
+        kwargs["headers"]["Content-Type"] = MSGPACK
+    else:
+        kwargs["json"] = body
+    if response_type == "msgpack":
+        kwargs["headers"]["Accept"] = MSGPACK
+
+    resp = client.post("/knowledge_graph/search_nodes", **kwargs)
+
+    assert resp.status_code == 200
+    if response_type == "msgpack":
+        assert resp.headers["content-type"] == MSGPACK
+        data = msgspec.msgpack.decode(resp.content)
+    else:
+        assert resp.headers["content-type"] == "application/json"
+        data = resp.json()
+    assert data["code"] == 200
+    assert data["data"] == NODES
+    assert service.calls == [("search_nodes", "ali", 5)]
+
+
+def test_get_stats_msgpack(client):
+    resp = client.get(
+        "/knowledge_graph/get_stats", params={"kb_name": "kb"}, headers={"Accept": MSGPACK}
+    )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == MSGPACK
+    assert msgspec.msgpack.decode(resp.content)["data"] == STATS
+
+
+@pytest.mark.parametrize("path", ["/knowledge_graph/search_nodes", "/knowledge_graph/create_node"])
+def test_malformed_msgpack_returns_422(client, service, path):
+    resp = client.post(path, content=b"\xc1\xff", headers={"Content-Type": MSGPACK})
+    assert resp.status_code == 422
+    assert resp.json()["code"] == 422
+    assert service.calls == []
+
+
+def test_create_node_msgpack(client, service):
+    body = {"kb_name": "kb", "node_id": "a", "node_name": "Alice"}
+    resp = client.post(
+        "/knowledge_graph/create_node",
+        content=msgspec.msgpack.encode(body),
+        headers={"Content-Type": MSGPACK, "Accept": MSGPACK},
+    )
+    assert resp.status_code == 200
+    assert msgspec.msgpack.decode(resp.content)["code"] == 200
+    assert service.calls[0][1]["node_id"] == "a"
+
+
+def test_batch_create_nodes_reports_counts(client, service):
+    nodes = [{"node_id": str(i), "node_name": f"n{i}"} for i in range(3)]
+    resp = client.post("/knowledge_graph/batch_create_nodes", json={"kb_name": "kb", "nodes": nodes})
+    assert resp.status_code == 200
+    assert resp.json()["data"] == {"success_count": 2, "failed_count": 1}
+
+
+def test_create_node_invalid_body_returns_422(client, service):
+    resp = client.post("/knowledge_graph/create_node", json={"kb_name": "kb"})
+    assert resp.status_code == 422
+    assert service.calls == []
+
+
+def test_gzip_request_body(client, service):
+    body = gzip.compress(orjson.dumps({"kb_name": "kb", "keyword": "ali", "limit": 5}))
+    resp = client.post(
+        "/knowledge_graph/search_nodes",
+        content=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert resp.status_code == 200
+    assert service.calls == [("search_nodes", "ali", 5)]
+
+
+@pytest.mark.parametrize("body", [b"not gzip", gzip.compress(b'{"kb_name": "kb"}')[:-12]])
+def test_invalid_gzip_request_body_returns_400(client, service, body):
+    resp = client.post(
+        "/knowledge_graph/search_nodes",
+        content=body,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert resp.status_code == 400
+    assert resp.json()["code"] == 400
+    assert service.calls == []
+
+
+def test_gunzip_body_limits_inflated_size():
+    data = b"x" * 1000
+    assert kg_routes.gunzip_body(gzip.compress(data) + gzip.compress(data)) == data * 2
+    assert kg_routes.gunzip_body(gzip.compress(data), max_size=1000) == data
+    with pytest.raises(kg_routes.BodyTooLargeError):
+        kg_routes.gunzip_body(gzip.compress(data), max_size=999)
+    with pytest.raises(kg_routes.BodyTooLargeError):
+        kg_routes.gunzip_body(gzip.compress(data) * 2, max_size=1500)
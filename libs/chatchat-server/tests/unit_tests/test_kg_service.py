@@ -0,0 +1,340 @@
+import itertools
+
+import networkx as nx
+import pytest
+from sqlalchemy import create_engine, text
+
+from chatchat.server.db import base as db_base
+from chatchat.server.db.models.knowledge_graph_model import (
+    create_composite_indexes,
+    create_graph_stats_triggers,
+)
+from chatchat.server.db.repository import knowledge_graph_repository
+from chatchat.server.knowledge_base.kg_service import (
+    KnowledgeGraphService,
+    _all_simple_paths,
+    _bfs_shortest_paths,
+    _bidirectional_shortest_paths,
+    _CSRGraph,
+    _TrigramIndex,
+)
+
+# 小型有向图：包含环、自环、同一对节点之间不同关系的平行边，以及孤立的连通分量
+EDGES = [
+    ("a", "knows", "b"),
+    ("a", "works_with", "b"),
+    ("b", "knows", "c"),
+    ("a", "knows", "c"),
+    ("c", "knows", "d"),
+    ("d", "knows", "b"),
+    ("d", "knows", "e"),
+    ("b", "knows", "e"),
+    ("e", "knows", "e"),
+    ("x", "knows", "y"),
+]
+NODE_IDS = sorted({n for s, _, t in EDGES for n in (s, t)})
+
+
+def _edge_dicts():
+    return [
+        {
+            "edge_id": f"{s}_{r}_{t}",
+            "source_node_id": s,
+            "target_node_id": t,
+            "relation_type": r,
+        }
+        for s, r, t in EDGES
+    ]
+
+
+def _digraph():
+    graph = nx.DiGraph()
+    graph.add_nodes_from(NODE_IDS)
+    graph.add_edges_from((s, t) for s, _, t in EDGES)
+    return graph
+
+
+def _shortest_paths(graph, source, target, max_length):
+    try:
+        paths = nx.all_shortest_paths(graph, source, target)
+        return sorted(p for p in map(list, paths) if len(p) - 1 <= max_length)
+    except nx.NetworkXNoPath:
+        return []
+
+
+PAIRS = [
+    (s, t) for s, t in itertools.product(["a", "b", "d", "x"], ["b", "c", "e", "y"]) if s != t
+]
+
+
+@pytest.mark.parametrize("source,target", PAIRS)
+@pytest.mark.parametrize("max_length", [0, 1, 2, 5])
+def test_csr_paths_match_networkx(source: str, target: str, max_length: int):
+    csr = _CSRGraph(_edge_dicts())
+    graph = _digraph()
+    s, t = csr.index[source], csr.index[target]
+
+    def to_ids(paths):
+        return sorted([csr.node_ids[i] for i in path] for path in paths)
+
+    expected = _shortest_paths(graph, source, target, max_length)
+    assert to_ids(_bfs_shortest_paths(csr.successors, s, t, max_length)) == expected
+    assert (
+        to_ids(_bidirectional_shortest_paths(csr.successors, csr.predecessors, s, t, max_length))
+        == expected
+    )
+    assert to_ids(_all_simple_paths(csr.successors, s, t, max_length)) == sorted(
+        map(list, nx.all_simple_paths(graph, source, target, cutoff=max_length))
+    )
+
+
+def test_csr_remove_edge_and_compact():
+    csr = _CSRGraph(_edge_dicts())
+    assert csr.remove_edge("b_knows_c")
+    assert not csr.remove_edge("b_knows_c")
+    assert csr.index["c"] not in csr.successors(csr.index["b"])
+    assert csr.index["b"] not in csr.predecessors(csr.index["c"])
+
+    assert csr.remove_node("e") == 3
+    compacted = csr.compact()
+    graph = _digraph()
+    graph.remove_edge("b", "c")
+    graph.remove_node("e")
+    assert {
+        (compacted.node_ids[u], compacted.node_ids[v])
+        for u in range(len(compacted.node_ids))
+        for v in compacted.successors(u)
+    } == set(graph.edges())
+
+
+def test_trigram_search_matches_substring_scan():
+    names = ["张三", "张三丰", "李四", "Apple Inc", "apple pie", "Pineapple", "Banana"]
+    nodes = [
+        {"node_id": str(i), "node_name": name, "node_type": "Company" if i % 2 else "Person"}
+        for i, name in enumerate(names)
+    ]
+    index = _TrigramIndex(nodes)
+    for keyword in ["张三", "三丰", "APPLE", "pple", "ppl", "comp", "pers", "Ban", "zzz", "a"]:
+        expected = [
+            node
+            for node in nodes
+            if keyword.lower() in node["node_name"].lower()
+            or keyword.lower() in node["node_type"].lower()
+        ]
+        assert index.search(keyword, limit=100) == expected
+        assert index.search(keyword, limit=2) == expected[:2]
+
+
+@pytest.fixture
+def kg_service(tmp_path, monkeypatch):
+    """使用临时 SQLite 数据库（含复合索引和统计触发器）的图谱服务"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'kg.db'}",
+        json_serializer=db_base._json_serializer,
+        json_deserializer=db_base._json_deserializer,
+    )
+    db_base.Base.metadata.create_all(bind=engine)
+    create_composite_indexes(engine)
+    assert create_graph_stats_triggers(engine)
+    monkeypatch.setattr(knowledge_graph_repository, "_stats_triggers_ready", None)
+    monkeypatch.setattr(knowledge_graph_repository, "_upsert_supported", {})
+    db_base.SessionLocal.configure(bind=engine)
+    try:
+        yield KnowledgeGraphService(kb_name="test_kg")
+    finally:
+        db_base.SessionLocal.configure(bind=db_base.engine)
+        engine.dispose()
+
+
+def _import_sample_graph(service: KnowledgeGraphService):
+    nodes = [
+        {"node_id": n, "node_name": n.upper(), "node_type": "Person" if n < "d" else None}
+        for n in NODE_IDS
+    ]
+    edges = [
+        {"source_node_id": s, "target_node_id": t, "relation_type": r} for s, r, t in EDGES
+    ]
+    assert service.import_graph({"nodes": nodes, "edges": edges})
+
+
+def _scan_stats(service: KnowledgeGraphService):
+    nodes = service.list_nodes(limit=10000)
+    by_type = {}
+    for node in nodes:
+        key = node["node_type"] or "未分类"
+        by_type[key] = by_type.get(key, 0) + 1
+    return {
+        "node_count": len(nodes),
+        "edge_count": len(service.list_edges(limit=10000)),
+        "by_type": by_type,
+    }
+
+
+def test_service_paths_match_networkx(kg_service):
+    _import_sample_graph(kg_service)
+    graph = _digraph()
+    for source, target in PAIRS:
+        expected = _shortest_paths(graph, source, target, 5)
+        assert sorted(kg_service.find_path(source, target, shortest_only=True)) == expected
+        assert sorted(kg_service.find_path_bidirectional(source, target)) == expected
+        assert sorted(kg_service.find_path(source, target)) == sorted(
+            map(list, nx.all_simple_paths(graph, source, target, cutoff=5))
+        )
+
+
+@pytest.mark.parametrize("direction", ["in", "out", "both"])
+@pytest.mark.parametrize("max_depth", [1, 2, 3])
+def test_service_neighbors_match_networkx(kg_service, direction: str, max_depth: int):
+    _import_sample_graph(kg_service)
+    graph = _digraph()
+    if direction == "in":
+        graph = graph.reverse()
+    elif direction == "both":
+        graph = graph.to_undirected()
+
+    for node_id in NODE_IDS:
+        result = kg_service.get_neighbors(node_id, direction=direction, max_depth=max_depth)
+        reachable = nx.single_source_shortest_path_length(graph, node_id, cutoff=max_depth)
+        assert sorted(node["node_id"] for node in result["nodes"]) == sorted(reachable)
+        # 每条边只返回一次：沿遍历方向、起点在 max_depth - 1 层以内的所有边
+        edge_ids = [edge["edge_id"] for edge in result["edges"]]
+        assert len(edge_ids) == len(set(edge_ids))
+        depth = {
+            "out": lambda s, t: reachable.get(s, max_depth),
+            "in": lambda s, t: reachable.get(t, max_depth),
+            "both": lambda s, t: min(reachable.get(s, max_depth), reachable.get(t, max_depth)),
+        }[direction]
+        expected_edges = {f"{s}_{r}_{t}" for s, r, t in EDGES if depth(s, t) < max_depth}
+        assert set(edge_ids) == expected_edges
+
+
+@pytest.mark.parametrize("unique_index", [True, False])
+def test_upsert_deduplicates(kg_service, unique_index: bool):
+    if not unique_index:
+        # 旧表中有重复数据时无法补建唯一索引，写入退回到先查询再插入/更新
+        with db_base.SessionLocal() as session:
+            session.execute(text("DROP INDEX uq_knowledge_graph_node_kb_node"))
+            session.execute(text("DROP INDEX uq_knowledge_graph_edge_kb_edge"))
+            session.commit()
+
+    assert kg_service.add_node("a", "Alice", "Person")
+    assert knowledge_graph_repository._upsert_supported == {
+        "knowledge_graph_node": unique_index
+    }
+    assert kg_service.add_node("a", "Alice", "Person")
+    assert kg_service.add_node("a", "Alice Smith", "Person", {"age": 30})
+    assert kg_service.bulk_add_nodes(
+        [
+            {"node_id": "b", "node_name": "Bob"},
+            {"node_id": "b", "node_name": "Bobby"},
+            {"node_id": "a", "node_name": "Alice Smith", "node_type": "Person"},
+        ]
+    ) == 3
+    nodes = {node["node_id"]: node for node in kg_service.list_nodes()}
+    assert sorted(nodes) == ["a", "b"]
+    assert nodes["b"]["node_name"] == "Bobby"
+    assert kg_service.get_node("a")["node_name"] == "Alice Smith"
+
+    for _ in range(2):
+        assert kg_service.add_edge("a", "b", "knows", weight=2.0)
+    assert kg_service.bulk_add_edges(
+        [{"source_node_id": "a", "target_node_id": "b", "relation_type": "knows"}]
+    ) == 1
+    edges = kg_service.list_edges()
+    assert [edge["edge_id"] for edge in edges] == ["a_knows_b"]
+    assert edges[0]["weight"] == 1.0
+
+    _import_sample_graph(kg_service)
+    _import_sample_graph(kg_service)
+    assert len(kg_service.list_nodes(limit=10000)) == len(NODE_IDS)
+    assert len(kg_service.list_edges(limit=10000)) == len(EDGES)
+
+
+def test_stats_match_after_insert_and_delete(kg_service):
+    assert kg_service.get_stats() == {"node_count": 0, "edge_count": 0, "by_type": {}}
+
+    _import_sample_graph(kg_service)
+    assert kg_service.get_stats() == _scan_stats(kg_service)
+
+    # 修改节点类型后按类型的计数随之变化
+    assert kg_service.add_node("e", "E", "Person")
+    assert kg_service.get_stats() == _scan_stats(kg_service)
+
+    assert kg_service.delete_node("b")
+    assert kg_service.delete_edge("c_knows_d")
+    assert kg_service.bulk_delete_nodes(["x"]) == 1
+    stats = kg_service.get_stats()
+    assert stats == _scan_stats(kg_service)
+    assert stats["node_count"] == len(NODE_IDS) - 2
+
+    assert kg_service.clear_graph()
+    assert kg_service.get_stats() == {"node_count": 0, "edge_count": 0, "by_type": {}}
+
+
+def test_stats_rebuilt_only_when_triggers_created(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kg.db'}")
+    db_base.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO knowledge_graph_node (kb_name, node_id, node_name) VALUES ('kb', 'a', 'A')")
+        )
+
+    # 首次建立触发器时按已有数据计数
+    assert create_graph_stats_triggers(engine)
+    select_total = text("SELECT total FROM knowledge_graph_stats WHERE kb_name = 'kb' AND stat_key = 'node'")
+    with engine.begin() as conn:
+        assert conn.execute(select_total).scalar() == 1
+        conn.execute(text("UPDATE knowledge_graph_stats SET total = 42"))
+
+    # 触发器已存在时不再全表重新计数
+    assert create_graph_stats_triggers(engine)
+    with engine.connect() as conn:
+        assert conn.execute(select_total).scalar() == 42
+    engine.dispose()
+
+
+def test_import_graph_is_single_transaction(kg_service):
+    _import_sample_graph(kg_service)
+    before = _scan_stats(kg_service)
+
+    # 最后一条边的属性无法序列化，整批导入（包括先清空和已写入的节点）应全部回滚
+    bad_graph = {
+        "nodes": [{"node_id": "new", "node_name": "New"}],
+        "edges": [
+            {
+                "source_node_id": "new",
+                "target_node_id": "a",
+                "relation_type": "knows",
+                "properties": {"bad": object()},
+            }
+        ],
+    }
+    assert not kg_service.import_graph(bad_graph, clear_existing=True)
+    assert kg_service.get_node("new") is None
+    assert _scan_stats(kg_service) == before
+    assert kg_service.get_stats() == before
+
+
+def test_search_nodes_index_matches_db(kg_service, monkeypatch):
+    _import_sample_graph(kg_service)
+    assert kg_service.add_node("p1", "Apple_Pie 100%", "Food")
+    keywords = ["a", "A", "pie", "_pie", "100%", "%", "_", "person", "zzz"]
+    indexed = {keyword: kg_service.search_nodes(keyword, limit=3) for keyword in keywords}
+
+    # 节点数超过阈值时不建立内存索引，直接查询数据库，结果应一致
+    monkeypatch.setattr(kg_service, "TRIGRAM_INDEX_MAX_NODES", 0)
+    kg_service._invalidate_trigram_index()
+    for keyword in keywords:
+        assert kg_service.search_nodes(keyword, limit=3) == indexed[keyword]
+    assert kg_service._trigram_index is None
+
+
+def test_search_nodes_index_expires(kg_service, monkeypatch):
+    _import_sample_graph(kg_service)
+    assert kg_service.search_nodes("zed") == []
+
+    # 绕过本实例直接写库（如其它进程），索引在 TRIGRAM_INDEX_TTL 内不会感知
+    knowledge_graph_repository.add_node_to_db(kb_name="test_kg", node_id="z", node_name="Zed")
+    assert kg_service.search_nodes("zed") == []
+    monkeypatch.setattr(kg_service, "TRIGRAM_INDEX_TTL", 0)
+    assert [node["node_id"] for node in kg_service.search_nodes("zed")] == ["z"]